@@ -2,6 +2,8 @@
 ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+This is the production entry point, served by uvicorn workers under gunicorn
+(see gunicorn.conf.py).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -10,7 +12,17 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
+from django.urls import get_resolver
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
 
 application = get_asgi_application()
+
+# Import the views and load the classifier now rather than on the first
+# request, so a preforking server does it once, before forking, and its
+# workers share the memory copy-on-write
+get_resolver().url_patterns
+
+from backend.emails.ml_service import get_analyzer  # noqa: E402
+
+get_analyzer()
@@ -1,15 +1,16 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from backend.core.metrics import ProfiledSerializerMixin
 from .models import UserProfile, LoginHistory
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = UserProfile
         fields = ["role", "department", "phone_number", "receive_notifications"]
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     profile = UserProfileSerializer()
 
     class Meta:
@@ -18,7 +19,7 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ["id"]
 
 
-class LoginHistorySerializer(serializers.ModelSerializer):
+class LoginHistorySerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     username = serializers.CharField(source="user.username", read_only=True)
 
     class Meta:
@@ -34,7 +35,7 @@ class LoginHistorySerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "username"]
 
 
-class RegisterSerializer(serializers.ModelSerializer):
+class RegisterSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(
         write_only=True, required=True, style={"input_type": "password"}
     )
@@ -1,3 +1,32 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from backend.core.testing import QueryBudgetMixin
+
+from .models import LoginHistory, UserProfile
+
+
+class EndpointQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Admin listings run a fixed number of queries per request"""
+
+    def setUp(self):
+        self.admin = self.add_user("admin", role="admin")
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def add_user(self, username, role="staff"):
+        user = User.objects.create_user(username)
+        UserProfile.objects.create(user=user, role=role)
+        LoginHistory.objects.create(user=user)
+        return user
+
+    def add_users(self):
+        for _ in range(3):
+            self.add_user(f"user{User.objects.count()}")
+
+    def test_user_list(self):
+        self.assertQueryBudget("/api/auth/users/", 3, self.add_users)
+
+    def test_login_history(self):
+        self.assertQueryBudget("/api/auth/login-history/", 3, self.add_users)
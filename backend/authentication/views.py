@@ -64,9 +64,10 @@ class UserListView(generics.ListAPIView):
 
     def get_queryset(self):
         user = self.request.user
+        users = User.objects.select_related("profile")
         if user.profile.role == "admin":
-            return User.objects.all()
-        return User.objects.filter(id=user.id)
+            return users
+        return users.filter(id=user.id)
 
 
 class LoginHistoryView(generics.ListAPIView):
@@ -75,9 +76,10 @@ class LoginHistoryView(generics.ListAPIView):
 
     def get_queryset(self):
         user = self.request.user
+        history = LoginHistory.objects.select_related("user")
         if user.profile.role == "admin":
-            return LoginHistory.objects.all()
-        return LoginHistory.objects.filter(user=user)
+            return history
+        return history.filter(user=user)
 
 
 class LogoutView(APIView):
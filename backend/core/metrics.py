@@ -0,0 +1,363 @@
+"""
+Request metrics: latency, database queries and serializer time per view,
+collected by ``RequestMetricsMiddleware`` and exported at ``/metrics`` in
+Prometheus' text format.
+
+Metrics are kept per process, like the response cache and connection pool
+statistics, so with several workers each one is a separate scrape target.
+Serializers are timed when they include ``ProfiledSerializerMixin``. Other
+apps export their own metrics with ``register_collector``.
+"""
+
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.db import connections
+from rest_framework.serializers import ListSerializer
+
+from .pools import connection_pool_stats
+
+# Upper bounds of the histogram buckets; Prometheus' client libraries'
+# latency buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# Sample name, labels and value
+Sample = Tuple[str, Dict[str, str], float]
+# Metric name, type, help text and samples
+Metric = Tuple[str, str, str, List[Sample]]
+
+
+class Histogram:
+    """Counts of observations up to each bucket's bound, and their sum"""
+
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # One count per bound, then one for +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def samples(self, name: str, labels: Dict[str, str]) -> List[Sample]:
+        samples, cumulative = [], 0
+        for bound, count in zip((*self.bounds, "+Inf"), self.counts):
+            cumulative += count
+            samples.append((f"{name}_bucket", {**labels, "le": str(bound)}, cumulative))
+        samples.append((f"{name}_sum", labels, self.sum))
+        samples.append((f"{name}_count", labels, cumulative))
+        return samples
+
+
+class ViewMetrics:
+    """What the requests to one view have cost"""
+
+    __slots__ = ("latency", "queries", "query_seconds", "serializer_seconds", "status")
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.query_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.status: Dict[int, int] = {}
+
+
+class RequestMetrics:
+    """Metrics of the requests this process has served, by view and method"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views: Dict[Tuple[str, str], ViewMetrics] = {}
+
+    def record(self, view: str, method: str, status: int, profile) -> None:
+        with self._lock:
+            metrics = self._views.get((view, method))
+            if metrics is None:
+                metrics = self._views[view, method] = ViewMetrics()
+            metrics.latency.observe(profile.duration)
+            metrics.queries.observe(profile.queries)
+            metrics.query_seconds += profile.query_seconds
+            metrics.serializer_seconds += profile.serializer_seconds
+            metrics.status[status] = metrics.status.get(status, 0) + 1
+
+    def collect(self) -> Iterable[Metric]:
+        requests, latency, queries, query_seconds, serializer_seconds = (
+            [] for _ in range(5)
+        )
+        # Read under the lock, so each view's numbers add up
+        with self._lock:
+            for (view, method), metrics in self._views.items():
+                labels = {"view": view, "method": method}
+                for status, count in sorted(metrics.status.items()):
+                    requests.append(
+                        (
+                            "http_requests_total",
+                            {**labels, "status": str(status)},
+                            count,
+                        )
+                    )
+                latency += metrics.latency.samples(
+                    "http_request_duration_seconds", labels
+                )
+                queries += metrics.queries.samples("http_request_db_queries", labels)
+                query_seconds.append(
+                    (
+                        "http_request_db_query_seconds_total",
+                        labels,
+                        metrics.query_seconds,
+                    )
+                )
+                serializer_seconds.append(
+                    (
+                        "http_request_serializer_seconds_total",
+                        labels,
+                        metrics.serializer_seconds,
+                    )
+                )
+        return [
+            (
+                "http_requests",
+                "counter",
+                "Requests served, by view, method and status code",
+                requests,
+            ),
+            (
+                "http_request_duration_seconds",
+                "histogram",
+                "Time taken to respond to requests",
+                latency,
+            ),
+            (
+                "http_request_db_queries",
+                "histogram",
+                "Database queries run per request",
+                queries,
+            ),
+            (
+                "http_request_db_query_seconds",
+                "counter",
+                "Time requests spent running database queries",
+                query_seconds,
+            ),
+            (
+                "http_request_serializer_seconds",
+                "counter",
+                "Time requests spent serializing, including the queries it ran",
+                serializer_seconds,
+            ),
+        ]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._views.clear()
+
+
+request_metrics = RequestMetrics()
+
+
+class RequestProfile:
+    """
+    Time and queries of one request. As a database execute wrapper, it
+    counts and times each query, keeping the statements too if asked to.
+    """
+
+    __slots__ = (
+        "started",
+        "duration",
+        "queries",
+        "query_seconds",
+        "serializer_seconds",
+        "serializing",
+        "statements",
+    )
+
+    def __init__(self, keep_statements: bool = False):
+        self.started = perf_counter()
+        self.duration = 0.0
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializing = False
+        self.statements: Optional[List[Tuple[str, float]]] = (
+            [] if keep_statements else None
+        )
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = perf_counter() - started
+            self.queries += 1
+            self.query_seconds += duration
+            if self.statements is not None:
+                self.statements.append((sql, duration))
+
+    def capture_queries(self) -> "CapturedQueries":
+        """Profile the queries run on any database while in the block"""
+        return CapturedQueries(self)
+
+    def finish(self) -> None:
+        self.duration = perf_counter() - self.started
+
+    def top_statements(self, limit: int) -> List[Tuple[str, int, float]]:
+        """The statements that took longest in all, with their count and time"""
+        totals: Dict[str, List] = {}
+        for sql, duration in self.statements or ():
+            total = totals.setdefault(sql, [0, 0.0])
+            total[0] += 1
+            total[1] += duration
+        ranked = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+        return [(sql, count, seconds) for sql, (count, seconds) in ranked[:limit]]
+
+
+class CapturedQueries:
+    """
+    Installs a profile as an execute wrapper of every database connection,
+    like ``execute_wrapper()`` but without the generator-based context
+    managers, which were most of the middleware's overhead.
+    """
+
+    __slots__ = ("profile", "wrappers")
+
+    def __init__(self, profile: RequestProfile):
+        self.profile = profile
+
+    def __enter__(self):
+        self.wrappers = [connections[alias].execute_wrappers for alias in connections]
+        for wrappers in self.wrappers:
+            wrappers.append(self.profile)
+
+    def __exit__(self, *exc_info):
+        for wrappers in self.wrappers:
+            wrappers.pop()
+
+
+# Profile of the request being handled, if any
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar(
+    "current_profile", default=None
+)
+
+
+class ProfiledSerializerMixin:
+    """
+    Serializer whose ``data`` is timed into the current request's profile.
+    With ``many=True`` the list serializer is timed instead. Nested
+    serializers are rendered as part of their parent, so only the outermost
+    one is timed.
+    """
+
+    @property
+    def data(self):
+        profile = current_profile.get()
+        if profile is None or profile.serializing:
+            return super().data
+        profile.serializing = True
+        started = perf_counter()
+        try:
+            return super().data
+        finally:
+            profile.serializer_seconds += perf_counter() - started
+            profile.serializing = False
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        serializer = super().many_init(*args, **kwargs)
+        # DRF's default list serializer, unless Meta names another
+        if type(serializer) is ListSerializer:
+            serializer.__class__ = ProfiledListSerializer
+        return serializer
+
+
+class ProfiledListSerializer(ProfiledSerializerMixin, ListSerializer):
+    pass
+
+
+def collect_connection_pools() -> Iterable[Metric]:
+    pools = connection_pool_stats().items()
+    return [
+        (
+            "db_pool_connections",
+            "gauge",
+            "Connections open in the pool",
+            [("db_pool_connections", {"database": a}, s["size"]) for a, s in pools],
+        ),
+        (
+            "db_pool_connections_in_use",
+            "gauge",
+            "Pooled connections handed out",
+            [
+                ("db_pool_connections_in_use", {"database": a}, s["in_use"])
+                for a, s in pools
+            ],
+        ),
+        (
+            "db_pool_requests_waiting",
+            "gauge",
+            "Requests waiting for a pooled connection",
+            [
+                ("db_pool_requests_waiting", {"database": a}, s["waiting"])
+                for a, s in pools
+            ],
+        ),
+        (
+            "db_pool_wait_seconds",
+            "counter",
+            "Time spent waiting for pooled connections",
+            [
+                (
+                    "db_pool_wait_seconds_total",
+                    {"database": a},
+                    s["wait_ms_total"] / 1000,
+                )
+                for a, s in pools
+            ],
+        ),
+        (
+            "db_pool_timeouts",
+            "counter",
+            "Requests that gave up waiting for a pooled connection",
+            [
+                ("db_pool_timeouts_total", {"database": a}, s["timeouts"])
+                for a, s in pools
+            ],
+        ),
+    ]
+
+
+_collectors: List[Callable[[], Iterable[Metric]]] = [
+    request_metrics.collect,
+    collect_connection_pools,
+]
+
+
+def register_collector(collect: Callable[[], Iterable[Metric]]) -> None:
+    """Export the metrics ``collect()`` returns at /metrics as well"""
+    if collect not in _collectors:
+        _collectors.append(collect)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render_metrics() -> str:
+    """Every registered metric in Prometheus' text exposition format"""
+    lines = []
+    for collect in _collectors:
+        for name, kind, description, samples in collect():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                label_text = ",".join(
+                    f'{key}="{_escape(str(label))}"' for key, label in labels.items()
+                )
+                lines.append(f"{sample_name}{{{label_text}}} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,369 @@
+import logging
+import secrets
+import struct
+import zlib
+from typing import Dict, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from .metrics import RequestProfile, current_profile, request_metrics
+from .routers import RequestRouting, current_routing, pin_to_primary
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+slow_request_logger = logging.getLogger("backend.slow_requests")
+
+# Brotli's quality 4-5 compresses API payloads better than gzip at a similar
+# speed; its higher levels are meant for static assets compressed once
+BROTLI_QUALITY = 5
+GZIP_LEVEL = 6
+# Longest random file name padding the gzip header, as in GZipMiddleware
+GZIP_MAX_RANDOM_BYTES = 100
+# Content types that are already compressed
+INCOMPRESSIBLE_TYPES = (
+    "application/gzip",
+    "application/zip",
+    "application/vnd.apache.parquet",
+    "image/",
+    "audio/",
+    "video/",
+)
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into content codings and their q-values"""
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(header: str) -> Optional[str]:
+    """Pick the best content coding the client accepts, brotli first"""
+    accepted = accepted_encodings(header)
+    for coding in ("br", "gzip"):
+        if coding == "br" and brotli is None:
+            continue
+        if accepted.get(coding, accepted.get("*", 0)) > 0:
+            return coding
+    return None
+
+
+def _gzip_header() -> bytes:
+    """
+    A gzip member header whose file name is a random run of up to
+    ``GZIP_MAX_RANDOM_BYTES`` bytes, like the one Django's GZipMiddleware
+    writes
+    """
+    filename = b"a" * secrets.randbelow(GZIP_MAX_RANDOM_BYTES)
+    # Magic, deflate, FNAME flag if named, no mtime, no extra flags, unknown OS
+    header = b"\x1f\x8b\x08" + (b"\x08" if filename else b"\x00") + bytes(5) + b"\xff"
+    return header + filename + b"\x00" if filename else header
+
+
+class _Compressor:
+    """
+    Incremental compressor for one content coding.
+
+    Gzip is framed here around raw deflate, so the header can carry a
+    random-length file name. That varies the compressed length of
+    responses with the same content, which is Django's mitigation for
+    BREACH: an attacker reflecting guesses next to a secret in a response
+    cannot read it from the length changing. Brotli has no header field to
+    pad and goes without.
+    """
+
+    def __init__(self, coding: str):
+        if coding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self.compress = self._compressor.process
+            self.flush = self._compressor.finish
+        else:
+            self._compressor = zlib.compressobj(
+                GZIP_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS
+            )
+            self._header = _gzip_header()
+            self._crc = 0
+            self._size = 0
+            self.compress = self._compress_gzip
+            self.flush = self._flush_gzip
+
+    def _compress_gzip(self, data: bytes) -> bytes:
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        compressed = self._header + self._compressor.compress(data)
+        self._header = b""
+        return compressed
+
+    def _flush_gzip(self) -> bytes:
+        trailer = struct.pack("<II", self._crc, self._size & 0xFFFFFFFF)
+        return self._header + self._compressor.flush() + trailer
+
+
+def _compress_sequence(chunks, coding):
+    compressor = _Compressor(coding)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def _compress_async_sequence(chunks, coding):
+    compressor = _Compressor(coding)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses with brotli (when installed) or gzip, whichever the
+    client accepts, like Django's GZipMiddleware. Responses shorter than
+    ``RESPONSE_COMPRESSION_MIN_SIZE`` bytes are sent as they are, since
+    compressing them costs more time than it saves in transfer.
+
+    Gzip output keeps GZipMiddleware's BREACH mitigation (see
+    ``_Compressor``). Brotli output has none; the API authenticates with
+    bearer tokens sent in headers, so its bodies carry no CSRF token or
+    other secret for such an attack to recover.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header("Content-Encoding"):
+            return response
+        if response.get("Content-Type", "").startswith(INCOMPRESSIBLE_TYPES):
+            return response
+        # Also leaves bodiless responses such as 304s alone
+        if not response.streaming and (
+            len(response.content) < settings.RESPONSE_COMPRESSION_MIN_SIZE
+        ):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        coding = choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if coding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = _compress_async_sequence(
+                    response.streaming_content, coding
+                )
+            else:
+                response.streaming_content = _compress_sequence(
+                    response.streaming_content, coding
+                )
+            # The compressed length isn't known until the stream ends
+            del response.headers["Content-Length"]
+        else:
+            compressor = _Compressor(coding)
+            compressed = compressor.compress(response.content) + compressor.flush()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        # The compressed body isn't byte-for-byte the tagged representation
+        etag = response.headers.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = coding
+        return response
+
+
+def _route_sequence(chunks, routing):
+    # Streamed content is generated after the middleware has returned
+    token = current_routing.set(routing)
+    try:
+        yield from chunks
+    finally:
+        current_routing.reset(token)
+
+
+async def _route_async_sequence(chunks, routing):
+    token = current_routing.set(routing)
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        current_routing.reset(token)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Let GET and HEAD requests read from replicas (see ``routers``), and pin
+    a user's reads to the primary for a while after a request of theirs
+    writes. Unsafe requests count as writes even when they write outside
+    the ORM. Streamed responses keep the request's routing while they are
+    generated.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = RequestRouting(request, request.method in ("GET", "HEAD"))
+        token = current_routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        self.finish_response(request, routing, response)
+        return response
+
+    async def __acall__(self, request):
+        routing = RequestRouting(request, request.method in ("GET", "HEAD"))
+        token = current_routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        self.finish_response(request, routing, response)
+        return response
+
+    def finish_response(self, request, routing, response):
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = _route_async_sequence(
+                    response.streaming_content, routing
+                )
+            else:
+                response.streaming_content = _route_sequence(
+                    response.streaming_content, routing
+                )
+        wrote = routing.wrote or (
+            not routing.use_replicas and response.status_code < 400
+        )
+        user = getattr(request, "user", None)
+        if wrote and user is not None and user.is_authenticated:
+            pin_to_primary(user)
+
+
+def _profile_sequence(chunks, profile, finish):
+    # Queries run while streaming count towards the request
+    try:
+        with profile.capture_queries():
+            yield from chunks
+    finally:
+        finish()
+
+
+async def _profile_async_sequence(chunks, finish):
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        finish()
+
+
+class RequestMetricsMiddleware:
+    """
+    Record each request's latency, database queries and serializer time by
+    view (see ``metrics``), and log requests slower than
+    ``SLOW_REQUEST_LOG_MS`` with the statements that took longest. Streamed
+    responses are recorded once they have been sent.
+
+    Goes first in MIDDLEWARE, so the time spent in other middleware counts.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.keep_statements = settings.SLOW_REQUEST_LOG_MS > 0
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        profile = RequestProfile(self.keep_statements)
+        token = current_profile.set(profile)
+        try:
+            with profile.capture_queries():
+                response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.finish_response(request, response, profile)
+
+    async def __acall__(self, request):
+        profile = RequestProfile(self.keep_statements)
+        token = current_profile.set(profile)
+        try:
+            with profile.capture_queries():
+                response = await self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.finish_response(request, response, profile)
+
+    def finish_response(self, request, response, profile):
+        def finish():
+            self.record(request, response, profile)
+
+        if not response.streaming:
+            finish()
+        elif response.is_async:
+            response.streaming_content = _profile_async_sequence(
+                response.streaming_content, finish
+            )
+        else:
+            response.streaming_content = _profile_sequence(
+                response.streaming_content, profile, finish
+            )
+        return response
+
+    def record(self, request, response, profile):
+        profile.finish()
+        match = request.resolver_match
+        view = match.view_name if match is not None else "<unresolved>"
+        request_metrics.record(view, request.method, response.status_code, profile)
+        if (
+            self.keep_statements
+            and profile.duration * 1000 >= settings.SLOW_REQUEST_LOG_MS
+        ):
+            self.log_slow_request(request, response, view, profile)
+
+    def log_slow_request(self, request, response, view, profile):
+        lines = [
+            f"Slow request: {request.method} {request.get_full_path()} ({view}) "
+            f"{response.status_code} in {profile.duration * 1000:.0f}ms, "
+            f"{profile.queries} queries in {profile.query_seconds * 1000:.0f}ms, "
+            f"serializing {profile.serializer_seconds * 1000:.0f}ms"
+        ]
+        for sql, count, seconds in profile.top_statements(
+            settings.SLOW_REQUEST_LOG_STATEMENTS
+        ):
+            lines.append(f"  {seconds * 1000:8.1f}ms {count:4d}x  {sql[:1000]}")
+        slow_request_logger.warning("\n".join(lines))
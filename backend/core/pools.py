@@ -0,0 +1,41 @@
+"""
+Usage of the database connection pools configured with ``DB_POOL``.
+"""
+
+from typing import Dict
+
+from django.db import connections
+
+
+def connection_pool_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Report each database's connection pool in this process: connections
+    open, in use and idle, requests waiting for one now, and how long
+    requests have waited so far. Databases without a pool are left out.
+    """
+    pools = {}
+    for alias in connections:
+        pool = getattr(connections[alias], "pool", None)
+        if pool is None:
+            continue
+        stats = pool.get_stats()
+        requests = stats.get("requests_num", 0)
+        wait_ms = stats.get("requests_wait_ms", 0)
+        pools[alias] = {
+            "min_size": stats["pool_min"],
+            "max_size": stats["pool_max"],
+            "size": stats["pool_size"],
+            "in_use": stats["pool_size"] - stats["pool_available"],
+            "idle": stats["pool_available"],
+            "waiting": stats["requests_waiting"],
+            "requests": requests,
+            # Requests that found no idle connection and had to wait
+            "requests_queued": stats.get("requests_queued", 0),
+            "wait_ms_total": wait_ms,
+            "wait_ms_avg": wait_ms / requests if requests else 0,
+            # Requests that gave up after DB_POOL_TIMEOUT
+            "timeouts": stats.get("requests_errors", 0),
+            "connections_opened": stats.get("connections_num", 0),
+            "connections_lost": stats.get("connections_lost", 0),
+        }
+    return pools
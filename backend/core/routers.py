@@ -0,0 +1,159 @@
+"""
+Read replica routing.
+
+Reads of GET and HEAD requests go to a healthy replica from
+``REPLICA_DATABASES``; everything else, including every write and any read
+inside a transaction, goes to the primary. After a user writes, their reads
+stay on the primary for ``REPLICA_PIN_SECONDS`` so they see their own
+changes while the replicas catch up. Without a request (management commands,
+the shell) all queries go to the primary.
+"""
+
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import SimpleLazyObject
+
+# Seconds a replica is behind the primary; 0 when it has replayed everything
+# it received, so an idle primary doesn't read as lag
+REPLICATION_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery()
+            OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+class ReplicaHealth:
+    """
+    Whether each replica is reachable and caught up, checked at most once
+    every ``REPLICA_HEALTH_CHECK_INTERVAL`` seconds per replica in this
+    process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Alias -> (healthy, monotonic time of the check)
+        self._checks: Dict[str, Tuple[bool, float]] = {}
+
+    def is_healthy(self, alias: str) -> bool:
+        with self._lock:
+            healthy, checked_at = self._checks.get(alias, (False, None))
+        if (
+            checked_at is None
+            or time.monotonic() - checked_at >= settings.REPLICA_HEALTH_CHECK_INTERVAL
+        ):
+            healthy = self.check(alias)
+            self.record(alias, healthy)
+        return healthy
+
+    def check(self, alias: str) -> bool:
+        """Query a replica for its replication lag"""
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute(REPLICATION_LAG_SQL)
+                (lag,) = cursor.fetchone()
+        except Exception:
+            # Unreachable, misconfigured or refusing queries
+            return False
+        return float(lag or 0) <= settings.REPLICA_MAX_LAG
+
+    def record(self, alias: str, healthy: bool) -> None:
+        with self._lock:
+            self._checks[alias] = (healthy, time.monotonic())
+
+    def reset(self) -> None:
+        with self._lock:
+            self._checks.clear()
+
+
+replica_health = ReplicaHealth()
+
+
+def _pin_key(user) -> str:
+    return f"replica-pin:{user.pk}"
+
+
+def pin_to_primary(user) -> None:
+    """Keep a user's reads on the primary while replicas catch up"""
+    cache.set(_pin_key(user), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user) -> bool:
+    try:
+        return bool(cache.get(_pin_key(user)))
+    except Exception:
+        # Without the cache there's no telling, so assume a recent write
+        return True
+
+
+class RequestRouting:
+    """Routing state of one request"""
+
+    def __init__(self, request, use_replicas: bool):
+        self.request = request
+        self.use_replicas = use_replicas
+        self.wrote = False
+        self._read_alias: Optional[str] = None
+
+    def read_alias(self) -> str:
+        """The database this request reads from, fixed once the user is known"""
+        if self._read_alias is not None:
+            return self._read_alias
+        # The user isn't known until DRF has authenticated the request, so
+        # reads made while authenticating (and by non-DRF views) go to the
+        # primary
+        user = getattr(self.request, "user", None)
+        if user is None or isinstance(user, SimpleLazyObject):
+            return DEFAULT_DB_ALIAS
+        alias = DEFAULT_DB_ALIAS
+        if not (user.is_authenticated and is_pinned(user)):
+            healthy = [
+                replica
+                for replica in settings.REPLICA_DATABASES
+                if replica_health.is_healthy(replica)
+            ]
+            if healthy:
+                alias = random.choice(healthy)
+        self._read_alias = alias
+        return alias
+
+
+# Routing state of the request being handled, if any
+current_routing: ContextVar[Optional[RequestRouting]] = ContextVar(
+    "current_routing", default=None
+)
+
+
+class ReplicaRouter:
+    """Database router sending safe requests' reads to read replicas"""
+
+    def db_for_read(self, model, **hints):
+        routing = current_routing.get()
+        if routing is None or not routing.use_replicas or routing.wrote:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Reads in a transaction must see its writes
+            return DEFAULT_DB_ALIAS
+        return routing.read_alias()
+
+    def db_for_write(self, model, **hints):
+        routing = current_routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the primary's schema through replication
+        return db == DEFAULT_DB_ALIAS
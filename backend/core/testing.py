@@ -0,0 +1,37 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """
+    Test case mixin asserting that an endpoint runs a fixed number of
+    queries, however many rows it returns.
+    """
+
+    def assertQueryBudget(self, url, budget, add_rows, rounds=2, **params):
+        """
+        GET ``url`` (with ``params`` as the query string) ``rounds`` times,
+        calling ``add_rows()`` between requests so every request returns more
+        rows than the last. Each request must succeed, stay within ``budget``
+        queries and run exactly as many queries as the first one.
+        """
+        counts = []
+        for round_number in range(rounds):
+            if round_number:
+                add_rows()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200, response.content)
+            counts.append(len(queries))
+            self.assertLessEqual(
+                len(queries),
+                budget,
+                f"{url} ran {len(queries)} queries, over its budget of {budget}:\n"
+                + "\n".join(query["sql"] for query in queries.captured_queries),
+            )
+        self.assertEqual(
+            len(set(counts)),
+            1,
+            f"{url} ran {counts} queries as rows were added (N+1 query)",
+        )
+        return response
@@ -1,3 +1,276 @@
-from django.test import TestCase
+import gzip
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO
+from unittest import skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .middleware import (
+    CompressionMiddleware,
+    ReplicaRoutingMiddleware,
+    brotli,
+    choose_encoding,
+)
+from .metrics import request_metrics
+from .pools import connection_pool_stats
+from .renderers import ORJSONParser, ORJSONRenderer, orjson
+from .routers import ReplicaRouter, replica_health
+
+
+@skipUnless(orjson, "orjson is not installed")
+class ORJSONRendererTests(SimpleTestCase):
+    """orjson renders and parses exactly what DRF's JSON classes would"""
+
+    data = {
+        "results": [
+            {
+                "id": 1,
+                "received_date": datetime(
+                    2024, 5, 1, 12, 30, 15, 123456, dt_timezone.utc
+                ),
+                "confidence_score": 0.25,
+                "cost": Decimal("1.50"),
+                "status": _("Safe"),
+                "subject": "Zahlung überfällig ✉",
+                "analysis": None,
+                "matched_patterns": [],
+            }
+        ],
+        3: "non-string key",
+    }
+
+    def test_output_matches_drf(self):
+        self.assertEqual(
+            ORJSONRenderer().render(self.data), JSONRenderer().render(self.data)
+        )
+        self.assertEqual(
+            ORJSONRenderer().render(self.data, "application/json; indent=4"),
+            JSONRenderer().render(self.data, "application/json; indent=2"),
+        )
+
+    def test_parser(self):
+        parsed = ORJSONParser().parse(BytesIO(b'{"subject": "\xc3\xbcber", "n": [1]}'))
+        self.assertEqual(parsed, {"subject": "über", "n": [1]})
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(BytesIO(b'{"subject": '))
+
+
+@override_settings(RESPONSE_COMPRESSION_MIN_SIZE=100)
+class CompressionMiddlewareTests(SimpleTestCase):
+    body = b'{"subject": "Quarterly invoice"}' * 20
+
+    def respond(self, response, accept_encoding="gzip, deflate"):
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_negotiation(self):
+        self.assertEqual(choose_encoding("gzip;q=1.0, identity; q=0.5"), "gzip")
+        self.assertIsNone(choose_encoding("gzip;q=0"))
+        self.assertIsNone(choose_encoding("identity"))
+        self.assertEqual(choose_encoding("*"), "br" if brotli else "gzip")
+        self.assertEqual(choose_encoding("gzip, br"), "br" if brotli else "gzip")
+
+    def test_large_responses_are_compressed(self):
+        response = HttpResponse(self.body, content_type="application/json")
+        response["ETag"] = '"abc"'
+        response = self.respond(response)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(response["ETag"], 'W/"abc"')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_small_precompressed_and_unaccepted_responses_are_not(self):
+        for response, accept_encoding in [
+            (HttpResponse(self.body[:99]), "gzip"),
+            (HttpResponse(self.body, content_type="application/gzip"), "gzip"),
+            (HttpResponse(self.body), "identity"),
+        ]:
+            response = self.respond(response, accept_encoding)
+            self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_gzip_length_varies(self):
+        # The random file name in the header mitigates BREACH, as in Django's
+        # GZipMiddleware
+        lengths = set()
+        for _ in range(10):
+            response = self.respond(HttpResponse(self.body))
+            self.assertEqual(gzip.decompress(response.content), self.body)
+            lengths.add(len(response.content))
+        self.assertGreater(len(lengths), 1)
+
+    def test_streaming_responses(self):
+        response = self.respond(StreamingHttpResponse(iter([self.body, self.body])))
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        content = b"".join(response.streaming_content)
+        self.assertEqual(gzip.decompress(content), self.body * 2)
+
+    @skipUnless(brotli, "brotli is not installed")
+    def test_brotli(self):
+        response = self.respond(HttpResponse(self.body), "gzip, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.content), self.body)
+
+
+@override_settings(REPLICA_DATABASES=["replica"])
+class ReplicaRoutingTests(SimpleTestCase):
+    """Safe requests read from healthy replicas unless the user just wrote"""
+
+    def setUp(self):
+        cache.clear()
+        replica_health.reset()
+        replica_health.record("replica", True)
+        self.addCleanup(replica_health.reset)
+        self.router = ReplicaRouter()
+        self.user = User(pk=1, username="analyst")
+
+    def route(self, method="get", user=None, write=False):
+        """Return the database a request's reads go to"""
+        aliases = []
+
+        def view(request):
+            # Set by DRF once it has authenticated the request
+            request.user = user or self.user
+            if write:
+                self.router.db_for_write(User)
+            aliases.append(self.router.db_for_read(User))
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)("/api/emails/")
+        request.user = SimpleLazyObject(lambda: self.user)
+        ReplicaRoutingMiddleware(view)(request)
+        return aliases[0]
+
+    def test_safe_requests_read_from_replicas(self):
+        self.assertEqual(self.route(), "replica")
+        self.assertEqual(self.route(user=AnonymousUser()), "replica")
+        self.assertEqual(self.route("post"), "default")
+        # Outside requests, e.g. in management commands
+        self.assertEqual(self.router.db_for_read(User), "default")
+
+    def test_writes_pin_the_user_to_the_primary(self):
+        self.assertEqual(self.route(write=True), "default")
+        self.assertEqual(self.route(), "default")
+        self.assertEqual(self.route(user=User(pk=2)), "replica")
+        cache.clear()
+        self.assertEqual(self.route(), "replica")
+
+        self.route("post")
+        self.assertEqual(self.route(), "default")
+
+    def test_unhealthy_replicas_fall_back_to_the_primary(self):
+        replica_health.record("replica", False)
+        self.assertEqual(self.route(), "default")
+        # "replica" isn't a configured database
+        self.assertFalse(replica_health.check("replica"))
+
+
+@skipUnless(settings.DB_POOL, "connection pooling is disabled")
+class ConnectionPoolTests(TestCase):
+    def test_stats(self):
+        connection.ensure_connection()
+        stats = connection_pool_stats()["default"]
+        self.assertEqual(stats["in_use"], 1)
+        self.assertEqual(stats["size"], stats["in_use"] + stats["idle"])
+        self.assertLessEqual(stats["size"], stats["max_size"])
+        self.assertGreaterEqual(stats["requests"], 1)
+        self.assertEqual(stats["timeouts"], 0)
+
+
+class RequestMetricsTests(TestCase):
+    """Requests are timed and profiled per view, and exported at /metrics"""
+
+    def setUp(self):
+        request_metrics.reset()
+        self.addCleanup(request_metrics.reset)
+        self.user = User.objects.create_user("analyst")
+
+    def client_for(self, user):
+        # Middleware reads its settings when the client first loads it
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def sample(self, metrics, name):
+        for line in metrics.splitlines():
+            if line.startswith(name + " "):
+                return float(line.split()[-1])
+        self.fail(f"{name} not exported:\n{metrics}")
+
+    def test_metrics(self):
+        client = self.client_for(self.user)
+        self.assertEqual(client.get("/api/emails/").status_code, 200)
+        self.assertEqual(client.get("/api/emails/").status_code, 200)
+        self.assertEqual(client.get("/api/emails/sender_domains/").status_code, 200)
+
+        with override_settings(DEBUG=True):
+            response = client.get("/metrics")
+        self.assertEqual(response["Content-Type"].split(";")[0], "text/plain")
+        metrics = response.content.decode()
+        self.assertIn("# TYPE http_request_duration_seconds histogram", metrics)
+        labels = '{view="email-list",method="GET"'
+        self.assertEqual(
+            self.sample(metrics, f'http_requests_total{labels},status="200"}}'), 2
+        )
+        self.assertEqual(
+            self.sample(
+                metrics, f'http_request_duration_seconds_bucket{labels},le="+Inf"}}'
+            ),
+            2,
+        )
+        self.assertGreater(
+            self.sample(metrics, f"http_request_db_queries_sum{labels}}}"), 0
+        )
+        self.assertGreater(
+            self.sample(metrics, f"http_request_serializer_seconds_total{labels}}}"),
+            0,
+        )
+        # Async views are profiled too
+        self.assertEqual(
+            self.sample(
+                metrics,
+                'http_request_db_queries_sum{view="email-sender-domains",method="GET"}',
+            ),
+            1,
+        )
+        self.assertEqual(
+            self.sample(
+                metrics,
+                'response_cache_requests_total{endpoint="email-list",outcome="hits"}',
+            ),
+            1,
+        )
+
+    def test_token(self):
+        with override_settings(METRICS_TOKEN="s3cret"):
+            self.assertEqual(self.client.get("/metrics").status_code, 401)
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+            self.assertEqual(response.status_code, 200)
+        # Without a token, metrics are only public with DEBUG on
+        with override_settings(METRICS_TOKEN="", DEBUG=False):
+            self.assertEqual(self.client.get("/metrics").status_code, 403)
+
+    def test_slow_request_log(self):
+        with override_settings(SLOW_REQUEST_LOG_MS=1, SLOW_REQUEST_LOG_STATEMENTS=1):
+            client = self.client_for(self.user)
+            with self.assertLogs("backend.slow_requests", "WARNING") as logs:
+                client.get("/api/emails/", {"search": "invoice"})
+        message = logs.records[-1].getMessage()
+        self.assertIn("GET /api/emails/?search=invoice (email-list) 200", message)
+        # The slowest statement, and only that one
+        self.assertEqual(len(message.splitlines()), 2)
+        self.assertIn("SELECT", message.splitlines()[1])
+
+        client = self.client_for(self.user)
+        with self.assertNoLogs("backend.slow_requests"):
+            client.get("/api/emails/")
@@ -1,3 +1,22 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
 
-# Create your views here.
+from .metrics import render_metrics
+
+
+def metrics(request):
+    """
+    Serve this process's metrics for Prometheus to scrape. Outside DEBUG they
+    are only served to requests bearing ``METRICS_TOKEN``.
+    """
+    if not settings.METRICS_TOKEN:
+        if not settings.DEBUG:
+            return HttpResponse("Set METRICS_TOKEN to serve metrics", status=403)
+    elif not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        return HttpResponse(status=401)
+    return HttpResponse(
+        render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class EmailsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "backend.emails"
+
+    def ready(self):
+        from backend.core.metrics import register_collector
+
+        from .caching import collect_response_cache_metrics
+
+        register_collector(collect_response_cache_metrics)
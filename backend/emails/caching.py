@@ -0,0 +1,205 @@
+import hashlib
+import threading
+from functools import wraps
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Sum
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import CacheVersion
+
+PATTERNS_SCOPE = "patterns"
+# Every mailbox, including unassigned email
+ALL_MAILBOXES_SCOPE = "mailbox:*"
+
+
+def mailbox_scope(user) -> str:
+    """Cache scope of a user's emails and everything nested in them"""
+    return f"mailbox:{user.pk}"
+
+
+def get_cache_versions(scopes: List[str]) -> str:
+    """
+    Read the current versions of ``scopes``, rendered as a string to key
+    cached responses with.
+
+    A scope whose version row doesn't exist yet has never been written to.
+    ``ALL_MAILBOXES_SCOPE`` is keyed on the sum of every mailbox's version,
+    which any committed write raises, and their maximum, which is fresh
+    whenever anything was written since the states of rolled back
+    transactions whose sums might match.
+    """
+    current = {}
+    named = [scope for scope in scopes if scope != ALL_MAILBOXES_SCOPE]
+    if named:
+        versions = CacheVersion.objects.filter(scope__in=named)
+        current.update(versions.values_list("scope", "version"))
+    if ALL_MAILBOXES_SCOPE in scopes:
+        mailboxes = CacheVersion.objects.filter(scope__startswith="mailbox:")
+        totals = mailboxes.aggregate(total=Sum("version"), latest=Max("version"))
+        current[ALL_MAILBOXES_SCOPE] = f"{totals['total'] or 0}/{totals['latest'] or 0}"
+    return ",".join(f"{scope}={current.get(scope, 0)}" for scope in scopes)
+
+
+class ResponseCacheStats:
+    """
+    Hit, miss and ``304 Not Modified`` counts of each cached endpoint in
+    this process. Cache errors are counted as misses as well as errors.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, endpoint: str, outcome: str) -> None:
+        with self._lock:
+            counts = self._counts.setdefault(
+                endpoint, {"hits": 0, "not_modified": 0, "misses": 0, "errors": 0}
+            )
+            counts[outcome] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            counts = {endpoint: dict(c) for endpoint, c in self._counts.items()}
+        for c in counts.values():
+            served = c["hits"] + c["not_modified"]
+            requests = served + c["misses"]
+            c["hit_rate"] = served / requests if requests else 0
+        return counts
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+response_cache_stats = ResponseCacheStats()
+
+
+def collect_response_cache_metrics():
+    """The response cache's counts, for the /metrics endpoint"""
+    endpoints = response_cache_stats.snapshot().items()
+    return [
+        (
+            "response_cache_requests",
+            "counter",
+            "Requests to cached endpoints, by outcome",
+            [
+                ("response_cache_requests_total", {"endpoint": e, "outcome": o}, c[o])
+                for e, c in endpoints
+                for o in ("hits", "not_modified", "misses")
+            ],
+        ),
+        (
+            "response_cache_errors",
+            "counter",
+            "Cache backend errors on cached endpoints",
+            [
+                ("response_cache_errors_total", {"endpoint": e}, c["errors"])
+                for e, c in endpoints
+            ],
+        ),
+    ]
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Compare ``etag`` to a list of tags, ignoring weakness (RFC 9110 13.1.2)"""
+    tags = parse_etags(header)
+    return "*" in tags or any(
+        tag.removeprefix("W/") == etag.removeprefix("W/") for tag in tags
+    )
+
+
+def cached_response(handler):
+    """
+    Cache a viewset method's successful response data under the versions of
+    the view's ``get_cache_scopes()``, so repeated requests are served
+    without querying or serializing until something in those scopes is
+    written to.
+
+    Data is cached before rendering, so one entry serves every format. The
+    versions are read before the response is built: a write committing in
+    between leaves newer data under the older key, never older data under
+    the newer one.
+
+    Responses carry an ETag derived from the same versions, so a request
+    whose ``If-None-Match`` still matches is answered ``304 Not Modified``
+    before anything is loaded or serialized.
+    """
+
+    @wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        endpoint = f"{self.basename}-{self.action}"
+        digest = self.get_response_digest(request)
+        etag = self.get_etag(request, digest)
+
+        if_none_match = request.headers.get("If-None-Match")
+        if etag and if_none_match and etag_matches(if_none_match, etag):
+            response_cache_stats.record(endpoint, "not_modified")
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        key = f"response:{digest}"
+        try:
+            data = cache.get(key)
+        except Exception:
+            # An unavailable cache backend only costs the cache's benefit
+            response_cache_stats.record(endpoint, "errors")
+            data = None
+        if data is not None:
+            response_cache_stats.record(endpoint, "hits")
+            response = Response(data)
+            response["X-Cache"] = "HIT"
+        else:
+            response_cache_stats.record(endpoint, "misses")
+            response = handler(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                try:
+                    cache.set(key, response.data, settings.RESPONSE_CACHE_TTL)
+                except Exception:
+                    response_cache_stats.record(endpoint, "errors")
+            response["X-Cache"] = "MISS"
+        if etag and response.status_code == 200:
+            response["ETag"] = etag
+        return response
+
+    return wrapper
+
+
+class CachedResponseMixin:
+    """
+    Cache list and detail responses of a viewset, and answer conditional
+    requests for them.
+
+    ``get_cache_scopes`` must cover everything a response depends on,
+    including the requesting user where responses differ between users.
+    """
+
+    def get_cache_scopes(self) -> List[str]:
+        return [mailbox_scope(self.request.user), PATTERNS_SCOPE]
+
+    def get_response_digest(self, request, action: Optional[str] = None) -> str:
+        """Hash what the response to ``request`` depends on, as of now"""
+        endpoint = f"{self.basename}-{action or self.action}"
+        versions = get_cache_versions(self.get_cache_scopes())
+        uri = request.build_absolute_uri()
+        return hashlib.sha256(f"{endpoint}|{versions}|{uri}".encode()).hexdigest()
+
+    def get_etag(self, request, digest: str) -> Optional[str]:
+        """
+        Return the strong ETag of the response with this digest, in the
+        format it will be rendered in.
+        """
+        media_type = request.accepted_media_type
+        tag = hashlib.sha256(f"{digest}|{media_type}".encode()).hexdigest()[:32]
+        return f'"{tag}"'
+
+    @cached_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
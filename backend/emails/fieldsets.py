@@ -0,0 +1,212 @@
+"""
+Sparse fieldsets: ``?fields=`` and ``?expand=`` narrow a response to the
+fields a client asks for, and the queryset to the columns and relations
+those fields need.
+
+Fields are comma-separated, with dots selecting fields of nested objects,
+e.g. ``?fields=id,status,analysis.risk_score``. ``?expand=`` adds fields to
+the endpoint's default ones instead of replacing them, e.g. the analysis of
+each email in the list with ``?expand=analysis``.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+# Field name -> nested fieldset, empty for the whole field
+Fieldset = Dict[str, "Fieldset"]
+
+
+def parse_fieldset(value: str) -> Fieldset:
+    """Parse ``a,b.c,b.d`` into ``{"a": {}, "b": {"c": {}, "d": {}}}``"""
+    fieldset: Fieldset = {}
+    for path in value.split(","):
+        names = [name.strip() for name in path.split(".")]
+        if not all(names):
+            continue
+        node = fieldset
+        for name in names:
+            node = node.setdefault(name, {})
+    return fieldset
+
+
+def merge_fieldsets(base: Fieldset, extra: Fieldset) -> Fieldset:
+    """Combine two fieldsets; a whole field beats a selection of its fields"""
+    merged = dict(base)
+    for name, nested in extra.items():
+        if name not in merged:
+            merged[name] = nested
+        elif merged[name] and nested:
+            merged[name] = merge_fieldsets(merged[name], nested)
+        else:
+            merged[name] = {}
+    return merged
+
+
+def _nested_serializer(field) -> Optional[serializers.Serializer]:
+    child = getattr(field, "child", field)
+    return child if isinstance(child, serializers.Serializer) else None
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer taking a ``fields`` fieldset that narrows the fields it
+    renders, including those of nested serializers that take one too.
+    """
+
+    def __init__(self, *args, fields: Optional[Fieldset] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None:
+            return
+        for name in list(self.fields):
+            if name not in fields:
+                self.fields.pop(name)
+        for name, nested in fields.items():
+            field = self.fields[name]
+            child = _nested_serializer(field)
+            if nested and child is not None:
+                self.fields[name] = type(child)(
+                    many=child is not field, read_only=True, fields=nested
+                )
+
+    @classmethod
+    def validate_fieldset(cls, fieldset: Fieldset, path: str = "") -> None:
+        """Raise ``ValidationError`` for fields the serializer doesn't have"""
+        available = cls().fields
+        for name, nested in fieldset.items():
+            if name not in available:
+                raise ValidationError({"fields": [f"Unknown field: {path}{name}"]})
+            if not nested:
+                continue
+            child = _nested_serializer(available[name])
+            if not isinstance(child, SparseFieldsetMixin):
+                raise ValidationError(
+                    {"fields": [f"{path}{name} has no fields to select"]}
+                )
+            child.validate_fieldset(nested, f"{path}{name}.")
+
+
+def _queryset_plan(
+    serializer, prefix: str = ""
+) -> Tuple[Optional[List[str]], List[str], List[Prefetch]]:
+    """
+    Work out what a serializer's fields load: the columns for ``only()``
+    (None if some field needs the whole row), the relations to join and
+    the relations to prefetch.
+    """
+    model = serializer.Meta.model
+    only: Optional[List[str]] = [prefix + model._meta.pk.name]
+    select_related, prefetch = [], []
+    for field in serializer.fields.values():
+        source = field.source
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            # Properties, methods and "*" sources may read any column
+            only = None
+            continue
+        child = _nested_serializer(field)
+        if child is None:
+            if only is not None:
+                only.append(prefix + source)
+            if isinstance(field, serializers.StringRelatedField):
+                select_related.append(prefix + source)
+        elif model_field.many_to_many or model_field.one_to_many:
+            # Reverse foreign keys are matched up by the foreign key column
+            remote = model_field.remote_field
+            child_only, child_select, child_prefetch = _queryset_plan(child)
+            queryset = child.Meta.model.objects.all()
+            if child_select:
+                queryset = queryset.select_related(*child_select)
+            if child_only is not None:
+                if model_field.one_to_many:
+                    child_only.append(remote.name)
+                queryset = queryset.only(*child_only)
+            prefetch.append(
+                Prefetch(
+                    prefix + source,
+                    queryset=queryset.prefetch_related(*child_prefetch),
+                )
+            )
+        else:
+            select_related.append(prefix + source)
+            child_only, child_select, child_prefetch = _queryset_plan(
+                child, f"{prefix}{source}__"
+            )
+            if only is not None:
+                if model_field.concrete:
+                    only.append(prefix + source)
+                if child_only is None:
+                    only = None
+                else:
+                    only.extend(child_only)
+            select_related.extend(child_select)
+            prefetch.extend(child_prefetch)
+    return only, select_related, prefetch
+
+
+def prune_queryset(queryset, serializer, always_load: Iterable[str] = ()):
+    """Restrict a queryset to what ``serializer`` renders, plus ``always_load``"""
+    only, select_related, prefetch = _queryset_plan(serializer)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    if only is not None:
+        queryset = queryset.only(*only, *always_load)
+    return queryset
+
+
+class SparseFieldsetViewMixin:
+    """
+    Viewset mixin applying ``?fields=`` and ``?expand=`` to its read actions.
+
+    ``get_default_fields`` names the fields an action renders when only
+    ``expand`` is given; ``fieldset_serializer_class`` is the serializer
+    fieldsets select from.
+    """
+
+    fieldset_actions = ("list", "retrieve")
+    fieldset_serializer_class = None
+    # Columns the view itself reads, e.g. for pagination cursors
+    fieldset_always_load: Tuple[str, ...] = ()
+
+    def get_default_fields(self) -> Iterable[str]:
+        return self.fieldset_serializer_class().fields.keys()
+
+    def get_fieldset(self) -> Optional[Fieldset]:
+        """Return the requested fieldset, or None to render the defaults"""
+        if self.action not in self.fieldset_actions:
+            return None
+        if not hasattr(self, "_fieldset"):
+            params = self.request.query_params
+            fields = parse_fieldset(params.get("fields", ""))
+            expand = parse_fieldset(params.get("expand", ""))
+            if not fields and not expand:
+                self._fieldset = None
+            else:
+                fieldset = fields or {name: {} for name in self.get_default_fields()}
+                fieldset = merge_fieldsets(fieldset, expand)
+                self.fieldset_serializer_class.validate_fieldset(fieldset)
+                self._fieldset = fieldset
+        return self._fieldset
+
+    def get_serializer_class(self):
+        if self.get_fieldset() is not None:
+            return self.fieldset_serializer_class
+        return super().get_serializer_class()
+
+    def get_serializer(self, *args, **kwargs):
+        fieldset = self.get_fieldset()
+        if fieldset is not None:
+            kwargs["fields"] = fieldset
+        return super().get_serializer(*args, **kwargs)
+
+    def prune_queryset(self, queryset):
+        """Load only what the requested fieldset renders"""
+        fieldset = self.get_fieldset()
+        serializer = self.fieldset_serializer_class(fields=fieldset)
+        return prune_queryset(queryset, serializer, self.fieldset_always_load)
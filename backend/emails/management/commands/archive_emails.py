@@ -0,0 +1,138 @@
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import TruncMonth
+from backend.emails.models import Email
+from backend.emails.services.archive import (
+    ARCHIVE_FORMATS,
+    archive_month,
+    month_bounds,
+    parse_month,
+    rehydrate_month,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive emails past the retention period to compressed files, "
+        "one month at a time, and remove them from the database; or restore "
+        "an archived month with --rehydrate"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-months",
+            type=int,
+            default=settings.EMAIL_RETENTION_MONTHS,
+            help="Keep this many whole months of email, counting the current one",
+        )
+        parser.add_argument(
+            "--before",
+            type=str,
+            help="Archive months before this YYYY-MM instead (overrides retention)",
+        )
+        parser.add_argument(
+            "--format",
+            type=str,
+            choices=ARCHIVE_FORMATS,
+            default="parquet",
+            help="Archive file format (ndjson is gzip-compressed)",
+        )
+        parser.add_argument(
+            "--archive-dir",
+            type=str,
+            default=settings.EMAIL_ARCHIVE_DIR,
+            help="Directory the archive files are written to",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=5000, help="Rows deleted per transaction"
+        )
+        parser.add_argument(
+            "--rehydrate",
+            type=str,
+            metavar="YYYY-MM",
+            help="Restore this archived month into the database instead",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report which months would be archived",
+        )
+
+    def get_cutoff(self, options):
+        if options["before"]:
+            try:
+                return month_bounds(parse_month(options["before"]))[0]
+            except ValueError as e:
+                raise CommandError(str(e))
+        if options["retention_months"] < 1:
+            raise CommandError("--retention-months must be at least 1")
+        now = datetime.now(dt_timezone.utc)
+        months = now.year * 12 + now.month - options["retention_months"]
+        return datetime(months // 12, months % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+    def rehydrate(self, options):
+        try:
+            month = parse_month(options["rehydrate"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        started = time.perf_counter()
+        restored, skipped, paths = rehydrate_month(
+            month, archive_dir=options["archive_dir"]
+        )
+        if not paths:
+            raise CommandError(f"No archive found for {month:%Y-%m}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{month:%Y-%m}: restored {restored} emails ({skipped} already "
+                f"present) from {len(paths)} files "
+                f"in {time.perf_counter() - started:.2f}s"
+            )
+        )
+
+    def handle(self, *args, **options):
+        if options["rehydrate"]:
+            self.rehydrate(options)
+            return
+
+        cutoff = self.get_cutoff(options)
+        months = list(
+            Email.objects.filter(received_date__lt=cutoff)
+            .annotate(month=TruncMonth("received_date", tzinfo=dt_timezone.utc))
+            .values_list("month", flat=True)
+            .distinct()
+            .order_by("month")
+        )
+        if not months:
+            self.stdout.write(f"No emails received before {cutoff:%Y-%m}")
+            return
+
+        if options["dry_run"]:
+            for month in months:
+                start, end = month_bounds(month)
+                count = Email.objects.filter(
+                    received_date__gte=start, received_date__lt=end
+                ).count()
+                self.stdout.write(f"{month:%Y-%m}: {count} emails would be archived")
+            return
+
+        total = 0
+        for month in months:
+            started = time.perf_counter()
+            path, written = archive_month(
+                month.date(),
+                archive_format=options["format"],
+                archive_dir=options["archive_dir"],
+                chunk_size=options["chunk_size"],
+            )
+            total += written
+            if path:
+                self.stdout.write(
+                    f"{month:%Y-%m}: archived {written} emails to {path} "
+                    f"in {time.perf_counter() - started:.2f}s"
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Archived {total} emails from {len(months)} months")
+        )
@@ -0,0 +1,72 @@
+import os
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from backend.emails.models import Email
+from backend.emails.services.import_export import (
+    EXPORT_FORMATS,
+    export_emails_to_csv,
+    export_emails_to_json,
+    stream_emails_to_ndjson_gz,
+    write_emails_to_parquet,
+)
+
+
+class Command(BaseCommand):
+    help = "Export emails to JSON, CSV, gzip-compressed NDJSON or Parquet"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format",
+            type=str,
+            choices=EXPORT_FORMATS,
+            default="ndjson",
+            help="Output format (ndjson is gzip-compressed)",
+        )
+        parser.add_argument(
+            "--output", type=str, required=True, help="Output file path"
+        )
+        parser.add_argument(
+            "--user", type=str, help="Only export emails assigned to this username"
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=50000,
+            help="Rows per Parquet row group",
+        )
+
+    def handle(self, *args, **options):
+        output_format = options["format"]
+        output_path = options["output"]
+
+        emails = Email.objects.order_by("id")
+        if options["user"]:
+            try:
+                user = User.objects.get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist")
+            emails = emails.filter(assigned_to=user)
+
+        started = time.perf_counter()
+        if output_format == "ndjson":
+            with open(output_path, "wb") as f:
+                for chunk in stream_emails_to_ndjson_gz(emails):
+                    f.write(chunk)
+        elif output_format == "parquet":
+            with open(output_path, "wb") as f:
+                write_emails_to_parquet(emails, f, chunk_size=options["chunk_size"])
+        elif output_format == "csv":
+            with open(output_path, "w", newline="") as f:
+                f.write(export_emails_to_csv(emails))
+        else:  # json
+            with open(output_path, "w") as f:
+                f.write(export_emails_to_json(emails))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Exported emails to {output_path} "
+                f"({os.path.getsize(output_path)} bytes in {elapsed:.2f}s)"
+            )
+        )
@@ -1,17 +1,136 @@
 import json
 import csv
-from django.core.management.base import BaseCommand
+import os
+import shutil
+import multiprocessing
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import connections
 from backend.emails.models import (
     Email,
     EmailAttachment,
     SuspiciousPattern,
     EmailAnalysis,
 )
+from backend.emails.services.ingestion import ingest_emails
 from faker import Faker
+import numpy as np
 import re
 import argparse
 import random
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+
+FIELDNAMES = [
+    "sender",
+    "subject",
+    "content",
+    "status",
+    "confidence_score",
+    "received_date",
+    "is_quarantined",
+]
+
+# Latest received date of seeded runs that do not pass --base-date
+SEEDED_BASE_DATE = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def base_date_argument(value):
+    """Parse --base-date as an ISO 8601 date or datetime, in UTC if naive"""
+    try:
+        base_date = datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid date: {value}")
+    if base_date.tzinfo is None:
+        base_date = base_date.replace(tzinfo=timezone.utc)
+    return base_date
+
+
+class FakerPool:
+    """
+    Drop-in stand-in for the Faker methods used here, sampling values from
+    pools generated once per worker instead of calling Faker per field
+    """
+
+    PROVIDERS = ["email", "url", "word", "name", "company", "date", "time"]
+
+    def __init__(self, rng, end_datetime, size=2000):
+        fake = Faker("en_GB")  # Use UK English locale
+        fake.seed_instance(rng.getrandbits(32))
+        self.rng = rng
+        self.pools = {
+            provider: [getattr(fake, provider)() for _ in range(size)]
+            for provider in ["email", "url", "word", "name", "company"]
+        }
+        # Bound dates and times so seeded runs do not depend on the clock
+        self.pools["date"] = [fake.date(end_datetime=end_datetime) for _ in range(size)]
+        self.pools["time"] = [fake.time(end_datetime=end_datetime) for _ in range(size)]
+
+    def __getattr__(self, name):
+        if name not in self.PROVIDERS:
+            raise AttributeError(name)
+        pool = self.pools[name]
+        return lambda: self.rng.choice(pool)
+
+
+def generate_shard(task):
+    """
+    Generate one worker's share of emails with its own RNG stream, writing
+    them to a part file or inserting them into the database in batches
+    """
+    index, count, seed, options = task
+    rng = random.Random(seed)
+    command = Command()
+    base_date = datetime.fromisoformat(options["base_date"])
+    fake = FakerPool(rng, base_date)
+
+    def emails():
+        for number in range(count):
+            roll = rng.random()
+            if roll < 1 / 5:  # ~20% dangerous
+                kind = "dangerous"
+            elif roll < 1 / 5 + 1 / 3:  # ~33% suspicious
+                kind = "suspicious"
+            else:
+                kind = "safe"
+            email_data = command.build_email(fake, kind, base_date, rng)
+            email_data["message_id"] = f"<{seed}.{number}@synthetic.invalid>"
+            yield email_data
+
+    if options["direct_db"]:
+
+        def generated():
+            for email_data in emails():
+                email_data["message_id"] = Email.normalize_message_id(
+                    email_data["message_id"]
+                )
+                yield Email(
+                    **email_data,
+                    dedup_key=Email.make_dedup_key(
+                        email_data["sender"],
+                        email_data["subject"],
+                        email_data["content"],
+                        message_id=email_data["message_id"],
+                    ),
+                    assigned_to_id=options["user_id"],
+                )
+
+        written = ingest_emails(generated(), batch_size=options["batch_size"])
+        if multiprocessing.parent_process() is not None:
+            # A forked worker closes its own connections; in-process, the
+            # caller's connection (and any transaction on it) is left alone
+            connections.close_all()
+        return written
+
+    with open(options["part_paths"][index], "w", newline="") as f:
+        if options["format"] == "ndjson":
+            for email_data in emails():
+                f.write(json.dumps(email_data, separators=(",", ":")))
+                f.write("\n")
+        else:  # csv
+            writer = csv.DictWriter(f, fieldnames=FIELDNAMES + ["message_id"])
+            for email_data in emails():
+                writer.writerow(email_data)
+    return count
 
 
 class Command(BaseCommand):
@@ -24,20 +143,50 @@ class Command(BaseCommand):
         parser.add_argument(
             "--format",
             type=str,
-            choices=["json", "csv"],
+            choices=["json", "csv", "ndjson"],
             default="json",
-            help="Output format (json or csv)",
-        )
-        parser.add_argument(
-            "--output", type=str, required=True, help="Output file path"
+            help="Output format (json, csv or ndjson; csv and ndjson are streamed)",
         )
+        parser.add_argument("--output", type=str, help="Output file path")
         parser.add_argument(
             "--clear",
             action="store_true",
             help="Clear existing emails before generating new ones",
         )
+        parser.add_argument(
+            "--seed", type=int, help="Seed for reproducible output (random if unset)"
+        )
+        parser.add_argument(
+            "--base-date",
+            type=base_date_argument,
+            help="Latest received date; emails are spread over the 30 days "
+            "before it. Defaults to now, or to 2025-01-01 with --seed so a "
+            "seed gives the same output on any day",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Worker processes for streamed generation",
+        )
+        parser.add_argument(
+            "--direct-db",
+            action="store_true",
+            help="Insert generated emails into the database instead of a file",
+        )
+        parser.add_argument(
+            "--user", type=str, help="Username to assign directly inserted emails to"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Rows per database batch with --direct-db",
+        )
 
-    def generate_healthcare_content(self, fake, is_suspicious, is_dangerous=False):
+    def generate_healthcare_content(
+        self, fake, is_suspicious, is_dangerous=False, rng=random
+    ):
         """Generate healthcare-related email content"""
         if is_dangerous:
             # High-risk content for dangerous emails
@@ -48,7 +197,7 @@ class Command(BaseCommand):
                 "Security Alert: Unauthorized access to your healthcare portal detected: {url}",
                 "IMMEDIATE ACTION REQUIRED: Your prescription benefits are suspended: {url}",
             ]
-            content = random.choice(templates).format(url=fake.url())
+            content = rng.choice(templates).format(url=fake.url())
             subject = content.split("\n")[0]
 
         elif is_suspicious:
@@ -58,7 +207,7 @@ class Command(BaseCommand):
                 "Skip NHS waiting times!\n\nPrivate consultations available for:\n- {specialty1}\n- {specialty2}\n\nBook now: {url}",
                 "Exclusive medical offer!\n\nGet immediate access to:\n- {treatment1}\n- {treatment2}\n\nLimited time offer: {url}",
             ]
-            content = random.choice(templates).format(
+            content = rng.choice(templates).format(
                 drug1=fake.word(),
                 drug2=fake.word(),
                 specialty1=fake.word(),
@@ -79,7 +228,7 @@ class Command(BaseCommand):
                 "Reminder: Your prescription for {medication} is ready for collection at {pharmacy}.",
                 "NHS Newsletter: Updates on {topic1} and {topic2}\n\nRead more about our services at {url}",
             ]
-            content = random.choice(templates).format(
+            content = rng.choice(templates).format(
                 date=fake.date(),
                 time=fake.time(),
                 location=fake.company(),
@@ -94,6 +243,32 @@ class Command(BaseCommand):
 
         return subject, content
 
+    def build_email(self, fake, kind, base_date, rng=random):
+        """Generate one email of the given kind (safe, suspicious or dangerous)"""
+        subject, content = self.generate_healthcare_content(
+            fake,
+            is_suspicious=kind != "safe",
+            is_dangerous=kind == "dangerous",
+            rng=rng,
+        )
+        if kind == "dangerous":
+            confidence_score = rng.uniform(0.7, 1.0)
+        elif kind == "suspicious":
+            confidence_score = rng.uniform(0.3, 0.7)
+        else:
+            confidence_score = rng.uniform(0.0, 0.3)
+        return {
+            "sender": fake.email(),
+            "subject": subject,
+            "content": content,
+            "status": kind,
+            "confidence_score": confidence_score,
+            "received_date": (
+                base_date - timedelta(days=rng.randint(0, 30))
+            ).isoformat(),
+            "is_quarantined": kind != "safe",
+        }
+
     def create_suspicious_patterns(self):
         """Create healthcare-specific suspicious patterns"""
         patterns = [
@@ -185,17 +360,35 @@ class Command(BaseCommand):
             )
 
     def handle(self, *args, **options):
-        fake = Faker("en_GB")  # Use UK English locale
         count = options["count"]
         output_format = options["format"]
         output_path = options["output"]
 
+        if not output_path and not options["direct_db"]:
+            raise CommandError("--output is required unless --direct-db is used")
+        if options["base_date"] is None:
+            options["base_date"] = (
+                SEEDED_BASE_DATE
+                if options["seed"] is not None
+                else datetime.now(timezone.utc)
+            )
+
         if options["clear"]:
             Email.objects.all().delete()
             EmailAttachment.objects.all().delete()
             EmailAnalysis.objects.all().delete()
             self.stdout.write(self.style.SUCCESS("Cleared all existing emails"))
 
+        if options["direct_db"] or output_format != "json":
+            self.generate_streamed(options)
+            return
+
+        if options["workers"] > 1:
+            raise CommandError("--workers requires the csv or ndjson format")
+
+        rng = random.Random(options["seed"])
+        base_date = options["base_date"]
+        fake = FakerPool(rng, base_date)
         generated_emails = []
 
         # Calculate counts for each type
@@ -203,75 +396,90 @@ class Command(BaseCommand):
         suspicious_count = count // 3  # ~33% suspicious
         safe_count = count - dangerous_count - suspicious_count  # remainder safe
 
-        # Generate dangerous emails
-        for _ in range(dangerous_count):
-            subject, content = self.generate_healthcare_content(
-                fake, is_suspicious=True, is_dangerous=True
-            )
-            email_data = {
-                "sender": fake.email(),
-                "subject": subject,
-                "content": content,
-                "status": "dangerous",
-                "confidence_score": random.uniform(0.7, 1.0),
-                "received_date": (
-                    datetime.now() - timedelta(days=random.randint(0, 30))
-                ).isoformat(),
-                "is_quarantined": True,
-            }
-            generated_emails.append(email_data)
-
-        # Generate suspicious emails
-        for _ in range(suspicious_count):
-            subject, content = self.generate_healthcare_content(
-                fake, is_suspicious=True
-            )
-            email_data = {
-                "sender": fake.email(),
-                "subject": subject,
-                "content": content,
-                "status": "suspicious",
-                "confidence_score": random.uniform(0.3, 0.7),
-                "received_date": (
-                    datetime.now() - timedelta(days=random.randint(0, 30))
-                ).isoformat(),
-                "is_quarantined": True,
-            }
-            generated_emails.append(email_data)
-
-        # Generate safe emails
-        for _ in range(safe_count):
-            subject, content = self.generate_healthcare_content(
-                fake, is_suspicious=False
-            )
-            email_data = {
-                "sender": fake.email(),
-                "subject": subject,
-                "content": content,
-                "status": "safe",
-                "confidence_score": random.uniform(0.0, 0.3),
-                "received_date": (
-                    datetime.now() - timedelta(days=random.randint(0, 30))
-                ).isoformat(),
-                "is_quarantined": False,
-            }
-            generated_emails.append(email_data)
+        for kind, kind_count in (
+            ("dangerous", dangerous_count),
+            ("suspicious", suspicious_count),
+            ("safe", safe_count),
+        ):
+            for _ in range(kind_count):
+                generated_emails.append(self.build_email(fake, kind, base_date, rng))
 
         # Shuffle the emails to randomize their order
-        random.shuffle(generated_emails)
+        rng.shuffle(generated_emails)
 
         # Write to file
-        if output_format == "json":
-            with open(output_path, "w") as f:
-                json.dump(generated_emails, f, indent=2)
-        else:  # csv
-            with open(output_path, "w", newline="") as f:
-                writer = csv.DictWriter(f, fieldnames=generated_emails[0].keys())
-                writer.writeheader()
-                writer.writerows(generated_emails)
+        with open(output_path, "w") as f:
+            json.dump(generated_emails, f, indent=2)
 
         self.stdout.write(
             self.style.SUCCESS(
                 f"Successfully generated {count} emails and saved to {output_path}"
             )
         )
+
+    def generate_streamed(self, options):
+        """
+        Generate emails in worker processes, each with an independent RNG
+        stream spawned from the seed, so output is reproducible for a given
+        seed and worker count
+        """
+        count = options["count"]
+        workers = max(1, min(options["workers"], count or 1))
+        output_path = options["output"]
+
+        seed_sequence = np.random.SeedSequence(options["seed"])
+        worker_seeds = [
+            int(child.generate_state(1)[0]) for child in seed_sequence.spawn(workers)
+        ]
+
+        user_id = None
+        if options["user"]:
+            try:
+                user_id = User.objects.get(username=options["user"]).id
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist")
+
+        shared = {
+            "format": options["format"],
+            "direct_db": options["direct_db"],
+            "batch_size": options["batch_size"],
+            "user_id": user_id,
+            "base_date": options["base_date"].isoformat(),
+            "part_paths": [f"{output_path}.part{i:03d}" for i in range(workers)],
+        }
+        tasks = [
+            (i, count // workers + (1 if i < count % workers else 0), seed, shared)
+            for i, seed in enumerate(worker_seeds)
+        ]
+
+        if workers == 1:
+            results = [generate_shard(tasks[0])]
+        else:
+            # Children must open their own database connections
+            connections.close_all()
+            with multiprocessing.get_context("fork").Pool(workers) as pool:
+                results = pool.map(generate_shard, tasks)
+
+        if options["direct_db"]:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Successfully inserted {sum(results)} emails "
+                    f"(seed {seed_sequence.entropy}, {workers} workers)"
+                )
+            )
+            return
+
+        with open(output_path, "w", newline="") as f:
+            if options["format"] == "csv":
+                csv.writer(f).writerow(FIELDNAMES + ["message_id"])
+            for part_path in shared["part_paths"]:
+                with open(part_path, newline="") as part:
+                    shutil.copyfileobj(part, f)
+                os.remove(part_path)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Successfully generated {sum(results)} emails and saved to "
+                f"{output_path} (seed {seed_sequence.entropy}, {workers} workers)"
+            )
+        )
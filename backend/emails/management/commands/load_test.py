@@ -0,0 +1,99 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from urllib.parse import urlsplit
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+
+DEFAULT_PATHS = [
+    "/api/emails/",
+    "/api/emails/suspicious_summary/",
+    "/api/emails/sender_domains/",
+    "/api/emails/public_stats/",
+    "/api/export/changes/",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test a running API server with concurrent authenticated requests "
+        "and report throughput and latency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url", type=str, default="http://localhost:8000", help="Server URL"
+        )
+        parser.add_argument(
+            "--username", type=str, required=True, help="User to authenticate as"
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=32, help="Concurrent clients"
+        )
+        parser.add_argument(
+            "--requests", type=int, default=2000, help="Total requests to send"
+        )
+        parser.add_argument(
+            "--path",
+            action="append",
+            dest="paths",
+            help="Path to request, in turn with any others (default: a mix of "
+            "list, summary and export endpoints)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['username']}' does not exist")
+        headers = {
+            "Authorization": f"Bearer {RefreshToken.for_user(user).access_token}",
+            "Accept-Encoding": "gzip",
+        }
+        url = urlsplit(options["url"])
+        paths = options["paths"] or DEFAULT_PATHS
+        concurrency = options["concurrency"]
+        total = options["requests"]
+
+        def client(index):
+            # One keep-alive connection per client, like a browser or proxy
+            connection = HTTPConnection(url.hostname, url.port or 80, timeout=120)
+            timings, errors = [], 0
+            for n in range(index, total, concurrency):
+                path = paths[n % len(paths)]
+                started = time.perf_counter()
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                timings.append((path, time.perf_counter() - started))
+                if response.status >= 400:
+                    errors += 1
+            connection.close()
+            return timings, errors
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(client, range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        timings = [timing for client_timings, _ in results for timing in client_timings]
+        errors = sum(client_errors for _, client_errors in results)
+        self.stdout.write(
+            f"{len(timings)} requests, {errors} errors in {elapsed:.1f}s: "
+            f"{len(timings) / elapsed:.1f} req/s, {self.summarize(timings)}"
+        )
+        for path in paths:
+            self.stdout.write(
+                f"  {path}: "
+                + self.summarize([timing for timing in timings if timing[0] == path])
+            )
+
+    def summarize(self, timings):
+        seconds = sorted(duration for _, duration in timings)
+        if not seconds:
+            return "no requests"
+        p99 = seconds[min(len(seconds) - 1, int(len(seconds) * 0.99))]
+        median = statistics.median(seconds)
+        return f"p50 {median * 1000:.0f}ms, p99 {p99 * 1000:.0f}ms"
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from backend.emails.models import Email
+
+
+class Command(BaseCommand):
+    help = "Backfill derived email statuses (high-confidence suspicious -> dangerous)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=5000, help="Rows updated per query"
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many emails would be updated",
+        )
+
+    def handle(self, *args, **options):
+        stale = Email.objects.filter(
+            status=Email.EmailStatus.SUSPICIOUS,
+            confidence_score__gte=Email.HIGH_RISK_THRESHOLD,
+        )
+
+        if options["dry_run"]:
+            self.stdout.write(f"{stale.count()} emails would be updated")
+            return
+
+        # Short chunked UPDATEs keep row locks brief on a busy table
+        updated = 0
+        while True:
+            ids = list(
+                stale.order_by("id").values_list("id", flat=True)[
+                    : options["chunk_size"]
+                ]
+            )
+            if not ids:
+                break
+            updated += stale.filter(id__in=ids).update(
+                status=Email.EmailStatus.DANGEROUS, updated_at=timezone.now()
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Reconciled status of {updated} emails"))
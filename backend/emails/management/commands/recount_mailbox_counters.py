@@ -0,0 +1,34 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from backend.emails.services.counters import recount_mailbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount per-user mailbox counters from the email table, repairing any "
+        "drift (safe to run periodically)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", type=str, help="Only recount this username's mailbox"
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by("id")
+        if options["user"]:
+            users = users.filter(username=options["user"])
+            if not users.exists():
+                raise CommandError(f"User '{options['user']}' does not exist")
+
+        checked = repaired = 0
+        for user_id in users.values_list("id", flat=True).iterator():
+            checked += 1
+            if recount_mailbox(user_id):
+                repaired += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Recounted {checked} mailboxes, repaired {repaired} with drift"
+            )
+        )
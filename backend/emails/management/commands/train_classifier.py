@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from backend.emails.models import Email
 from backend.emails.ml_service import EmailAnalyzer
@@ -6,11 +7,27 @@ from backend.emails.ml_service import EmailAnalyzer
 class Command(BaseCommand):
     help = "Train the email classifier using existing emails in the database"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            help="Train on the most recently received emails only",
+        )
+        parser.add_argument(
+            "--output",
+            type=str,
+            default=settings.EMAIL_CLASSIFIER_PATH,
+            help="Where to save the trained classifier for the servers to load",
+        )
+
     def handle(self, *args, **options):
         # Get all emails from the database
-        emails = Email.objects.all()
+        emails = Email.objects.order_by("-received_date")
+        if options["limit"]:
+            emails = emails[: options["limit"]]
+        rows = list(emails.values_list("content", "status"))
 
-        if emails.count() == 0:
+        if not rows:
             self.stdout.write(
                 self.style.WARNING(
                     "No emails found in database. Generate sample emails first."
@@ -19,15 +36,17 @@ class Command(BaseCommand):
             return
 
         # Prepare training data
-        email_texts = [email.content for email in emails]
-        labels = [email.status for email in emails]
+        email_texts = [content for content, _ in rows]
+        labels = [status for _, status in rows]
 
         # Initialize and train the analyzer
         analyzer = EmailAnalyzer()
         analyzer.train_model(email_texts, labels)
+        analyzer.save(options["output"])
 
         self.stdout.write(
             self.style.SUCCESS(
-                f"Successfully trained classifier on {len(email_texts)} emails"
+                f"Successfully trained classifier on {len(email_texts)} emails "
+                f"and saved it to {options['output']}"
             )
         )
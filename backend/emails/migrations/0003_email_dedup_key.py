@@ -0,0 +1,70 @@
+import hashlib
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_dedup_keys(apps, schema_editor):
+    """Key existing emails, leaving later duplicates in a mailbox unkeyed"""
+    Email = apps.get_model("emails", "Email")
+
+    seen = set()
+    batch = []
+    for email in Email.objects.order_by("id").iterator(chunk_size=2000):
+        source = "\x1f".join(
+            [
+                "msg",
+                (email.sender or "").strip().lower(),
+                email.subject or "",
+                email.content or "",
+                email.received_date.isoformat() if email.received_date else "",
+            ]
+        )
+        key = hashlib.sha256(source.encode("utf-8")).hexdigest()
+        if (email.assigned_to_id, key) in seen:
+            continue
+        seen.add((email.assigned_to_id, key))
+        email.dedup_key = key
+        batch.append(email)
+        if len(batch) >= 2000:
+            Email.objects.bulk_update(batch, ["dedup_key"])
+            batch = []
+
+    if batch:
+        Email.objects.bulk_update(batch, ["dedup_key"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emails", "0002_add_healthcare_patterns"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="email",
+            name="dedup_key",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=64,
+                null=True,
+                verbose_name="Deduplication Key",
+            ),
+        ),
+        migrations.AddField(
+            model_name="email",
+            name="message_id",
+            field=models.CharField(
+                blank=True, max_length=998, verbose_name="Message-ID"
+            ),
+        ),
+        migrations.RunPython(backfill_dedup_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="email",
+            constraint=models.UniqueConstraint(
+                fields=("assigned_to", "dedup_key"),
+                name="unique_email_dedup_key_per_user",
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.3 on 2026-10-19 04:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emails", "0003_email_dedup_key"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="email",
+            index=models.Index(
+                fields=["assigned_to", "updated_at", "id"],
+                name="email_assignee_updated_idx",
+            ),
+        ),
+    ]
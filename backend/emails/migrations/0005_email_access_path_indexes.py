@@ -0,0 +1,81 @@
+# Generated by Django 5.1.3 on 2026-10-19 04:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without blocking writes to a populated mailbox table
+    atomic = False
+
+    dependencies = [
+        ("emails", "0004_email_delta_export_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="email",
+            index=models.Index(
+                fields=["assigned_to", "-received_date"],
+                name="email_assignee_received_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="email",
+            index=models.Index(
+                fields=["assigned_to", "status", "-received_date"],
+                name="email_assignee_status_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="email",
+            index=models.Index(
+                condition=models.Q(
+                    ("status", "dangerous"),
+                    ("confidence_score__gte", 0.7),
+                    _connector="OR",
+                ),
+                fields=["assigned_to", "-received_date"],
+                name="email_assignee_high_risk_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="email",
+            index=models.Index(
+                fields=["status", "confidence_score"],
+                name="email_status_confidence_idx",
+            ),
+        ),
+        # The composite indexes above lead with assigned_to, so the plain
+        # foreign key index is dropped last, once they can serve its queries.
+        # A plain AlterField would drop it without CONCURRENTLY and recreate
+        # the foreign key constraint, locking the table while it revalidates.
+        migrations.RunSQL(
+            sql=(
+                "DROP INDEX CONCURRENTLY IF EXISTS "
+                '"emails_email_assigned_to_id_3fbe381a"'
+            ),
+            reverse_sql=(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS "
+                '"emails_email_assigned_to_id_3fbe381a" ON "emails_email" '
+                '("assigned_to_id")'
+            ),
+            state_operations=[
+                migrations.AlterField(
+                    model_name="email",
+                    name="assigned_to",
+                    field=models.ForeignKey(
+                        blank=True,
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="assigned_emails",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+    ]
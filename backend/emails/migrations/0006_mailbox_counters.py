@@ -0,0 +1,188 @@
+# Generated by Django 5.1.3 on 2026-10-19 04:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Counter column -> predicate over an email row
+COUNTERS = {
+    "total": "TRUE",
+    "safe": "status = 'safe'",
+    "suspicious": "status = 'suspicious'",
+    "dangerous": "status = 'dangerous'",
+    "high_risk": "status = 'dangerous' OR confidence_score >= 0.7",
+    "quarantined": "is_quarantined",
+    "correct_safe": "status = 'safe' AND confidence_score < 0.3",
+    "correct_suspicious": (
+        "status = 'suspicious' AND confidence_score >= 0.3 "
+        "AND confidence_score < 0.7"
+    ),
+    "correct_dangerous": "status = 'dangerous' AND confidence_score >= 0.7",
+}
+
+COUNTED_COLUMNS = ["assigned_to_id", "status", "confidence_score", "is_quarantined"]
+
+
+def signed_rows_sql(table, sign):
+    """Select the counted columns of every row in a table, with a sign"""
+    return f"SELECT {', '.join(COUNTED_COLUMNS)}, {sign} AS sign FROM {table}"
+
+
+def changed_rows_sql(alias, sign):
+    """Select one side (n or o) of updated rows whose counted columns changed"""
+    selected = ", ".join(f"{alias}.{column}" for column in COUNTED_COLUMNS)
+    new_columns = ", ".join(f"n.{column}" for column in COUNTED_COLUMNS)
+    old_columns = ", ".join(f"o.{column}" for column in COUNTED_COLUMNS)
+    return (
+        f"SELECT {selected}, {sign} AS sign"
+        " FROM new_rows n JOIN old_rows o ON o.id = n.id"
+        f" WHERE ({new_columns}) IS DISTINCT FROM ({old_columns})"
+    )
+
+
+def apply_deltas_sql(changes):
+    """
+    Upsert the per-user deltas of a set of signed email rows. Groups whose
+    deltas are all zero are skipped, and a missing counters row is only
+    created for a net gain, so rows moving away from a user being deleted
+    do not recreate that user's counters.
+    """
+    columns = ", ".join(COUNTERS)
+    sums = ",\n".join(
+        f"SUM(CASE WHEN {predicate} THEN sign ELSE 0 END) AS {column}"
+        for column, predicate in COUNTERS.items()
+    )
+    zeros = ", ".join("0" for _ in COUNTERS)
+    updates = ",\n".join(
+        f"{column} = c.{column} + EXCLUDED.{column}" for column in COUNTERS
+    )
+    return f"""
+    WITH deltas AS (
+        SELECT assigned_to_id AS user_id,
+        {sums}
+        FROM ({changes}) AS changes
+        WHERE assigned_to_id IS NOT NULL
+        GROUP BY assigned_to_id
+    )
+    INSERT INTO emails_mailboxcounters AS c (user_id, {columns}, updated_at)
+    SELECT user_id, {columns}, now() FROM deltas d
+    WHERE ({columns}) <> ({zeros})
+      AND (
+        d.total > 0
+        OR EXISTS (
+            SELECT 1 FROM emails_mailboxcounters m WHERE m.user_id = d.user_id
+        )
+      )
+    ON CONFLICT (user_id) DO UPDATE SET
+    {updates},
+    updated_at = EXCLUDED.updated_at;
+    """
+
+
+CREATE_TRIGGERS_SQL = f"""
+CREATE FUNCTION emails_apply_mailbox_counters() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        {apply_deltas_sql(signed_rows_sql("new_rows", 1))}
+    ELSIF TG_OP = 'DELETE' THEN
+        {apply_deltas_sql(signed_rows_sql("old_rows", -1))}
+    ELSE
+        {apply_deltas_sql(
+            changed_rows_sql("n", 1) + " UNION ALL " + changed_rows_sql("o", -1)
+        )}
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER emails_mailbox_counters_insert
+AFTER INSERT ON emails_email REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION emails_apply_mailbox_counters();
+
+CREATE TRIGGER emails_mailbox_counters_update
+AFTER UPDATE ON emails_email
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION emails_apply_mailbox_counters();
+
+CREATE TRIGGER emails_mailbox_counters_delete
+AFTER DELETE ON emails_email REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION emails_apply_mailbox_counters();
+"""
+
+DROP_TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS emails_mailbox_counters_insert ON emails_email;
+DROP TRIGGER IF EXISTS emails_mailbox_counters_update ON emails_email;
+DROP TRIGGER IF EXISTS emails_mailbox_counters_delete ON emails_email;
+DROP FUNCTION IF EXISTS emails_apply_mailbox_counters();
+"""
+
+BACKFILL_SQL = apply_deltas_sql(signed_rows_sql("emails_email", 1))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emails", "0005_email_access_path_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MailboxCounters",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="mailbox_counters",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("total", models.BigIntegerField(default=0, verbose_name="Total")),
+                ("safe", models.BigIntegerField(default=0, verbose_name="Safe")),
+                (
+                    "suspicious",
+                    models.BigIntegerField(default=0, verbose_name="Suspicious"),
+                ),
+                (
+                    "dangerous",
+                    models.BigIntegerField(default=0, verbose_name="Dangerous"),
+                ),
+                (
+                    "high_risk",
+                    models.BigIntegerField(default=0, verbose_name="High Risk"),
+                ),
+                (
+                    "quarantined",
+                    models.BigIntegerField(default=0, verbose_name="Quarantined"),
+                ),
+                (
+                    "correct_safe",
+                    models.BigIntegerField(
+                        default=0, verbose_name="Correctly Detected Safe"
+                    ),
+                ),
+                (
+                    "correct_suspicious",
+                    models.BigIntegerField(
+                        default=0, verbose_name="Correctly Detected Suspicious"
+                    ),
+                ),
+                (
+                    "correct_dangerous",
+                    models.BigIntegerField(
+                        default=0, verbose_name="Correctly Detected Dangerous"
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Mailbox Counters",
+                "verbose_name_plural": "Mailbox Counters",
+            },
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS_SQL, DROP_TRIGGERS_SQL),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.1.3 on 2026-10-19 04:58
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+TRIGRAM_INDEXES = {
+    "email_sender_trgm_idx": "sender",
+    "email_sender_name_trgm_idx": "sender_name",
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # pg_trgm ships with PostgreSQL's contrib package, which some builds omit;
+    # without it sender lookups keep working through sequential scans
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for name, column in TRIGRAM_INDEXES.items():
+            cursor.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+                f"ON emails_email USING gin ({column} gin_trgm_ops)"
+            )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for name in TRIGRAM_INDEXES:
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without blocking writes to a populated mailbox table
+    atomic = False
+
+    dependencies = [
+        ("emails", "0007_email_search_vector"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="email",
+            name="sender_domain",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.db.models.functions.text.Lower(
+                    models.Func(
+                        "sender",
+                        models.Value("@"),
+                        models.Value(2),
+                        function="SPLIT_PART",
+                    )
+                ),
+                output_field=models.CharField(
+                    max_length=254, verbose_name="Sender Domain"
+                ),
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="email",
+            index=models.Index(
+                fields=["assigned_to", "sender_domain"],
+                name="email_assignee_domain_idx",
+            ),
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name="email",
+                    index=django.contrib.postgres.indexes.GinIndex(
+                        fields=["sender"],
+                        name="email_sender_trgm_idx",
+                        opclasses=["gin_trgm_ops"],
+                    ),
+                ),
+                migrations.AddIndex(
+                    model_name="email",
+                    index=django.contrib.postgres.indexes.GinIndex(
+                        fields=["sender_name"],
+                        name="email_sender_name_trgm_idx",
+                        opclasses=["gin_trgm_ops"],
+                    ),
+                ),
+            ],
+        ),
+    ]
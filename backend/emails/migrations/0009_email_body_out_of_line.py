@@ -0,0 +1,68 @@
+from django.db import migrations
+
+# Once a row passes PostgreSQL's ~2 kB TOAST threshold, its widest values
+# (the body and its search document) are moved to the table's TOAST relation
+# until the row fits in this many bytes, instead of being compressed and
+# kept inline up to the threshold
+TOAST_TUPLE_TARGET = 256
+# Bodies long enough for their row to pass the threshold
+TOAST_BODY_LENGTH = 2000
+CHUNK_SIZE = 5000
+
+
+def use_lz4_compression(apps, schema_editor):
+    # lz4 compresses and decompresses text several times faster than the
+    # default pglz, but only builds compiled with it can use it
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_settings "
+            "WHERE name = 'default_toast_compression' AND 'lz4' = ANY(enumvals)"
+        )
+        if cursor.fetchone() is None:
+            return
+        for column in ("content", "search_vector"):
+            cursor.execute(
+                f"ALTER TABLE emails_email ALTER COLUMN {column} SET COMPRESSION lz4"
+            )
+
+
+def move_bodies_out_of_line(apps, schema_editor):
+    """
+    Rewrite existing rows with long bodies in id-range chunks, so their bodies
+    move out of the hot rows the way new rows' do. Each chunk commits on its
+    own, keeping locks short on a populated table; the rewritten rows leave
+    dead tuples behind for autovacuum.
+    """
+    Email = apps.get_model("emails", "Email")
+    table = schema_editor.quote_name(Email._meta.db_table)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"SELECT min(id), max(id) FROM {table}")
+        first, last = cursor.fetchone()
+        if first is None:
+            return
+        for start in range(first, last + 1, CHUNK_SIZE):
+            # Appending '' builds a new value, so it is compressed and stored
+            # afresh rather than the old inline copy being reused
+            cursor.execute(
+                f"UPDATE {table} SET content = content || '' "
+                f"WHERE id >= %s AND id < %s AND octet_length(content) > %s",
+                [start, start + CHUNK_SIZE, TOAST_BODY_LENGTH],
+            )
+
+
+class Migration(migrations.Migration):
+    # Commit each chunk of the body rewrite separately
+    atomic = False
+
+    dependencies = [
+        ("emails", "0008_email_sender_domain"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            f"ALTER TABLE emails_email SET (toast_tuple_target = {TOAST_TUPLE_TARGET})",
+            "ALTER TABLE emails_email RESET (toast_tuple_target)",
+        ),
+        migrations.RunPython(use_lz4_compression, migrations.RunPython.noop),
+        migrations.RunPython(move_bodies_out_of_line, migrations.RunPython.noop),
+    ]
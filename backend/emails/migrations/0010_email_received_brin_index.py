@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-19 05:13
+
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Build the index without blocking writes to a populated mailbox table
+    atomic = False
+
+    dependencies = [
+        ("emails", "0009_email_body_out_of_line"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="email",
+            index=django.contrib.postgres.indexes.BrinIndex(
+                fields=["received_date"], name="email_received_brin_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 5.1.3 on 2026-10-19 05:22
+
+from django.db import migrations, models
+
+# Table -> query for the cache scopes its changed rows (``{rows}``) belong to
+SCOPES_OF_ROWS = {
+    "emails_email": (
+        "SELECT 'mailbox:' || coalesce(assigned_to_id::text, 'none') FROM {rows}"
+    ),
+    "emails_emailanalysis": (
+        "SELECT 'mailbox:' || coalesce(e.assigned_to_id::text, 'none')"
+        " FROM {rows} r JOIN emails_email e ON e.id = r.email_id"
+    ),
+    "emails_emailattachment": (
+        "SELECT 'mailbox:' || coalesce(e.assigned_to_id::text, 'none')"
+        " FROM {rows} r JOIN emails_email e ON e.id = r.email_id"
+    ),
+    "emails_emailanalysis_matched_patterns": (
+        "SELECT 'mailbox:' || coalesce(e.assigned_to_id::text, 'none')"
+        " FROM {rows} r JOIN emails_emailanalysis a ON a.id = r.emailanalysis_id"
+        " JOIN emails_email e ON e.id = a.email_id"
+    ),
+    "emails_suspiciouspattern": "SELECT 'patterns' FROM {rows}",
+}
+
+
+def bump_versions_sql(scopes):
+    """
+    Move each distinct scope to a fresh version. Scopes are locked in a fixed
+    order so concurrent statements touching the same mailboxes cannot
+    deadlock.
+    """
+    return f"""
+    INSERT INTO emails_cacheversion AS v (scope, version)
+    SELECT scope, nextval('emails_cacheversion_seq')
+    FROM (SELECT DISTINCT scope FROM ({scopes}) AS s (scope) ORDER BY scope) AS d
+    ON CONFLICT (scope) DO UPDATE SET version = EXCLUDED.version;
+    """
+
+
+def create_triggers_sql(table, scopes):
+    return f"""
+CREATE FUNCTION {table}_bump_cache_versions() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        {bump_versions_sql(scopes.format(rows="new_rows"))}
+    ELSIF TG_OP = 'DELETE' THEN
+        {bump_versions_sql(scopes.format(rows="old_rows"))}
+    ELSE
+        {bump_versions_sql(
+            scopes.format(rows="new_rows")
+            + " UNION ALL "
+            + scopes.format(rows="old_rows")
+        )}
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER {table}_cache_versions_insert
+AFTER INSERT ON {table} REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION {table}_bump_cache_versions();
+
+CREATE TRIGGER {table}_cache_versions_update
+AFTER UPDATE ON {table} REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION {table}_bump_cache_versions();
+
+CREATE TRIGGER {table}_cache_versions_delete
+AFTER DELETE ON {table} REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION {table}_bump_cache_versions();
+"""
+
+
+def drop_triggers_sql(table):
+    return f"""
+DROP TRIGGER IF EXISTS {table}_cache_versions_insert ON {table};
+DROP TRIGGER IF EXISTS {table}_cache_versions_update ON {table};
+DROP TRIGGER IF EXISTS {table}_cache_versions_delete ON {table};
+DROP FUNCTION IF EXISTS {table}_bump_cache_versions();
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emails", "0010_email_received_brin_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CacheVersion",
+            fields=[
+                (
+                    "scope",
+                    models.CharField(
+                        max_length=64,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="Scope",
+                    ),
+                ),
+                ("version", models.BigIntegerField(verbose_name="Version")),
+            ],
+            options={
+                "verbose_name": "Cache Version",
+                "verbose_name_plural": "Cache Versions",
+            },
+        ),
+        migrations.RunSQL(
+            "CREATE SEQUENCE emails_cacheversion_seq",
+            "DROP SEQUENCE emails_cacheversion_seq",
+        ),
+        *(
+            migrations.RunSQL(
+                create_triggers_sql(table, scopes), drop_triggers_sql(table)
+            )
+            for table, scopes in SCOPES_OF_ROWS.items()
+        ),
+    ]
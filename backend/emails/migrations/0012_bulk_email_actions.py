@@ -0,0 +1,78 @@
+# Generated by Django 5.1.3 on 2026-10-19 05:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emails", "0011_cache_versions"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BulkEmailAction",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("quarantine", "Quarantine"),
+                            ("release", "Release"),
+                            ("reassign", "Reassign"),
+                            ("delete", "Delete"),
+                        ],
+                        max_length=20,
+                        verbose_name="Action",
+                    ),
+                ),
+                ("criteria", models.JSONField(default=dict, verbose_name="Criteria")),
+                (
+                    "affected",
+                    models.IntegerField(default=0, verbose_name="Emails Affected"),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "completed_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Completed At"
+                    ),
+                ),
+                (
+                    "assigned_to",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "performed_by",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="bulk_email_actions",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Bulk Email Action",
+                "verbose_name_plural": "Bulk Email Actions",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-19 06:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("emails", "0012_bulk_email_actions"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # As in 0003, later duplicates among unassigned emails are left
+        # unkeyed rather than deleted
+        migrations.RunSQL(
+            """
+            UPDATE emails_email SET dedup_key = NULL
+            WHERE assigned_to_id IS NULL AND dedup_key IS NOT NULL
+              AND id NOT IN (
+                SELECT MIN(id) FROM emails_email
+                WHERE assigned_to_id IS NULL AND dedup_key IS NOT NULL
+                GROUP BY dedup_key
+              )
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name="email",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("assigned_to__isnull", True)),
+                fields=("dedup_key",),
+                name="unique_email_dedup_key_unassigned",
+            ),
+        ),
+    ]
@@ -1,10 +1,13 @@
+import os
+import pickle
 import re
+import threading
 import numpy as np
 import pandas as pd
 from typing import Dict, List, Optional, Tuple, Any
 from collections import defaultdict
 
-import tensorflow as tf
+from django.conf import settings
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import LabelEncoder
 
@@ -68,6 +71,8 @@ class EmailAnalyzer:
 
         # Placeholder for ML model
         self.model = None
+        # The trained network's layer weights and biases, all predict() needs
+        self.weights = None
 
     def preprocess_email(self, email_text: str) -> str:
         """
@@ -231,15 +236,19 @@ class EmailAnalyzer:
 
         return risk_score, analysis_details
 
-    def extract_features(self, emails: List[str]) -> np.ndarray:
+    def extract_features(self, emails: List[str], fit: bool = False) -> np.ndarray:
         """
-        Extract TF-IDF features from email texts
+        Extract TF-IDF features from email texts, fitting the vocabulary to
+        them first when training
         """
         # Preprocess emails
         processed_emails = [self.preprocess_email(email) for email in emails]
 
         # Vectorize emails
-        features = self.tfidf_vectorizer.fit_transform(processed_emails)
+        if fit:
+            features = self.tfidf_vectorizer.fit_transform(processed_emails)
+        else:
+            features = self.tfidf_vectorizer.transform(processed_emails)
 
         return features.toarray()
 
@@ -248,10 +257,11 @@ class EmailAnalyzer:
         Train a simple neural network for email classification
         """
         # Preprocess and extract features
-        X = self.extract_features(emails)
+        X = self.extract_features(emails, fit=True)
         y = self.label_encoder.fit_transform(labels)
 
         # Split data
+        import tensorflow as tf
         from sklearn.model_selection import train_test_split
 
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2)
@@ -279,19 +289,57 @@ class EmailAnalyzer:
         # Evaluate
         loss, accuracy = self.model.evaluate(X_test, y_test)
         print(f"Model Accuracy: {accuracy}")
+        self.weights = self.model.get_weights()
+
+    def forward(self, features: np.ndarray) -> np.ndarray:
+        """
+        Run the trained network on rows of features with numpy, so serving
+        doesn't need TensorFlow. Dropout only applies while training, which
+        leaves three dense layers.
+        """
+        w1, b1, w2, b2, w3, b3 = self.weights
+        hidden = np.maximum(features @ w1 + b1, 0)
+        hidden = np.maximum(hidden @ w2 + b2, 0)
+        return 1 / (1 + np.exp(-(hidden @ w3 + b3)[:, 0]))
+
+    def save(self, path: str) -> None:
+        """Save the fitted vectorizer, label encoder and network weights"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        partial_path = path + ".partial"
+        with open(partial_path, "wb") as file:
+            pickle.dump(
+                {
+                    "tfidf_vectorizer": self.tfidf_vectorizer,
+                    "label_encoder": self.label_encoder,
+                    "weights": self.weights,
+                },
+                file,
+            )
+        os.replace(partial_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "EmailAnalyzer":
+        """Load an analyzer saved with :meth:`save`, ready to predict"""
+        with open(path, "rb") as file:
+            state = pickle.load(file)
+        analyzer = cls()
+        analyzer.tfidf_vectorizer = state["tfidf_vectorizer"]
+        analyzer.label_encoder = state["label_encoder"]
+        analyzer.weights = state["weights"]
+        return analyzer
 
     def predict(self, email_text: str) -> Dict[str, float]:
         """
         Predict the likelihood of an email being suspicious
         """
-        if not self.model:
+        if self.weights is None:
             raise ValueError("Model not trained. Call train_model() first.")
 
         # Preprocess and extract features
         features = self.extract_features([email_text])
 
         # Predict
-        ml_confidence = self.model.predict(features)[0][0]
+        ml_confidence = self.forward(features)[0]
 
         # Calculate comprehensive risk score
         risk_score, analysis_details = self.calculate_risk_score(
@@ -376,3 +424,20 @@ def train_email_classifier():
     else:
         print("Not enough training data. Generate more sample emails first.")
         return None
+
+
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+
+def get_analyzer() -> Optional[EmailAnalyzer]:
+    """
+    Return the classifier saved by the ``train_classifier`` command, loaded
+    once per process, or None if no classifier has been trained yet
+    """
+    global _analyzer
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None and os.path.exists(settings.EMAIL_CLASSIFIER_PATH):
+                _analyzer = EmailAnalyzer.load(settings.EMAIL_CLASSIFIER_PATH)
+    return _analyzer
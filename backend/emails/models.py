@@ -1,15 +1,46 @@
+import hashlib
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db.models import Func, Value
+from django.db.models.functions import Lower
 from django.utils.translation import gettext_lazy as _
 
 
+class EmailQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for email in objs:
+            email.derive_status()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if "confidence_score" in fields or "status" in fields:
+            objs = list(objs)
+            for email in objs:
+                email.derive_status()
+            fields = list({*fields, "status"})
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+
 class Email(models.Model):
+    # Suspicious emails at or above this confidence are treated as dangerous
+    HIGH_RISK_THRESHOLD = 0.7
+
     class EmailStatus(models.TextChoices):
         SAFE = "safe", _("Safe")
         SUSPICIOUS = "suspicious", _("Suspicious")
         DANGEROUS = "dangerous", _("Dangerous")
 
     sender = models.EmailField(_("Sender Email"))
+    # Lower-cased part of the sender address after the "@"
+    sender_domain = models.GeneratedField(
+        expression=Lower(Func("sender", Value("@"), Value(2), function="SPLIT_PART")),
+        output_field=models.CharField(_("Sender Domain"), max_length=254),
+        db_persist=True,
+    )
     sender_name = models.CharField(_("Sender Name"), max_length=255, blank=True)
     subject = models.CharField(_("Subject"), max_length=512)
     content = models.TextField(_("Email Content"))
@@ -35,19 +66,147 @@ class Email(models.Model):
         null=True,
         blank=True,
         related_name="assigned_emails",
+        # Covered by the composite indexes below, which all lead with it
+        db_index=False,
     )
     has_attachments = models.BooleanField(_("Has Attachments"), default=False)
+    message_id = models.CharField(_("Message-ID"), max_length=998, blank=True)
+    dedup_key = models.CharField(
+        _("Deduplication Key"), max_length=64, null=True, blank=True, editable=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Full-text search document, kept current by the database on every write
+    search_vector = models.GeneratedField(
+        expression=SearchVector("subject", weight="A", config="english")
+        + SearchVector("sender_name", "sender", weight="B", config="simple")
+        + SearchVector("content", weight="C", config="english"),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    objects = EmailQuerySet.as_manager()
 
     class Meta:
         ordering = ["-received_date"]
         verbose_name = _("Email")
         verbose_name_plural = _("Emails")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["assigned_to", "dedup_key"],
+                name="unique_email_dedup_key_per_user",
+            ),
+            # NULLs are distinct in the constraint above, so unassigned
+            # emails (loaded without --user) get their own. Emails without a
+            # key, e.g. ones created through the API, stay unconstrained.
+            models.UniqueConstraint(
+                fields=["dedup_key"],
+                condition=models.Q(assigned_to__isnull=True),
+                name="unique_email_dedup_key_unassigned",
+            ),
+        ]
+        indexes = [
+            # Mailbox list, newest first
+            models.Index(
+                fields=["assigned_to", "-received_date"],
+                name="email_assignee_received_idx",
+            ),
+            # Mailbox list filtered by status
+            models.Index(
+                fields=["assigned_to", "status", "-received_date"],
+                name="email_assignee_status_idx",
+            ),
+            # Mailbox list filtered to "dangerous" (status or high confidence)
+            models.Index(
+                fields=["assigned_to", "-received_date"],
+                condition=models.Q(status="dangerous")
+                | models.Q(confidence_score__gte=0.7),
+                name="email_assignee_high_risk_idx",
+            ),
+            # Stats buckets by status and confidence range
+            models.Index(
+                fields=["status", "confidence_score"],
+                name="email_status_confidence_idx",
+            ),
+            # Delta export walks a mailbox in (updated_at, id) order
+            models.Index(
+                fields=["assigned_to", "updated_at", "id"],
+                name="email_assignee_updated_idx",
+            ),
+            # Full-text search
+            GinIndex(fields=["search_vector"], name="email_search_vector_idx"),
+            # Month ranges for retention; mail arrives roughly in date order,
+            # so a block range index stays tiny and cheap to maintain
+            BrinIndex(fields=["received_date"], name="email_received_brin_idx"),
+            # Grouping and filtering a mailbox by sender domain
+            models.Index(
+                fields=["assigned_to", "sender_domain"],
+                name="email_assignee_domain_idx",
+            ),
+            # Substring and similarity matches on senders (needs pg_trgm)
+            GinIndex(
+                fields=["sender"],
+                opclasses=["gin_trgm_ops"],
+                name="email_sender_trgm_idx",
+            ),
+            GinIndex(
+                fields=["sender_name"],
+                opclasses=["gin_trgm_ops"],
+                name="email_sender_name_trgm_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.sender} - {self.subject} ({self.status})"
 
+    def save(self, *args, **kwargs):
+        self.derive_status()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "confidence_score" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "status"}
+        super().save(*args, **kwargs)
+
+    def derive_status(self):
+        """Promote suspicious emails with a high confidence score to dangerous"""
+        if (
+            self.status == Email.EmailStatus.SUSPICIOUS
+            and self.confidence_score is not None
+            and float(self.confidence_score) >= self.HIGH_RISK_THRESHOLD
+        ):
+            self.status = Email.EmailStatus.DANGEROUS
+
+    @staticmethod
+    def normalize_message_id(message_id) -> str:
+        """Strip whitespace and angle brackets from an RFC822 Message-ID"""
+        return (message_id or "").strip().strip("<>").strip()
+
+    @staticmethod
+    def make_dedup_key(
+        sender, subject, content, received_date=None, message_id=""
+    ) -> str:
+        """
+        Build a stable deduplication key for an email.
+
+        The RFC822 Message-ID is used when present, otherwise the key is a
+        hash of sender, subject, content and the original received date.
+        """
+        message_id = Email.normalize_message_id(message_id)
+        if message_id:
+            source = f"mid:{message_id}"
+        else:
+            if received_date and not isinstance(received_date, str):
+                received_date = received_date.isoformat()
+            source = "\x1f".join(
+                [
+                    "msg",
+                    (sender or "").strip().lower(),
+                    subject or "",
+                    content or "",
+                    received_date or "",
+                ]
+            )
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
 
 class EmailAttachment(models.Model):
     email = models.ForeignKey(
@@ -102,3 +261,162 @@ class EmailAnalysis(models.Model):
 
     def __str__(self):
         return f"Analysis for {self.email.subject}"
+
+
+class MailboxCounters(models.Model):
+    """
+    Per-user email counts backing the dashboard summary.
+
+    Rows are maintained incrementally by statement-level database triggers on
+    the email table, so inserts, updates and deletes from any code path
+    (including COPY ingestion and queryset updates) keep them current. The
+    ``recount_mailbox_counters`` command rebuilds them from scratch.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="mailbox_counters",
+    )
+    total = models.BigIntegerField(_("Total"), default=0)
+    safe = models.BigIntegerField(_("Safe"), default=0)
+    suspicious = models.BigIntegerField(_("Suspicious"), default=0)
+    dangerous = models.BigIntegerField(_("Dangerous"), default=0)
+    high_risk = models.BigIntegerField(_("High Risk"), default=0)
+    quarantined = models.BigIntegerField(_("Quarantined"), default=0)
+    correct_safe = models.BigIntegerField(_("Correctly Detected Safe"), default=0)
+    correct_suspicious = models.BigIntegerField(
+        _("Correctly Detected Suspicious"), default=0
+    )
+    correct_dangerous = models.BigIntegerField(
+        _("Correctly Detected Dangerous"), default=0
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Mailbox Counters")
+        verbose_name_plural = _("Mailbox Counters")
+
+    def __str__(self):
+        return f"Counters for {self.user.username} ({self.total} emails)"
+
+    def as_summary(self):
+        """Render the counters in the shape of the suspicious summary endpoint"""
+        correct = self.correct_safe + self.correct_suspicious + self.correct_dangerous
+        return {
+            "total_emails": self.total,
+            "suspicious_emails": self.suspicious,
+            "high_risk_emails": self.high_risk,
+            "detection_rate": correct / self.total if self.total else 0,
+        }
+
+
+class CacheVersion(models.Model):
+    """
+    Version of a set of cached responses, such as one user's mailbox or the
+    pattern list, that changes whenever the data behind them does.
+
+    Rows are bumped by statement-level database triggers on the email,
+    analysis, attachment and pattern tables, so writes from any code path
+    invalidate cached responses. Versions are drawn from a sequence, so a
+    version number is never reused, even by a rolled back transaction.
+    """
+
+    scope = models.CharField(_("Scope"), max_length=64, primary_key=True)
+    version = models.BigIntegerField(_("Version"))
+
+    class Meta:
+        verbose_name = _("Cache Version")
+        verbose_name_plural = _("Cache Versions")
+
+    def __str__(self):
+        return f"{self.scope} v{self.version}"
+
+
+class BulkEmailAction(models.Model):
+    """
+    Audit record of a bulk action on emails: who ran it, which emails it
+    selected and how many it changed.
+
+    ``affected`` is raised as each chunk commits, so an action that fails
+    part way still records what it did; ``completed_at`` is only set once
+    every chunk has run.
+    """
+
+    class Action(models.TextChoices):
+        QUARANTINE = "quarantine", _("Quarantine")
+        RELEASE = "release", _("Release")
+        REASSIGN = "reassign", _("Reassign")
+        DELETE = "delete", _("Delete")
+
+    action = models.CharField(_("Action"), max_length=20, choices=Action.choices)
+    performed_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="bulk_email_actions",
+    )
+    # New assignee of reassigned emails
+    assigned_to = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    # The ids or filter the emails were selected by, as requested
+    criteria = models.JSONField(_("Criteria"), default=dict)
+    affected = models.IntegerField(_("Emails Affected"), default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(_("Completed At"), null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = _("Bulk Email Action")
+        verbose_name_plural = _("Bulk Email Actions")
+
+    def __str__(self):
+        return f"{self.action} of {self.affected} emails by {self.performed_by}"
+
+
+class ArchiveRehydration(models.Model):
+    """
+    A request to restore an archived month of email, run in the background.
+
+    ``restored`` and ``skipped`` are filled in when the run finishes, and
+    ``error`` if it fails. Rehydration skips rows already present, so a run
+    cut short (a worker restarting, say) is completed by requesting the
+    month again.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", _("Pending")
+        RUNNING = "running", _("Running")
+        COMPLETED = "completed", _("Completed")
+        FAILED = "failed", _("Failed")
+
+    month = models.DateField(_("Month"))
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="archive_rehydrations",
+    )
+    status = models.CharField(
+        _("Status"), max_length=20, choices=Status.choices, default=Status.PENDING
+    )
+    restored = models.IntegerField(_("Emails Restored"), default=0)
+    skipped = models.IntegerField(_("Emails Already Present"), default=0)
+    error = models.TextField(_("Error"), blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(_("Started At"), null=True, blank=True)
+    completed_at = models.DateTimeField(_("Completed At"), null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = _("Archive Rehydration")
+        verbose_name_plural = _("Archive Rehydrations")
+
+    def __str__(self):
+        return f"Rehydration of {self.month:%Y-%m} ({self.status})"
@@ -0,0 +1,209 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.settings import api_settings
+
+from .services.counters import get_mailbox_count
+from .services.counts import count_queryset
+
+
+def encode_keyset_cursor(received_date: datetime, pk: int, reverse: bool) -> str:
+    """Encode a ``(received_date, id)`` position as an opaque cursor"""
+    raw = f"{received_date.isoformat()}|{pk}|{int(reverse)}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_keyset_cursor(cursor: str) -> Tuple[datetime, int, bool]:
+    """Decode a cursor produced by :func:`encode_keyset_cursor`"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        received_date, pk, reverse = raw.decode("utf-8").split("|")
+        return datetime.fromisoformat(received_date), int(pk), reverse == "1"
+    except (ValueError, UnicodeDecodeError):
+        raise ValidationError({"cursor": "Invalid cursor"})
+
+
+class EmailKeysetPagination(BasePagination):
+    """
+    Cursor pagination over ``(received_date, id)``.
+
+    Each page seeks straight to its position on the mailbox indexes, so a
+    deep page costs the same as the first one and no ``COUNT(*)`` is run.
+    Because the position is a key rather than an offset, emails arriving
+    while a client pages through the list never shift or repeat results.
+    Pass ``with_count=true`` for the size of the list when the page was
+    read, as ``count`` and ``count_is_approximate``.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = "cursor"
+    count_query_param = "with_count"
+    ordering_query_param = "ordering"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.descending = self.get_descending(request)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        position, reverse = None, False
+        if cursor:
+            received_date, pk, reverse = decode_keyset_cursor(cursor)
+            position = (received_date, pk)
+
+        # Walking backwards flips the scan, then the page is put back in order
+        scan_descending = self.descending != reverse
+        sign = "-" if scan_descending else ""
+        page_queryset = queryset.order_by(f"{sign}received_date", f"{sign}id")
+        if position is not None:
+            page_queryset = page_queryset.filter(
+                self.after_position(position, scan_descending)
+            )
+
+        results = list(page_queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if reverse:
+            results.reverse()
+
+        # Forward pages always have a way back once a cursor was followed;
+        # backward pages always have a way forward to where they came from
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = has_more if reverse else position is not None
+        self.first, self.last = (results[0], results[-1]) if results else (None,) * 2
+        self.count_is_approximate = False
+        self.count = (
+            self.get_count(queryset, request) if self.wants_count(request) else None
+        )
+        return results
+
+    def get_descending(self, request) -> bool:
+        ordering = request.query_params.get(self.ordering_query_param, "")
+        if ordering not in ("", "received_date", "-received_date"):
+            raise ValidationError(
+                {"ordering": "Cursor pagination only supports received_date ordering"}
+            )
+        return ordering != "received_date"
+
+    @staticmethod
+    def after_position(position: Tuple[datetime, int], descending: bool) -> Q:
+        received_date, pk = position
+        # The range on received_date alone keeps the seek on the index,
+        # the id comparison only breaks ties between equal dates
+        if descending:
+            return Q(received_date__lte=received_date) & (
+                Q(received_date__lt=received_date) | Q(id__lt=pk)
+            )
+        return Q(received_date__gte=received_date) & (
+            Q(received_date__gt=received_date) | Q(id__gt=pk)
+        )
+
+    def wants_count(self, request) -> bool:
+        value = request.query_params.get(self.count_query_param, "")
+        return value.lower() in ("1", "true", "yes")
+
+    def get_count(self, queryset, request) -> Optional[int]:
+        # An unfiltered or status-filtered mailbox is answered exactly from
+        # its counters row; anything narrower is counted or estimated
+        filters = set(request.query_params) - {
+            self.cursor_query_param,
+            self.count_query_param,
+            self.ordering_query_param,
+        }
+        if filters <= {"status"}:
+            count = get_mailbox_count(
+                request.user, request.query_params.get("status") or None
+            )
+            if count is not None:
+                return count
+        count, self.count_is_approximate = count_queryset(queryset)
+        return count
+
+    def get_link(self, email, reverse: bool) -> str:
+        cursor = encode_keyset_cursor(email.received_date, email.pk, reverse)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_next_link(self) -> Optional[str]:
+        if not self.has_next:
+            return None
+        if self.last is None:
+            # An empty backward page: start again from the top
+            return replace_query_param(self.base_url, self.cursor_query_param, "")
+        return self.get_link(self.last, reverse=False)
+
+    def get_previous_link(self) -> Optional[str]:
+        if not self.has_previous:
+            return None
+        if self.first is None:
+            return replace_query_param(self.base_url, self.cursor_query_param, "")
+        return self.get_link(self.first, reverse=True)
+
+    def get_paginated_response(self, data):
+        response = {
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        }
+        if self.count is not None:
+            response["count"] = self.count
+            response["count_is_approximate"] = self.count_is_approximate
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "count": {"type": "integer"},
+                "count_is_approximate": {"type": "boolean"},
+                "results": schema,
+            },
+        }
+
+
+class EstimatedCountPaginator(DjangoPaginator):
+    """Paginator whose total comes from :func:`count_queryset`"""
+
+    count_is_approximate = False
+
+    @cached_property
+    def count(self):
+        count, self.count_is_approximate = count_queryset(self.object_list)
+        return count
+
+
+class EmailPagination(PageNumberPagination):
+    """
+    Page numbers by default, for existing clients; switches to
+    :class:`EmailKeysetPagination` when a ``cursor`` parameter is present
+    (send it empty for the first page).
+
+    Large lists report an estimated ``count``, flagged by
+    ``count_is_approximate``.
+    """
+
+    django_paginator_class = EstimatedCountPaginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if EmailKeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = EmailKeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        response = super().get_paginated_response(data)
+        response.data["count_is_approximate"] = self.page.paginator.count_is_approximate
+        return response
@@ -1,9 +1,21 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Email, EmailAttachment, SuspiciousPattern, EmailAnalysis
+from .models import (
+    ArchiveRehydration,
+    BulkEmailAction,
+    Email,
+    EmailAttachment,
+    SuspiciousPattern,
+    EmailAnalysis,
+)
 from django.contrib.auth.models import User
+from backend.core.metrics import ProfiledSerializerMixin
+from .fieldsets import SparseFieldsetMixin
 
 
-class EmailAttachmentSerializer(serializers.ModelSerializer):
+class EmailAttachmentSerializer(
+    ProfiledSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer
+):
     class Meta:
         model = EmailAttachment
         fields = [
@@ -16,7 +28,9 @@ class EmailAttachmentSerializer(serializers.ModelSerializer):
         ]
 
 
-class SuspiciousPatternSerializer(serializers.ModelSerializer):
+class SuspiciousPatternSerializer(
+    ProfiledSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer
+):
     class Meta:
         model = SuspiciousPattern
         fields = [
@@ -30,7 +44,9 @@ class SuspiciousPatternSerializer(serializers.ModelSerializer):
         ]
 
 
-class EmailAnalysisSerializer(serializers.ModelSerializer):
+class EmailAnalysisSerializer(
+    ProfiledSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer
+):
     matched_patterns = SuspiciousPatternSerializer(many=True, read_only=True)
 
     class Meta:
@@ -45,17 +61,21 @@ class EmailAnalysisSerializer(serializers.ModelSerializer):
         ]
 
 
-class EmailSerializer(serializers.ModelSerializer):
+class EmailSerializer(
+    ProfiledSerializerMixin, SparseFieldsetMixin, serializers.ModelSerializer
+):
     attachments = EmailAttachmentSerializer(many=True, read_only=True)
     analysis = EmailAnalysisSerializer(read_only=True)
     reviewed_by = serializers.StringRelatedField(read_only=True)
     assigned_to = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
+    sender_domain = serializers.CharField(read_only=True)
 
     class Meta:
         model = Email
         fields = [
             "id",
             "sender",
+            "sender_domain",
             "sender_name",
             "subject",
             "content",
@@ -74,14 +94,17 @@ class EmailSerializer(serializers.ModelSerializer):
         read_only_fields = ["reviewed_by"]
 
 
-class EmailListSerializer(serializers.ModelSerializer):
+class EmailListSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     """Lightweight serializer for list views"""
 
+    sender_domain = serializers.CharField(read_only=True)
+
     class Meta:
         model = Email
         fields = [
             "id",
             "sender",
+            "sender_domain",
             "sender_name",
             "subject",
             "received_date",
@@ -89,3 +112,84 @@ class EmailListSerializer(serializers.ModelSerializer):
             "is_quarantined",
             "has_attachments",
         ]
+
+
+class BulkEmailFilterSerializer(serializers.Serializer):
+    """Emails a bulk action applies to, when not given by id"""
+
+    status = serializers.ChoiceField(choices=Email.EmailStatus.choices, required=False)
+    sender_domain = serializers.CharField(required=False)
+    # Campaigns are told apart by sender domain and subject
+    subject = serializers.CharField(required=False, max_length=512)
+    received_after = serializers.DateTimeField(required=False)
+    received_before = serializers.DateTimeField(required=False)
+    is_quarantined = serializers.BooleanField(required=False)
+
+    def validate(self, attrs):
+        # An empty filter would select the whole mailbox
+        if not attrs:
+            raise serializers.ValidationError("Give at least one filter")
+        return attrs
+
+
+class BulkEmailActionRequestSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(choices=BulkEmailAction.Action.choices)
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, required=False
+    )
+    filter = BulkEmailFilterSerializer(required=False)
+    assigned_to = serializers.PrimaryKeyRelatedField(
+        queryset=User.objects.all(), required=False
+    )
+
+    def validate_ids(self, ids):
+        limit = settings.EMAIL_BULK_ACTION_MAX_IDS
+        if len(ids) > limit:
+            raise serializers.ValidationError(
+                f"Ensure this field has no more than {limit} elements."
+            )
+        return ids
+
+    def validate(self, attrs):
+        if ("ids" in attrs) == ("filter" in attrs):
+            raise serializers.ValidationError("Give either ids or a filter")
+        if attrs["action"] == BulkEmailAction.Action.REASSIGN:
+            if "assigned_to" not in attrs:
+                raise serializers.ValidationError(
+                    {"assigned_to": ["Required to reassign emails"]}
+                )
+        return attrs
+
+
+class BulkEmailActionSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = BulkEmailAction
+        fields = [
+            "id",
+            "action",
+            "performed_by",
+            "assigned_to",
+            "criteria",
+            "affected",
+            "created_at",
+            "completed_at",
+        ]
+
+
+class ArchiveRehydrationSerializer(serializers.ModelSerializer):
+    month = serializers.DateField(format="%Y-%m")
+
+    class Meta:
+        model = ArchiveRehydration
+        fields = [
+            "id",
+            "month",
+            "requested_by",
+            "status",
+            "restored",
+            "skipped",
+            "error",
+            "created_at",
+            "started_at",
+            "completed_at",
+        ]
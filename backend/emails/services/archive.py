@@ -0,0 +1,488 @@
+import glob
+import gzip
+import json
+import os
+import threading
+import zlib
+from datetime import date, datetime, timezone as dt_timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from ..models import (
+    ArchiveRehydration,
+    Email,
+    EmailAnalysis,
+    EmailAttachment,
+    SuspiciousPattern,
+)
+
+ARCHIVE_FORMATS = ["ndjson", "parquet"]
+ARCHIVE_EXTENSIONS = {"ndjson": ".ndjson.gz", "parquet": ".parquet"}
+
+# Email columns kept in an archive, enough to restore the row exactly
+ARCHIVE_FIELDS = [
+    "id",
+    "sender",
+    "sender_name",
+    "subject",
+    "content",
+    "received_date",
+    "status",
+    "confidence_score",
+    "is_quarantined",
+    "reviewed_by_id",
+    "assigned_to_id",
+    "has_attachments",
+    "message_id",
+    "dedup_key",
+    "created_at",
+    "updated_at",
+]
+DATE_FIELDS = ["received_date", "created_at", "updated_at"]
+
+
+def month_bounds(month: date) -> Tuple[datetime, datetime]:
+    """Return the aware ``[start, end)`` range of the month containing ``month``"""
+    start = datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+    if month.month == 12:
+        end = start.replace(year=month.year + 1, month=1)
+    else:
+        end = start.replace(month=month.month + 1)
+    return start, end
+
+
+def parse_month(value: str) -> date:
+    """Parse a ``YYYY-MM`` month"""
+    try:
+        return datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        raise ValueError(f"Invalid month '{value}', expected YYYY-MM")
+
+
+def archive_paths(month: date, archive_dir: Optional[str] = None) -> List[str]:
+    """List the archive files holding a month, oldest first"""
+    archive_dir = archive_dir or settings.EMAIL_ARCHIVE_DIR
+    pattern = os.path.join(archive_dir, f"emails-{month:%Y-%m}-*")
+    return sorted(
+        path
+        for path in glob.glob(pattern)
+        if path.endswith(tuple(ARCHIVE_EXTENSIONS.values()))
+    )
+
+
+def list_archived_months(archive_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Summarise the archive directory as one entry per month"""
+    archive_dir = archive_dir or settings.EMAIL_ARCHIVE_DIR
+    months: Dict[str, Dict[str, Any]] = {}
+    for path in sorted(glob.glob(os.path.join(archive_dir, "emails-*"))):
+        name = os.path.basename(path)
+        if not name.endswith(tuple(ARCHIVE_EXTENSIONS.values())):
+            continue
+        entry = months.setdefault(name[7:14], {"month": name[7:14], "files": []})
+        entry["files"].append({"name": name, "size": os.path.getsize(path)})
+    return list(months.values())
+
+
+def iter_archive_rows(emails, chunk_size: int = 2000) -> Iterator[Dict[str, Any]]:
+    """
+    Yield archive rows for a queryset in id order, each email with its
+    analysis and attachment records nested.
+    """
+    last_id = 0
+    while True:
+        rows = list(
+            emails.filter(id__gt=last_id)
+            .order_by("id")
+            .values(*ARCHIVE_FIELDS)[:chunk_size]
+        )
+        if not rows:
+            return
+        ids = [row["id"] for row in rows]
+        last_id = ids[-1]
+
+        analyses = {
+            analysis.email_id: {
+                "risk_score": analysis.risk_score,
+                "ml_prediction": analysis.ml_prediction,
+                "notes": analysis.notes,
+                "analysis_date": analysis.analysis_date.isoformat(),
+                "matched_patterns": [p.id for p in analysis.matched_patterns.all()],
+            }
+            for analysis in EmailAnalysis.objects.filter(
+                email_id__in=ids
+            ).prefetch_related("matched_patterns")
+        }
+        attachments: Dict[int, List[Dict[str, Any]]] = {}
+        for attachment in EmailAttachment.objects.filter(email_id__in=ids).values(
+            "email_id",
+            "file",
+            "filename",
+            "content_type",
+            "size",
+            "is_suspicious",
+            "created_at",
+        ):
+            email_id = attachment.pop("email_id")
+            attachment["created_at"] = attachment["created_at"].isoformat()
+            attachments.setdefault(email_id, []).append(attachment)
+
+        for row in rows:
+            row["analysis"] = analyses.get(row["id"])
+            row["attachments"] = attachments.get(row["id"], [])
+            yield row
+
+
+def _write_ndjson_gz(rows: Iterable[Dict[str, Any]], path: str) -> int:
+    written = 0
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    with open(path, "wb") as f:
+        for row in rows:
+            for field in DATE_FIELDS:
+                row[field] = row[field].isoformat()
+            line = json.dumps(row, separators=(",", ":")) + "\n"
+            f.write(compressor.compress(line.encode("utf-8")))
+            written += 1
+        f.write(compressor.flush())
+    return written
+
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    return pa.schema(
+        [
+            ("id", pa.int64()),
+            ("sender", pa.string()),
+            ("sender_name", pa.string()),
+            ("subject", pa.string()),
+            ("content", pa.string()),
+            ("received_date", pa.timestamp("us", tz="UTC")),
+            ("status", pa.string()),
+            ("confidence_score", pa.float64()),
+            ("is_quarantined", pa.bool_()),
+            ("reviewed_by_id", pa.int64()),
+            ("assigned_to_id", pa.int64()),
+            ("has_attachments", pa.bool_()),
+            ("message_id", pa.string()),
+            ("dedup_key", pa.string()),
+            ("created_at", pa.timestamp("us", tz="UTC")),
+            ("updated_at", pa.timestamp("us", tz="UTC")),
+            # Nested records are stored as JSON text
+            ("analysis", pa.string()),
+            ("attachments", pa.string()),
+        ]
+    )
+
+
+def _write_parquet(
+    rows: Iterable[Dict[str, Any]], path: str, chunk_size: int = 50000
+) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema()
+    written = 0
+    chunk = []
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for row in rows:
+            row["analysis"] = json.dumps(row["analysis"])
+            row["attachments"] = json.dumps(row["attachments"])
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+                written += len(chunk)
+                chunk = []
+        if chunk or not written:
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            written += len(chunk)
+    return written
+
+
+def read_archive(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield the rows of an archive file written by :func:`archive_month`"""
+    if path.endswith(ARCHIVE_EXTENSIONS["parquet"]):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=5000):
+            for row in batch.to_pylist():
+                row["analysis"] = json.loads(row["analysis"])
+                row["attachments"] = json.loads(row["attachments"])
+                yield row
+    else:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    for field in DATE_FIELDS:
+                        row[field] = datetime.fromisoformat(row[field])
+                    yield row
+
+
+def archive_month(
+    month: date,
+    archive_format: str = "ndjson",
+    archive_dir: Optional[str] = None,
+    chunk_size: int = 5000,
+) -> Tuple[Optional[str], int]:
+    """
+    Move one month of emails, by ``received_date``, into an archive file.
+
+    The archive is written and renamed into place before anything is
+    deleted, then the archived rows are deleted in chunks of ``chunk_size``
+    so no single transaction holds a month of row locks. Analyses and
+    attachment records go with their emails; attachment files stay where
+    they are. Emails inserted into the month while it is being archived have
+    higher ids than any archived row and are left for the next run. Each
+    run writes a new file, so a run interrupted while deleting never
+    overwrites the archive of the rows it already removed.
+
+    The table is not partitioned by month, so archiving is a full DELETE
+    of the month's rows rather than a partition drop: the dead tuples and
+    their index entries stay until VACUUM (autovacuum, normally) reclaims
+    them, and that cycle costs about as much as the delete itself.
+
+    Returns ``(path, rows archived)``, or ``(None, 0)`` for an empty month.
+    """
+    if archive_format not in ARCHIVE_FORMATS:
+        raise ValueError(f"Unsupported archive format: {archive_format}")
+    archive_dir = archive_dir or settings.EMAIL_ARCHIVE_DIR
+    start, end = month_bounds(month)
+    emails = Email.objects.filter(received_date__gte=start, received_date__lt=end)
+
+    last_id = emails.order_by("-id").values_list("id", flat=True).first()
+    if last_id is None:
+        return None, 0
+    emails = emails.filter(id__lte=last_id)
+
+    os.makedirs(archive_dir, exist_ok=True)
+    stamp = timezone.now().strftime("%Y%m%dT%H%M%S%f")
+    path = os.path.join(
+        archive_dir,
+        f"emails-{month:%Y-%m}-{stamp}{ARCHIVE_EXTENSIONS[archive_format]}",
+    )
+    partial_path = path + ".partial"
+    rows = iter_archive_rows(emails)
+    if archive_format == "parquet":
+        written = _write_parquet(rows, partial_path)
+    else:
+        written = _write_ndjson_gz(rows, partial_path)
+    os.replace(partial_path, path)
+
+    while True:
+        ids = list(emails.order_by("id").values_list("id", flat=True)[:chunk_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            Email.objects.filter(id__in=ids).delete()
+
+    return path, written
+
+
+def _insert_ignoring_conflicts(model, rows: List[Dict[str, Any]]) -> None:
+    """
+    Insert rows with their stored values, including ids and the timestamps
+    that ``auto_now``/``auto_now_add`` would otherwise overwrite.
+    """
+    if not rows:
+        return
+    fields = [
+        model._meta.get_field(name)
+        for name in rows[0]
+        if not model._meta.get_field(name).generated
+    ]
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ", ".join(connection.ops.quote_name(f.column) for f in fields)
+    placeholders = "(" + ", ".join(["%s"] * len(fields)) + ")"
+    # One multi-row statement per batch rather than a round trip per row
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) "
+            f"VALUES {', '.join([placeholders] * len(rows))} "
+            f"ON CONFLICT DO NOTHING",
+            [
+                f.get_db_prep_save(row[f.name], connection)
+                for row in rows
+                for f in fields
+            ],
+        )
+
+
+def rehydrate_rows(
+    rows: Iterable[Dict[str, Any]], batch_size: int = 1000
+) -> Tuple[int, int]:
+    """
+    Restore archived rows into the live tables under their original ids.
+
+    Emails already present, by id or by deduplication key, are skipped, so
+    rehydrating twice is harmless. References to users or patterns that no
+    longer exist are dropped. Restored emails get a new ``updated_at`` so
+    the delta export reports them to clients that synced their removal.
+    Returns ``(restored, skipped)``.
+    """
+    restored = skipped = 0
+    batch: List[Dict[str, Any]] = []
+
+    def flush():
+        nonlocal restored, skipped
+        ids = [row["id"] for row in batch]
+        present = set(Email.objects.filter(id__in=ids).values_list("id", flat=True))
+        new_rows = [row for row in batch if row["id"] not in present]
+        skipped += len(batch) - len(new_rows)
+        if not new_rows:
+            return
+
+        user_ids = {
+            row[field]
+            for row in new_rows
+            for field in ("assigned_to_id", "reviewed_by_id")
+            if row[field] is not None
+        }
+        users = set(User.objects.filter(id__in=user_ids).values_list("id", flat=True))
+
+        emails, analyses, attachments, matches = [], [], [], []
+        restored_at = timezone.now()
+        for row in new_rows:
+            email = {field: row[field] for field in ARCHIVE_FIELDS}
+            email["updated_at"] = restored_at
+            email["assigned_to"] = (
+                row["assigned_to_id"] if row["assigned_to_id"] in users else None
+            )
+            email["reviewed_by"] = (
+                row["reviewed_by_id"] if row["reviewed_by_id"] in users else None
+            )
+            del email["assigned_to_id"], email["reviewed_by_id"]
+            emails.append(email)
+
+            analysis = row["analysis"]
+            if analysis:
+                analyses.append(
+                    {
+                        "email": row["id"],
+                        "risk_score": analysis["risk_score"],
+                        "ml_prediction": analysis["ml_prediction"],
+                        "notes": analysis["notes"],
+                        "analysis_date": datetime.fromisoformat(
+                            analysis["analysis_date"]
+                        ),
+                    }
+                )
+                matches.append((row["id"], analysis["matched_patterns"]))
+            for attachment in row["attachments"]:
+                attachments.append(
+                    {
+                        **attachment,
+                        "email": row["id"],
+                        "created_at": datetime.fromisoformat(attachment["created_at"]),
+                    }
+                )
+
+        with transaction.atomic():
+            _insert_ignoring_conflicts(Email, emails)
+            # Emails whose key now belongs to a newer copy were not inserted
+            inserted = (
+                set(
+                    Email.objects.filter(
+                        id__in=[email["id"] for email in emails]
+                    ).values_list("id", flat=True)
+                )
+                - present
+            )
+            _insert_ignoring_conflicts(
+                EmailAnalysis, [a for a in analyses if a["email"] in inserted]
+            )
+            _insert_ignoring_conflicts(
+                EmailAttachment, [a for a in attachments if a["email"] in inserted]
+            )
+
+            matches = [
+                (email_id, ids) for email_id, ids in matches if email_id in inserted
+            ]
+            if matches:
+                analysis_ids = dict(
+                    EmailAnalysis.objects.filter(
+                        email_id__in=[email_id for email_id, _ in matches]
+                    ).values_list("email_id", "id")
+                )
+                patterns = set(
+                    SuspiciousPattern.objects.filter(
+                        id__in={p for _, ids in matches for p in ids}
+                    ).values_list("id", flat=True)
+                )
+                Through = EmailAnalysis.matched_patterns.through
+                Through.objects.bulk_create(
+                    [
+                        Through(
+                            emailanalysis_id=analysis_ids[email_id],
+                            suspiciouspattern_id=pattern_id,
+                        )
+                        for email_id, pattern_ids in matches
+                        for pattern_id in pattern_ids
+                        if pattern_id in patterns
+                    ],
+                    ignore_conflicts=True,
+                )
+        restored += len(inserted)
+        skipped += len(new_rows) - len(inserted)
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    if batch:
+        flush()
+    return restored, skipped
+
+
+def rehydrate_month(
+    month: date, archive_dir: Optional[str] = None
+) -> Tuple[int, int, List[str]]:
+    """
+    Restore every archive of a month. Returns ``(restored, skipped, paths)``.
+    """
+    paths = archive_paths(month, archive_dir)
+    restored = skipped = 0
+    for path in paths:
+        file_restored, file_skipped = rehydrate_rows(read_archive(path))
+        restored += file_restored
+        skipped += file_skipped
+    return restored, skipped, paths
+
+
+def run_rehydration(rehydration_id: int) -> None:
+    """
+    Run a queued :class:`ArchiveRehydration`, recording its counts or error.
+    """
+    rehydration = ArchiveRehydration.objects.get(pk=rehydration_id)
+    rehydration.status = ArchiveRehydration.Status.RUNNING
+    rehydration.started_at = timezone.now()
+    rehydration.save(update_fields=["status", "started_at"])
+    try:
+        restored, skipped, _ = rehydrate_month(rehydration.month)
+    except Exception as e:
+        rehydration.status = ArchiveRehydration.Status.FAILED
+        rehydration.error = str(e)
+    else:
+        rehydration.status = ArchiveRehydration.Status.COMPLETED
+        rehydration.restored = restored
+        rehydration.skipped = skipped
+    finally:
+        rehydration.completed_at = timezone.now()
+        rehydration.save()
+
+
+def _run_rehydration_thread(rehydration_id: int) -> None:
+    try:
+        run_rehydration(rehydration_id)
+    finally:
+        connections.close_all()
+
+
+def start_rehydration(rehydration_id: int) -> None:
+    """Run a rehydration in a background thread of this process"""
+    threading.Thread(
+        target=_run_rehydration_thread, args=(rehydration_id,), daemon=True
+    ).start()
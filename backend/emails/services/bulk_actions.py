@@ -0,0 +1,107 @@
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from ..models import BulkEmailAction, Email
+from .stats import HIGH_RISK
+
+# Actions only admins may run, as for single emails
+ADMIN_ACTIONS = {BulkEmailAction.Action.RELEASE, BulkEmailAction.Action.REASSIGN}
+
+
+def select_emails(
+    emails, ids: Optional[List[int]] = None, filters: Optional[Dict[str, Any]] = None
+):
+    """
+    Narrow a queryset to the emails given by ``ids`` or matching ``filters``
+    (status, sender_domain, subject, received_after, received_before and
+    is_quarantined), with the email list's meaning of each.
+    """
+    if ids is not None:
+        return emails.filter(id__in=ids)
+    filters = filters or {}
+    if "status" in filters:
+        if filters["status"] == Email.EmailStatus.DANGEROUS:
+            emails = emails.filter(HIGH_RISK)
+        else:
+            emails = emails.filter(status=filters["status"])
+    if "sender_domain" in filters:
+        emails = emails.filter(sender_domain=filters["sender_domain"].strip().lower())
+    if "subject" in filters:
+        emails = emails.filter(subject=filters["subject"])
+    if "received_after" in filters:
+        emails = emails.filter(received_date__gte=filters["received_after"])
+    if "received_before" in filters:
+        emails = emails.filter(received_date__lt=filters["received_before"])
+    if "is_quarantined" in filters:
+        emails = emails.filter(is_quarantined=filters["is_quarantined"])
+    return emails
+
+
+def run_bulk_action(
+    action: str,
+    emails,
+    performed_by,
+    criteria: Dict[str, Any],
+    assigned_to=None,
+    chunk_size: Optional[int] = None,
+) -> BulkEmailAction:
+    """
+    Quarantine, release, reassign (to ``assigned_to``) or delete a queryset
+    of emails, and return the audit record of the action.
+
+    Emails are changed by set-based ``UPDATE``/``DELETE`` statements of up
+    to ``chunk_size`` rows each, walked in id order. Each chunk commits on
+    its own, so no transaction holds more than a chunk of row locks, and
+    re-applies ``emails``' conditions, so rows changed by someone else
+    since they were selected are left alone. Emails the action wouldn't
+    change, such as already quarantined ones, are skipped rather than
+    rewritten, so ``affected`` counts real changes.
+    """
+    chunk_size = chunk_size or settings.EMAIL_BULK_ACTION_CHUNK_SIZE
+    if action == BulkEmailAction.Action.QUARANTINE:
+        emails, changes = emails.filter(is_quarantined=False), {"is_quarantined": True}
+    elif action == BulkEmailAction.Action.RELEASE:
+        emails, changes = emails.filter(is_quarantined=True), {"is_quarantined": False}
+    elif action == BulkEmailAction.Action.REASSIGN:
+        emails = emails.exclude(assigned_to=assigned_to)
+        changes = {"assigned_to": assigned_to}
+    elif action == BulkEmailAction.Action.DELETE:
+        changes = None
+    else:
+        raise ValueError(f"Unsupported bulk action: {action}")
+
+    audit = BulkEmailAction.objects.create(
+        action=action,
+        performed_by=performed_by,
+        assigned_to=assigned_to,
+        criteria=criteria,
+    )
+    last_id = 0
+    while True:
+        ids = list(
+            emails.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:chunk_size]
+        )
+        if not ids:
+            break
+        last_id = ids[-1]
+        with transaction.atomic():
+            chunk = emails.filter(id__in=ids)
+            if changes is None:
+                # Bodies aren't needed to delete an email and its records
+                _, deleted = chunk.only("id").delete()
+                affected = deleted.get(Email._meta.label, 0)
+            else:
+                affected = chunk.update(**changes, updated_at=timezone.now())
+            BulkEmailAction.objects.filter(pk=audit.pk).update(
+                affected=F("affected") + affected
+            )
+        audit.affected += affected
+
+    audit.completed_at = timezone.now()
+    audit.save(update_fields=["completed_at"])
+    return audit
@@ -0,0 +1,80 @@
+from typing import Any, Dict, Optional
+from django.db import transaction
+from django.db.models import Count, Q
+from ..models import Email, MailboxCounters
+from .stats import CORRECT_DANGEROUS, CORRECT_SAFE, CORRECT_SUSPICIOUS, HIGH_RISK
+
+# Counter field -> emails it counts (mirrors the database triggers)
+COUNTER_FILTERS = {
+    "safe": Q(status=Email.EmailStatus.SAFE),
+    "suspicious": Q(status=Email.EmailStatus.SUSPICIOUS),
+    "dangerous": Q(status=Email.EmailStatus.DANGEROUS),
+    "high_risk": HIGH_RISK,
+    "quarantined": Q(is_quarantined=True),
+    "correct_safe": CORRECT_SAFE,
+    "correct_suspicious": CORRECT_SUSPICIOUS,
+    "correct_dangerous": CORRECT_DANGEROUS,
+}
+
+
+async def aget_mailbox_summary(user) -> Dict[str, Any]:
+    """Read a user's dashboard summary from their counters row"""
+    counters = await MailboxCounters.objects.filter(user=user).afirst()
+    return (counters or MailboxCounters(user=user)).as_summary()
+
+
+# Status filter of the email list -> counter holding its size
+STATUS_COUNTERS = {
+    None: "total",
+    Email.EmailStatus.SAFE: "safe",
+    Email.EmailStatus.SUSPICIOUS: "suspicious",
+    # The list's dangerous filter also includes high-confidence emails
+    Email.EmailStatus.DANGEROUS: "high_risk",
+}
+
+
+def get_mailbox_count(user, status: Optional[str] = None) -> Optional[int]:
+    """
+    Read the size of a user's email list, optionally filtered by status,
+    from their counters row. Returns None for filters the counters don't
+    track.
+    """
+    field = STATUS_COUNTERS.get(status)
+    if field is None:
+        return None
+    counts = MailboxCounters.objects.filter(user=user).values_list(field, flat=True)
+    return next(iter(counts), 0)
+
+
+def recount_mailbox(user_id: int) -> bool:
+    """
+    Rebuild one user's counters from their emails and return True if they
+    had drifted.
+
+    The counters row is locked first, so concurrent writers whose triggers
+    run before the recount are waited for and included, and later ones apply
+    their deltas on top of the recounted values.
+    """
+    with transaction.atomic():
+        MailboxCounters.objects.bulk_create(
+            [MailboxCounters(user_id=user_id)], ignore_conflicts=True
+        )
+        counters = MailboxCounters.objects.select_for_update().get(user_id=user_id)
+        actual = Email.objects.filter(assigned_to_id=user_id).aggregate(
+            total=Count("id"),
+            **{
+                field: Count("id", filter=condition)
+                for field, condition in COUNTER_FILTERS.items()
+            },
+        )
+
+        drifted = [
+            field
+            for field, value in actual.items()
+            if getattr(counters, field) != value
+        ]
+        if drifted:
+            for field in drifted:
+                setattr(counters, field, actual[field])
+            counters.save(update_fields=[*drifted, "updated_at"])
+        return bool(drifted)
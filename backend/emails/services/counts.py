@@ -0,0 +1,56 @@
+import hashlib
+import json
+from typing import Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+
+def planner_estimate(queryset) -> int:
+    """Ask PostgreSQL how many rows it expects the queryset to return"""
+    if not queryset.query.where:
+        # A whole table is estimated from its statistics directly
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        return max(int(row[0]), 0) if row else 0
+    plan = json.loads(queryset.order_by().explain(format="json"))
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def _cached_count(queryset, timeout: int) -> int:
+    sql, params = queryset.query.sql_with_params()
+    key = "email-count:" + hashlib.sha256(f"{sql}{params}".encode()).hexdigest()
+    return cache.get_or_set(key, queryset.count, timeout)
+
+
+def count_queryset(queryset, threshold: int = None) -> Tuple[int, bool]:
+    """
+    Count a queryset, returning ``(count, is_approximate)``.
+
+    Up to ``threshold`` rows (``EMAIL_EXACT_COUNT_THRESHOLD``) the count is
+    exact and costs at most a scan of that many rows. Past it, PostgreSQL's
+    planner estimate is used, which is free but can be off by the margin of
+    the table statistics. Where there is no usable estimate (other
+    databases, or an estimate the bounded count already disproved) an exact
+    count is cached for ``EMAIL_COUNT_CACHE_TTL`` seconds, so it is at worst
+    that stale.
+    """
+    if threshold is None:
+        threshold = settings.EMAIL_EXACT_COUNT_THRESHOLD
+    queryset = queryset.order_by()
+
+    bounded = queryset[: threshold + 1].count()
+    if bounded <= threshold:
+        return bounded, False
+
+    if connections[queryset.db].vendor == "postgresql":
+        estimate = planner_estimate(queryset)
+        if estimate > threshold:
+            return estimate, True
+
+    return _cached_count(queryset, settings.EMAIL_COUNT_CACHE_TTL), True
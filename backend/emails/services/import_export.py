@@ -1,11 +1,18 @@
+import base64
 import json
 import csv
 import io
-from typing import List, Dict, Any
+import zlib
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional, Tuple
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from ..models import Email
 from ..ml_service import EmailAnalyzer
-from datetime import datetime
+from .ingestion import ingest_emails
+from datetime import datetime, time, timedelta, timezone as dt_timezone
 
 
 def validate_file_extension(file) -> str:
@@ -34,6 +41,7 @@ def export_emails_to_json(emails: List[Email]) -> str:
                 "confidence_score": email.confidence_score,
                 "received_date": email.received_date.isoformat(),
                 "is_quarantined": email.is_quarantined,
+                "message_id": email.message_id,
             }
         )
     return json.dumps(email_list, indent=2)
@@ -54,6 +62,7 @@ def export_emails_to_csv(emails: List[Email]) -> str:
             "confidence_score",
             "received_date",
             "is_quarantined",
+            "message_id",
         ]
     )
 
@@ -68,12 +77,197 @@ def export_emails_to_csv(emails: List[Email]) -> str:
                 email.confidence_score,
                 email.received_date.isoformat(),
                 email.is_quarantined,
+                email.message_id,
             ]
         )
 
     return output.getvalue()
 
 
+EXPORT_FIELDS = [
+    "sender",
+    "subject",
+    "content",
+    "status",
+    "confidence_score",
+    "received_date",
+    "is_quarantined",
+    "message_id",
+]
+
+EXPORT_FORMATS = ["json", "csv", "ndjson", "parquet"]
+
+
+def iter_export_rows(
+    emails, chunk_size: int = 2000, isoformat_dates: bool = True
+) -> Iterator[Dict[str, Any]]:
+    """Yield export rows from a queryset without loading it all into memory"""
+    for row in emails.values(*EXPORT_FIELDS).iterator(chunk_size=chunk_size):
+        if isoformat_dates:
+            row["received_date"] = row["received_date"].isoformat()
+        yield row
+
+
+class NDJSONGzipEncoder:
+    """Encodes rows as NDJSON lines, gzip-compressed a chunk of rows at a time"""
+
+    def __init__(self, chunk_size: int = 2000):
+        self.chunk_size = chunk_size
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        self.lines = []
+
+    def add(self, row: Dict[str, Any]) -> bytes:
+        """Add a row, returning compressed output once a chunk is full"""
+        self.lines.append(json.dumps(row, separators=(",", ":")))
+        if len(self.lines) < self.chunk_size:
+            return b""
+        return self._compress_lines()
+
+    def finish(self) -> bytes:
+        return self._compress_lines() + self.compressor.flush()
+
+    def _compress_lines(self) -> bytes:
+        if not self.lines:
+            return b""
+        self.lines.append("")
+        data = self.compressor.compress("\n".join(self.lines).encode("utf-8"))
+        self.lines = []
+        return data
+
+
+def stream_emails_to_ndjson_gz(emails, chunk_size: int = 2000) -> Iterator[bytes]:
+    """Export emails as gzip-compressed newline-delimited JSON, chunk by chunk"""
+    encoder = NDJSONGzipEncoder(chunk_size)
+    for row in iter_export_rows(emails, chunk_size):
+        data = encoder.add(row)
+        if data:
+            yield data
+    yield encoder.finish()
+
+
+async def astream_emails_to_ndjson_gz(
+    emails, chunk_size: int = 2000
+) -> AsyncIterator[bytes]:
+    """
+    :func:`stream_emails_to_ndjson_gz` for async views. Rows are fetched a
+    chunk at a time with ``aiterator()``, so under ASGI the export is sent
+    as it is read instead of being collected first.
+    """
+    encoder = NDJSONGzipEncoder(chunk_size)
+    async for row in emails.values(*EXPORT_FIELDS).aiterator(chunk_size=chunk_size):
+        row["received_date"] = row["received_date"].isoformat()
+        data = encoder.add(row)
+        if data:
+            yield data
+    yield encoder.finish()
+
+
+def write_emails_to_parquet(emails, file, chunk_size: int = 50000) -> int:
+    """
+    Export emails to Parquet, writing one row group per chunk.
+
+    Only one chunk is held in memory at a time. Returns the number of rows
+    written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [
+            ("sender", pa.string()),
+            ("subject", pa.string()),
+            ("content", pa.string()),
+            ("status", pa.string()),
+            ("confidence_score", pa.float64()),
+            ("received_date", pa.timestamp("us", tz="UTC")),
+            ("is_quarantined", pa.bool_()),
+            ("message_id", pa.string()),
+        ]
+    )
+
+    written = 0
+    chunk = []
+    with pq.ParquetWriter(file, schema, compression="zstd") as writer:
+        for row in iter_export_rows(
+            emails, min(chunk_size, 2000), isoformat_dates=False
+        ):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+                written += len(chunk)
+                chunk = []
+        if chunk or not written:
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            written += len(chunk)
+    return written
+
+
+def encode_export_cursor(updated_at: datetime, pk: int) -> str:
+    """Encode an ``(updated_at, id)`` position as an opaque cursor"""
+    raw = f"{updated_at.isoformat()}|{pk}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_export_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by :func:`encode_export_cursor`"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        updated_at, pk = raw.decode("utf-8").split("|")
+        return datetime.fromisoformat(updated_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ValidationError("Invalid export cursor")
+
+
+async def aget_email_changes(
+    emails, cursor: Optional[str] = None, limit: int = 1000
+) -> Tuple[List[Dict[str, Any]], Optional[str], bool]:
+    """
+    Export emails changed after a cursor, ordered by ``(updated_at, id)``.
+
+    Returns ``(rows, next_cursor, has_more)``. Passing ``next_cursor`` back
+    resumes after the last returned row; with no cursor the export starts
+    from the beginning. The ``updated_at >= ...`` range keeps the lookup on
+    the ``(assigned_to, updated_at, id)`` index, so each page costs time
+    proportional to the rows returned. Deleted emails are not reported.
+
+    ``updated_at`` is stamped when a row is saved, not when its transaction
+    commits, so a change can become visible after newer ones were already
+    exported. Rows changed within the last
+    ``EMAIL_CHANGES_SAFETY_LAG_SECONDS`` are held back until a later page,
+    which must exceed the longest transaction that writes emails (and any
+    clock skew between the servers) for the cursor never to pass over them.
+    """
+    emails = emails.filter(
+        updated_at__lt=timezone.now()
+        - timedelta(seconds=settings.EMAIL_CHANGES_SAFETY_LAG_SECONDS)
+    )
+    if cursor:
+        updated_at, pk = decode_export_cursor(cursor)
+        emails = emails.filter(updated_at__gte=updated_at).filter(
+            Q(updated_at__gt=updated_at) | Q(id__gt=pk)
+        )
+
+    page = [
+        row
+        async for row in emails.order_by("updated_at", "id").values(
+            "id", *EXPORT_FIELDS, "updated_at"
+        )[: limit + 1]
+    ]
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    if page:
+        next_cursor = encode_export_cursor(page[-1]["updated_at"], page[-1]["id"])
+    else:
+        next_cursor = cursor
+
+    for row in page:
+        row["received_date"] = row["received_date"].isoformat()
+        row["updated_at"] = row["updated_at"].isoformat()
+
+    return page, next_cursor, has_more
+
+
 def import_emails_from_json(content: str) -> List[Dict[str, Any]]:
     """Import emails from JSON format"""
     try:
@@ -82,7 +276,7 @@ def import_emails_from_json(content: str) -> List[Dict[str, Any]]:
             raise ValidationError("Invalid JSON format. Expected a list of emails.")
 
         emails = []
-        current_time = datetime.now()
+        current_time = timezone.now()
         analyzer = EmailAnalyzer()  # Initialize analyzer once for all emails
 
         for item in data:
@@ -92,8 +286,8 @@ def import_emails_from_json(content: str) -> List[Dict[str, Any]]:
                 if field not in item:
                     raise ValidationError(f"Missing required field: {field}")
 
-            # Always set received_date to current time
-            item["received_date"] = current_time
+            # Emails without a received date are dated at the import
+            set_dedup_key_and_date(item, current_time)
 
             # If no status is provided or it's invalid, classify the email
             if "status" not in item or item["status"] not in [
@@ -131,6 +325,7 @@ def import_emails_from_csv(content: str) -> List[Dict[str, Any]]:
         reader = csv.DictReader(csv_file)
 
         emails = []
+        current_time = timezone.now()
         for row in reader:
             # Validate required fields
             required_fields = ["sender", "subject", "content"]
@@ -138,12 +333,10 @@ def import_emails_from_csv(content: str) -> List[Dict[str, Any]]:
                 if field not in row or not row[field]:
                     raise ValidationError(f"Missing required field: {field}")
 
-            # Parse dates and set defaults for optional fields
-            if "received_date" in row and row["received_date"]:
-                row["received_date"] = datetime.fromisoformat(row["received_date"])
-            else:
-                row["received_date"] = datetime.now()
+            # Emails without a received date are dated at the import
+            set_dedup_key_and_date(row, current_time)
 
+            # Set defaults for optional fields
             row.setdefault("status", "suspicious")
             row.setdefault("confidence_score", None)
             row.setdefault("is_quarantined", False)
@@ -153,3 +346,104 @@ def import_emails_from_csv(content: str) -> List[Dict[str, Any]]:
         return emails
     except csv.Error:
         raise ValidationError("Invalid CSV format")
+
+
+def parse_received_date(value) -> Optional[datetime]:
+    """
+    Parse a received date given by an import source, as an ISO 8601 date or
+    datetime, into a UTC datetime. Naive values are taken as UTC; missing
+    or empty ones give ``None``.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        try:
+            parsed = parse_datetime(value.strip())
+            if parsed is None and (day := parse_date(value.strip())):
+                parsed = datetime.combine(day, time())
+        except ValueError:  # Well formed, but not a real date
+            parsed = None
+        if parsed is None:
+            raise ValidationError(f"Invalid received_date: {value}")
+        value = parsed
+    elif not isinstance(value, datetime):
+        raise ValidationError(f"Invalid received_date: {value}")
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value.astimezone(dt_timezone.utc)
+
+
+def set_dedup_key_and_date(item: Dict[str, Any], default: datetime) -> None:
+    """
+    Key an import row on the received date its source gave, then date rows
+    without one at ``default``. Every import path goes through here, so an
+    email gets the same key from any format, and a missing date doesn't
+    make a re-import look new.
+    """
+    received_date = parse_received_date(item.get("received_date"))
+    set_dedup_key(item, received_date)
+    item["received_date"] = received_date or default
+
+
+def set_dedup_key(item: Dict[str, Any], received_date) -> None:
+    """Attach the normalized Message-ID and deduplication key to an import row"""
+    item["message_id"] = Email.normalize_message_id(item.get("message_id"))
+    item["dedup_key"] = Email.make_dedup_key(
+        item["sender"],
+        item["subject"],
+        item["content"],
+        received_date=received_date,
+        message_id=item["message_id"],
+    )
+
+
+def save_imported_emails(
+    emails_data: List[Dict[str, Any]], user, batch_size: int = 1000
+) -> Tuple[int, int]:
+    """
+    Insert imported emails for a user, skipping ones already in their mailbox.
+
+    Returns a ``(created, skipped)`` tuple. Rows whose deduplication key is
+    repeated in the file or already stored are skipped, and the insert itself
+    ignores conflicts so concurrent imports of the same file stay idempotent.
+    Rows are written through :func:`ingest_emails`, which uses ``COPY`` on
+    PostgreSQL.
+    """
+    unique_rows = {}
+    for email_data in emails_data:
+        unique_rows.setdefault(email_data["dedup_key"], email_data)
+
+    keys = list(unique_rows)
+    existing = set()
+    for start in range(0, len(keys), batch_size):
+        existing.update(
+            Email.objects.filter(
+                assigned_to=user, dedup_key__in=keys[start : start + batch_size]
+            ).values_list("dedup_key", flat=True)
+        )
+
+    emails = [
+        email_from_import_row(email_data, user)
+        for key, email_data in unique_rows.items()
+        if key not in existing
+    ]
+    created = ingest_emails(emails, batch_size=batch_size)
+
+    return created, len(emails_data) - created
+
+
+def email_from_import_row(email_data: Dict[str, Any], user) -> Email:
+    """Build an unsaved Email from a normalized import row"""
+    return Email(
+        sender=email_data["sender"],
+        sender_name=email_data.get("sender_name", ""),  # Optional field
+        subject=email_data["subject"],
+        content=email_data["content"],
+        status=email_data["status"],
+        confidence_score=email_data["confidence_score"],
+        is_quarantined=email_data["is_quarantined"],
+        received_date=email_data["received_date"],
+        message_id=email_data.get("message_id", ""),
+        dedup_key=email_data.get("dedup_key"),
+        assigned_to=user,
+    )
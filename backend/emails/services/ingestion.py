@@ -0,0 +1,160 @@
+import io
+from datetime import date, datetime
+from itertools import islice
+from typing import Iterable, List, Optional
+
+from django.db import connections, transaction
+from django.db.models.constants import OnConflict
+from django.db.models.sql import InsertQuery
+from ..models import Email
+
+
+def _copy_value(value) -> str:
+    """Render a database-prepared value in PostgreSQL COPY text format"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _batches(emails: Iterable[Email], batch_size: int) -> Iterable[List[Email]]:
+    iterator = iter(emails)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def supports_copy(using: str = "default") -> bool:
+    """Return True when the database connection can stream rows with COPY"""
+    return connections[using].vendor == "postgresql"
+
+
+def _field_value(field, email: Email):
+    # auto_now_add would stamp every row with the time of the load; emails
+    # that carry their own received date keep it
+    if getattr(field, "auto_now_add", False):
+        value = getattr(email, field.attname)
+        if value is not None:
+            return value
+    return field.pre_save(email, add=True)
+
+
+def _insert_batch(connection, fields, batch: List[Email]) -> int:
+    """Insert one batch with the ORM's INSERT, skipping conflicting rows"""
+    for email in batch:
+        email.derive_status()
+        for field in fields:
+            setattr(email, field.attname, _field_value(field, email))
+
+    written = 0
+    size = max(connection.ops.bulk_batch_size(fields, batch), 1)
+    with connection.cursor() as cursor:
+        for start in range(0, len(batch), size):
+            query = InsertQuery(Email, on_conflict=OnConflict.IGNORE)
+            # Raw, so the values set above are inserted as they are rather
+            # than through pre_save(), which would stamp auto_now_add fields
+            query.insert_values(fields, batch[start : start + size], raw=True)
+            for sql, params in query.get_compiler(connection=connection).as_sql():
+                cursor.execute(sql, params)
+                written += cursor.rowcount
+    return written
+
+
+def _copy_batch(connection, fields, batch: List[Email]) -> int:
+    """Stream one batch through a temporary table and insert it"""
+    table = connection.ops.quote_name(Email._meta.db_table)
+    columns = ", ".join(connection.ops.quote_name(f.column) for f in fields)
+
+    buffer = io.StringIO()
+    for email in batch:
+        email.derive_status()
+        buffer.write(
+            "\t".join(
+                _copy_value(
+                    field.get_db_prep_save(
+                        _field_value(field, email), connection=connection
+                    )
+                )
+                for field in fields
+            )
+        )
+        buffer.write("\n")
+    buffer.seek(0)
+
+    copy_sql = f"COPY email_ingest ({columns}) FROM STDIN"
+    with connection.cursor() as cursor:
+        # Created and dropped per batch, so nothing outlives the batch on a
+        # connection that goes back to the pool; a failed batch rolls the
+        # table back with it
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE email_ingest AS "
+            f"SELECT {columns} FROM {table} WITH NO DATA"
+        )
+        raw_cursor = cursor.cursor
+        # Raise Django's exceptions for bad rows, as the ORM path does
+        with connection.wrap_database_errors:
+            if hasattr(raw_cursor, "copy_expert"):  # psycopg2
+                raw_cursor.copy_expert(copy_sql, buffer)
+            else:  # psycopg 3
+                with raw_cursor.copy(copy_sql) as copy:
+                    while data := buffer.read(1 << 16):
+                        copy.write(data)
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) "
+            f"SELECT {columns} FROM email_ingest ON CONFLICT DO NOTHING"
+        )
+        written = cursor.rowcount
+        cursor.execute("DROP TABLE email_ingest")
+        return written
+
+
+def ingest_emails(
+    emails: Iterable[Email],
+    batch_size: int = 5000,
+    use_copy: Optional[bool] = None,
+    using: str = "default",
+) -> int:
+    """
+    Insert unsaved emails in batches and return how many rows were written.
+
+    Statuses are derived with :meth:`Email.derive_status` on both paths.
+    On PostgreSQL rows are streamed with ``COPY ... FROM STDIN`` into a
+    temporary table and moved into the email table with
+    ``ON CONFLICT DO NOTHING``. Other databases fall back to the ORM's
+    multi-row ``INSERT``, ignoring conflicts. Either way duplicate keys are
+    skipped and the returned count is of rows actually written. Pass
+    ``use_copy=False`` to force the ORM path.
+
+    Each batch commits on its own, so a long load holds no transaction
+    (or its locks) for longer than a batch, and a bad row only rolls back
+    its batch. Batches already written stay written; since duplicates are
+    skipped, re-running the load after fixing the input completes it.
+    Emails keep their own ``received_date`` when they have one.
+    """
+    if use_copy is None:
+        use_copy = supports_copy(using)
+    elif use_copy and not supports_copy(using):
+        raise ValueError("COPY ingestion requires a PostgreSQL database")
+
+    connection = connections[using]
+    fields = [
+        f for f in Email._meta.concrete_fields if not f.primary_key and not f.generated
+    ]
+    insert_batch = _copy_batch if use_copy else _insert_batch
+    written = 0
+    for batch in _batches(emails, batch_size):
+        with transaction.atomic(using=using):
+            written += insert_batch(connection, fields, batch)
+
+    return written
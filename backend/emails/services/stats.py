@@ -0,0 +1,50 @@
+from typing import Any, Dict
+from django.db.models import Count, Q
+from ..models import Email
+
+# Confidence buckets that agree with an email's status
+# Safe emails with low confidence scores (< 0.3)
+CORRECT_SAFE = Q(status=Email.EmailStatus.SAFE, confidence_score__lt=0.3)
+# Suspicious emails with medium confidence scores (0.3 - 0.7)
+CORRECT_SUSPICIOUS = Q(
+    status=Email.EmailStatus.SUSPICIOUS,
+    confidence_score__gte=0.3,
+    confidence_score__lt=0.7,
+)
+# Dangerous emails with high confidence scores (>= 0.7)
+CORRECT_DANGEROUS = Q(status=Email.EmailStatus.DANGEROUS, confidence_score__gte=0.7)
+CORRECT_DETECTION = CORRECT_SAFE | CORRECT_SUSPICIOUS | CORRECT_DANGEROUS
+
+# What counts as high risk in a mailbox summary
+HIGH_RISK = Q(status=Email.EmailStatus.DANGEROUS) | Q(confidence_score__gte=0.7)
+
+
+def email_stats(emails, high_risk: Q = HIGH_RISK) -> Dict[str, Any]:
+    """
+    Summarise a queryset of emails in a single aggregate query.
+
+    A score closer to 0 for safe emails and closer to 1 for dangerous emails
+    indicates better detection; ``detection_rate`` is the share of scored
+    emails whose confidence falls in the bucket matching their status.
+    """
+    counts = emails.aggregate(
+        total_emails=Count("id"),
+        suspicious_emails=Count("id", filter=Q(status=Email.EmailStatus.SUSPICIOUS)),
+        high_risk_emails=Count("id", filter=high_risk),
+        scored_emails=Count("id", filter=Q(confidence_score__isnull=False)),
+        correct_predictions=Count(
+            "id", filter=Q(confidence_score__isnull=False) & CORRECT_DETECTION
+        ),
+    )
+
+    if counts["scored_emails"]:
+        detection_rate = counts["correct_predictions"] / counts["scored_emails"]
+    else:
+        detection_rate = 0
+
+    return {
+        "total_emails": counts["total_emails"],
+        "suspicious_emails": counts["suspicious_emails"],
+        "high_risk_emails": counts["high_risk_emails"],
+        "detection_rate": detection_rate,
+    }
@@ -1,3 +1,1564 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DataError, connection
+from django.db.models import Q
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.authentication.models import UserProfile
+from backend.core.testing import QueryBudgetMixin
+
+from . import ml_service
+from .caching import response_cache_stats
+from .filters import EmailFilterSet, EmailSearchFilter, trigram_enabled
+from .models import (
+    ArchiveRehydration,
+    BulkEmailAction,
+    Email,
+    EmailAnalysis,
+    EmailAttachment,
+    MailboxCounters,
+    SuspiciousPattern,
+)
+from .services.archive import archive_month, rehydrate_month, run_rehydration
+from .services.counters import COUNTER_FILTERS, recount_mailbox
+from .services.counts import count_queryset
+from .services.import_export import (
+    EXPORT_FIELDS,
+    decode_export_cursor,
+    encode_export_cursor,
+    stream_emails_to_ndjson_gz,
+    write_emails_to_parquet,
+)
+from .services.ingestion import ingest_emails
+from .services.stats import email_stats
+
+
+class EmailImportDedupTests(TestCase):
+    """Re-importing a file adds only the emails a mailbox does not have yet"""
+
+    def setUp(self):
+        self.user = User.objects.create_user("analyst")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def import_file(self, name, content):
+        response = self.client.post(
+            "/api/import/",
+            {"file": SimpleUploadedFile(name, content.encode("utf-8"))},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data["imported"], response.data["skipped"]
+
+    def test_csv_duplicates_are_skipped(self):
+        content = (
+            "sender,subject,content,status,confidence_score,received_date,message_id\n"
+            "a@example.com,Hello,Body,safe,0.1,2024-03-01T09:00:00+00:00,\n"
+            "a@example.com,Hello,Body,safe,0.1,2024-03-01T09:00:00+00:00,\n"
+            "a@example.com,Hello,Body,safe,0.1,2024-03-02T09:00:00+00:00,\n"
+            "b@example.com,Other,Text,safe,0.1,2024-03-01T09:00:00+00:00,<id@x.org>\n"
+            "c@example.com,Resent,Changed,safe,0.1,2024-03-05T09:00:00+00:00,id@x.org\n"
+        )
+        # The repeated row, and the resend sharing a Message-ID, are skipped
+        self.assertEqual(self.import_file("emails.csv", content), (3, 2))
+        self.assertEqual(self.import_file("emails.csv", content), (0, 5))
+        self.assertEqual(Email.objects.filter(assigned_to=self.user).count(), 3)
+
+        # Another mailbox has none of them yet
+        self.client.force_authenticate(User.objects.create_user("other"))
+        self.assertEqual(self.import_file("emails.csv", content), (3, 2))
+
+    def test_json_keeps_received_date_and_matches_csv(self):
+        content = json.dumps(
+            [
+                {
+                    "sender": "a@example.com",
+                    "subject": "Hello",
+                    "content": "Body",
+                    "status": "safe",
+                    "received_date": date,
+                }
+                for date in ("2024-03-01T09:00:00", "2024-03-02T09:00:00Z")
+            ]
+        )
+        self.assertEqual(self.import_file("emails.json", content), (2, 0))
+        self.assertEqual(self.import_file("emails.json", content), (0, 2))
+        self.assertEqual(
+            sorted(Email.objects.values_list("received_date", flat=True)),
+            [
+                datetime(2024, 3, 1, 9, tzinfo=dt_timezone.utc),
+                datetime(2024, 3, 2, 9, tzinfo=dt_timezone.utc),
+            ],
+        )
+
+        # The same email keys alike from either format, however its date is
+        # written
+        content = (
+            "sender,subject,content,status,confidence_score,received_date\n"
+            "a@example.com,Hello,Body,safe,0.1,2024-03-01T10:00:00+01:00\n"
+        )
+        self.assertEqual(self.import_file("emails.csv", content), (0, 1))
+
+    def test_csv_without_received_dates(self):
+        content = (
+            "sender,subject,content,status,confidence_score\n"
+            "a@example.com,Hello,Body,safe,0.1\n"
+            "b@example.com,Other,Text,safe,0.1\n"
+        )
+        self.assertEqual(self.import_file("emails.csv", content), (2, 0))
+        # Dated at the import, but keyed without a date, so still duplicates
+        self.assertEqual(self.import_file("emails.csv", content), (0, 2))
+
+    def test_invalid_received_date(self):
+        content = (
+            "sender,subject,content,status,confidence_score,received_date\n"
+            "a@example.com,Hello,Body,safe,0.1,2024-13-01\n"
+        )
+        response = self.client.post(
+            "/api/import/",
+            {"file": SimpleUploadedFile("emails.csv", content.encode("utf-8"))},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+@skipUnless(connection.vendor == "postgresql", "COPY is PostgreSQL specific")
+class EmailIngestionTests(TestCase):
+    """ingest_emails and load_emails write each email once, as given"""
+
+    def make_email(self, i, **fields):
+        return Email(
+            **{
+                "sender": f"sender{i}@example.com",
+                "subject": f"Subject {i}",
+                "content": f"Content {i}",
+                "confidence_score": 0.1,
+                "received_date": datetime(2024, 3, 1, tzinfo=dt_timezone.utc),
+                "dedup_key": f"key{i}",
+                **fields,
+            }
+        )
+
+    def test_copy_escapes_special_characters(self):
+        content = "Tab\there\nnew line\r\nback\\slash \\N"
+        for use_copy in (True, False):
+            with self.subTest(use_copy=use_copy):
+                Email.objects.all().delete()
+                written = ingest_emails(
+                    [self.make_email(1, content=content)],
+                    use_copy=use_copy,
+                )
+                self.assertEqual(written, 1)
+                self.assertEqual(Email.objects.get().content, content)
+
+    def test_keeps_received_date_and_counts_writes(self):
+        received = datetime(2023, 7, 14, 9, 30, tzinfo=dt_timezone.utc)
+        for use_copy in (True, False):
+            with self.subTest(use_copy=use_copy):
+                Email.objects.all().delete()
+                emails = [self.make_email(i, received_date=received) for i in range(3)]
+                self.assertEqual(ingest_emails(emails[:2], use_copy=use_copy), 2)
+                # Only the new email is written, and counted
+                emails = [self.make_email(i, received_date=received) for i in range(3)]
+                self.assertEqual(ingest_emails(emails, use_copy=use_copy), 1)
+                self.assertEqual(
+                    set(Email.objects.values_list("received_date", flat=True)),
+                    {received},
+                )
+                self.assertNotEqual(Email.objects.first().created_at, received)
+
+    def test_batches_commit_separately(self):
+        emails = [self.make_email(i) for i in range(4)]
+        emails[3].subject = "x" * 600  # Too long for the column
+        with self.assertRaises(DataError):
+            ingest_emails(emails, batch_size=2, use_copy=True)
+        # The first batch was written before the second failed
+        self.assertEqual(
+            sorted(Email.objects.values_list("dedup_key", flat=True)),
+            ["key0", "key1"],
+        )
+        emails[3].subject = "Subject 3"
+        self.assertEqual(ingest_emails(emails, batch_size=2, use_copy=True), 2)
+
+    def test_load_twice_without_user(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "emails.ndjson")
+            with open(path, "w") as f:
+                for i in range(3):
+                    f.write(
+                        json.dumps(
+                            {
+                                "sender": f"sender{i}@example.com",
+                                "subject": f"Subject {i}",
+                                "content": f"Content {i}",
+                                "status": "safe",
+                                "received_date": (
+                                    "2024-03-01T00:00:00+00:00" if i else ""
+                                ),
+                            }
+                        )
+                        + "\n"
+                    )
+            for expected in ("Loaded 3 of 3", "Loaded 0 of 3 emails (3 duplicates"):
+                out = StringIO()
+                call_command("load_emails", path, batch_size=2, stdout=out)
+                self.assertIn(expected, out.getvalue())
+        self.assertEqual(Email.objects.filter(assigned_to=None).count(), 3)
+        # Backfilled emails keep their received date; the one without is
+        # dated at the load
+        dates = Email.objects.order_by("sender").values_list("received_date", flat=True)
+        self.assertGreater(dates[0], datetime(2025, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(
+            list(dates[1:]), [datetime(2024, 3, 1, tzinfo=dt_timezone.utc)] * 2
+        )
+
+
+class EmailExportFormatTests(TestCase):
+    """Streamed exports hold every exported field, exactly"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("analyst")
+        Email.objects.bulk_create(
+            Email(
+                sender=f"sender{i}@example.com",
+                subject=f"Résultats {i}",
+                content="Line one\nLine two\twith a tab and a \\ backslash",
+                status="suspicious" if i % 3 else "safe",
+                confidence_score=i / 10,
+                is_quarantined=bool(i % 3),
+                message_id=f"{i}@example.com" if i % 2 else "",
+                assigned_to=cls.user,
+            )
+            for i in range(5)
+        )
+        # bulk_create stamps the time of the insert; give each its own date
+        for i, email in enumerate(Email.objects.order_by("id")):
+            email.received_date = datetime(2024, 3, i + 1, 9, tzinfo=dt_timezone.utc)
+            email.save(update_fields=["received_date"])
+        cls.emails = Email.objects.filter(assigned_to=cls.user).order_by("id")
+        cls.expected = list(cls.emails.values(*EXPORT_FIELDS))
+
+    def test_ndjson_gz_round_trip(self):
+        # Chunks smaller than the export, so it spans several gzip writes
+        data = gzip.decompress(b"".join(stream_emails_to_ndjson_gz(self.emails, 2)))
+        rows = [json.loads(line) for line in data.decode("utf-8").splitlines()]
+        for row in rows:
+            row["received_date"] = datetime.fromisoformat(row["received_date"])
+        self.assertEqual(rows, self.expected)
+
+    def test_parquet_round_trip(self):
+        import pyarrow.parquet as pq
+
+        output = BytesIO()
+        self.assertEqual(write_emails_to_parquet(self.emails, output, 2), 5)
+        output.seek(0)
+        table = pq.read_table(output)
+        self.assertEqual(table.column_names, EXPORT_FIELDS)
+        self.assertEqual(table.to_pylist(), self.expected)
+
+    async def test_ndjson_gz_export_streams_asynchronously(self):
+        token = AccessToken.for_user(self.user)
+        response = await AsyncClient().get(
+            "/api/export/",
+            {"export_format": "ndjson"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        self.assertEqual(response.status_code, 200)
+        # Under ASGI a sync iterator would be read into a list before sending
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        rows = [json.loads(line) for line in gzip.decompress(content).splitlines()]
+        self.assertEqual(
+            [row["subject"] for row in rows],
+            [row["subject"] for row in self.expected],
+        )
+
+    def test_ndjson_gz_export_loads_back(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "emails.ndjson.gz")
+            with open(path, "wb") as f:
+                f.writelines(stream_emails_to_ndjson_gz(self.emails))
+            User.objects.create_user("other")
+            call_command("load_emails", path, user="other", stdout=StringIO())
+        loaded = Email.objects.filter(assigned_to__username="other").order_by("id")
+        fields = [field for field in EXPORT_FIELDS if field != "received_date"]
+        self.assertEqual(
+            list(loaded.values(*fields)), list(self.emails.values(*fields))
+        )
+
+
+@override_settings(EMAIL_CHANGES_SAFETY_LAG_SECONDS=0)
+class EmailChangesExportTests(TestCase):
+    """The delta export pages through every change exactly once"""
+
+    def setUp(self):
+        self.user = User.objects.create_user("analyst")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Email.objects.bulk_create(
+            Email(
+                sender=f"sender{i}@example.com",
+                subject=f"Subject {i}",
+                content="Body",
+                confidence_score=0.1,
+                assigned_to=self.user,
+            )
+            for i in range(7)
+        )
+        self.ids = sorted(
+            Email.objects.filter(assigned_to=self.user).values_list("id", flat=True)
+        )
+
+    def fetch_all(self, limit, cursor=None):
+        ids = []
+        while True:
+            params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+            response = self.client.get("/api/export/changes/", params)
+            self.assertEqual(response.status_code, 200, response.data)
+            ids += [row["id"] for row in response.data["results"]]
+            cursor = response.data["next_cursor"]
+            if not response.data["has_more"]:
+                return ids, cursor
+
+    def test_cursor_round_trip(self):
+        updated_at = datetime(2024, 3, 1, 9, 30, 15, 123456, tzinfo=dt_timezone.utc)
+        cursor = encode_export_cursor(updated_at, 42)
+        self.assertNotIn("=", cursor)
+        self.assertEqual(decode_export_cursor(cursor), (updated_at, 42))
+        for invalid in ("not-a-cursor", "bm8tc2VwYXJhdG9y", cursor[:-3]):
+            with self.assertRaises(DjangoValidationError):
+                decode_export_cursor(invalid)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get("/api/export/changes/", {"cursor": "bad"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_pages_through_equal_timestamps(self):
+        # A bulk update gives many rows the same updated_at; the id breaks
+        # the tie, so no page boundary skips or repeats a row
+        Email.objects.filter(id__in=self.ids[1:6]).update(
+            updated_at=datetime(2024, 3, 1, tzinfo=dt_timezone.utc)
+        )
+        expected = sorted(
+            self.ids, key=lambda pk: (Email.objects.get(pk=pk).updated_at, pk)
+        )
+        for limit in (1, 2, 3, 7, 10):
+            with self.subTest(limit=limit):
+                ids, cursor = self.fetch_all(limit)
+                self.assertEqual(ids, expected)
+
+        # Changes after the last sync are all the next one returns
+        self.assertEqual(self.fetch_all(10, cursor), ([], cursor))
+        Email.objects.get(id=self.ids[2]).save()
+        response = self.client.get("/api/export/changes/", {"cursor": cursor})
+        self.assertEqual([row["id"] for row in response.data["results"]], [self.ids[2]])
+
+    @override_settings(EMAIL_CHANGES_SAFETY_LAG_SECONDS=60)
+    def test_recent_changes_wait_for_the_safety_lag(self):
+        # A change stamped before the last synced one, but committed after
+        # it, must still be exported: recent changes are held back until
+        # every transaction that could have stamped them has committed
+        Email.objects.filter(id__in=self.ids[:3]).update(
+            updated_at=timezone.now() - timedelta(minutes=5)
+        )
+        ids, cursor = self.fetch_all(10)
+        self.assertEqual(ids, self.ids[:3])
+
+        Email.objects.filter(id__in=self.ids[3:]).update(
+            updated_at=timezone.now() - timedelta(minutes=2)
+        )
+        self.assertEqual(self.fetch_all(10, cursor)[0], self.ids[3:])
+
+    def test_rehydrated_emails_are_exported_again(self):
+        ids, cursor = self.fetch_all(10)
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        Email.objects.filter(id=self.ids[0]).update(
+            received_date=datetime(2020, 1, 5, tzinfo=dt_timezone.utc)
+        )
+        with override_settings(EMAIL_ARCHIVE_DIR=archive_dir.name):
+            archive_month(date(2020, 1, 1))
+            rehydrate_month(date(2020, 1, 1))
+        self.assertEqual(self.fetch_all(10, cursor)[0], [self.ids[0]])
+
+
+class GenerateSampleEmailsTests(TestCase):
+    """A seed gives the same sample emails whenever it is run"""
+
+    def generate(self, directory, name, *args):
+        path = os.path.join(directory, name)
+        call_command(
+            "generate_sample_emails", "--output", path, *args, stdout=StringIO()
+        )
+        with open(path) as f:
+            return f.read()
+
+    def test_same_seed_same_output(self):
+        seed = ["--count", "30", "--seed", "7"]
+        with tempfile.TemporaryDirectory() as directory:
+            for args in (["--format", "json"], ["--format", "csv", "--workers", "2"]):
+                with self.subTest(args=args):
+                    first = self.generate(directory, "first", *seed, *args)
+                    second = self.generate(directory, "second", *seed, *args)
+                    self.assertEqual(second, first)
+            other_date = self.generate(
+                directory, "other", *seed, *args, "--base-date", "2024-06-01"
+            )
+        self.assertNotEqual(other_date, first)
+
+    def test_base_date_defaults_to_now_without_a_seed(self):
+        for args in (["--seed", "7"], []):
+            with self.subTest(args=args):
+                Email.objects.all().delete()
+                call_command(
+                    "generate_sample_emails",
+                    "--direct-db",
+                    "--count",
+                    "20",
+                    *args,
+                    stdout=StringIO(),
+                )
+                latest = (
+                    datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+                    if args
+                    else timezone.now()
+                )
+                dates = Email.objects.values_list("received_date", flat=True)
+                self.assertLessEqual(max(dates), latest)
+                self.assertGreater(min(dates), latest - timedelta(days=32))
+
+    def test_direct_db_keeps_date_spread(self):
+        call_command(
+            "generate_sample_emails",
+            "--direct-db",
+            "--count",
+            "50",
+            "--seed",
+            "7",
+            "--base-date",
+            "2024-06-01",
+            stdout=StringIO(),
+        )
+        dates = set(Email.objects.values_list("received_date", flat=True))
+        self.assertGreater(len(dates), 1)
+        self.assertLessEqual(max(dates), datetime(2024, 6, 1, tzinfo=dt_timezone.utc))
+
+
+@skipUnless(connection.vendor == "postgresql", "EXPLAIN output is PostgreSQL specific")
+class EmailIndexUsageTests(TestCase):
+    """The planner should serve EmailViewSet's query shapes from indexes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("analyst")
+        other = User.objects.create_user("other")
+
+        def make_email(i, user):
+            # Mostly safe mail, with a small high-risk tail as in production
+            if i % 50 == 0:
+                status, score = "dangerous", 0.9
+            elif i % 5 == 0:
+                status, score = "suspicious", 0.5
+            else:
+                status, score = "safe", 0.1
+            return Email(
+                sender=f"sender{i}@example.com",
+                subject=f"Subject {i}",
+                content="Your NHS appointment is confirmed",
+                status=status,
+                confidence_score=score,
+                assigned_to=user,
+            )
+
+        Email.objects.bulk_create(
+            make_email(i, user) for user in (cls.user, other) for i in range(1000)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Email._meta.db_table}")
+
+    def assertUsesIndex(self, queryset, index_name):
+        # The test table is tiny, so rule out sequential scans and compare
+        # the remaining index paths on cost
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        self.assertIn(index_name, queryset.explain())
+
+    def test_mailbox_list_uses_received_index(self):
+        queryset = Email.objects.filter(assigned_to=self.user).order_by(
+            "-received_date"
+        )[:10]
+        self.assertUsesIndex(queryset, "email_assignee_received_idx")
+
+    def test_status_filter_uses_status_index(self):
+        queryset = Email.objects.filter(
+            assigned_to=self.user, status="suspicious"
+        ).order_by("-received_date")[:10]
+        self.assertUsesIndex(queryset, "email_assignee_status_idx")
+
+    def test_dangerous_filter_uses_high_risk_index(self):
+        queryset = (
+            Email.objects.filter(assigned_to=self.user)
+            .filter(Q(status="dangerous") | Q(confidence_score__gte=0.7))
+            .order_by("-received_date")[:10]
+        )
+        self.assertUsesIndex(queryset, "email_assignee_high_risk_idx")
+
+    def test_confidence_bucket_uses_status_confidence_index(self):
+        queryset = Email.objects.filter(status="safe", confidence_score__lt=0.3)
+        self.assertUsesIndex(queryset, "email_status_confidence_idx")
+
+    def test_sender_like_uses_trigram_indexes(self):
+        if not trigram_enabled():
+            self.skipTest("pg_trgm is not available")
+        queryset = EmailFilterSet(
+            {"sender_like": "sender12@"}, queryset=Email.objects.all()
+        ).qs
+        # Each arm of the OR is served by an index, combined in a bitmap
+        self.assertUsesIndex(queryset, "email_sender_trgm_idx")
+        self.assertIn("email_sender_name_trgm_idx", queryset.explain())
+        self.assertNotIn("Seq Scan", queryset.explain())
+
+
+class EmailStatsQueryTests(TestCase):
+    """Stats endpoints aggregate in a single query regardless of mailbox size"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("analyst")
+        other = User.objects.create_user("other")
+        rows = [
+            ("safe", 0.1, cls.user),  # correct
+            ("safe", 0.5, cls.user),
+            ("suspicious", 0.5, cls.user),  # correct
+            ("suspicious", 0.8, cls.user),  # derived as dangerous, correct
+            ("dangerous", 0.9, cls.user),  # correct
+            ("dangerous", 0.9, other),  # correct
+        ]
+        Email.objects.bulk_create(
+            Email(
+                sender="sender@example.com",
+                subject="Subject",
+                content="Content",
+                status=status,
+                confidence_score=score,
+                assigned_to=user,
+            )
+            for status, score, user in rows
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_email_stats_is_one_query(self):
+        with self.assertNumQueries(1):
+            stats = email_stats(Email.objects.filter(assigned_to=self.user))
+        self.assertEqual(
+            stats,
+            {
+                "total_emails": 5,
+                "suspicious_emails": 1,
+                "high_risk_emails": 2,
+                "detection_rate": 4 / 5,
+            },
+        )
+
+    def test_public_stats_is_one_query(self):
+        # Reading the cache versions, then the aggregate
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/emails/public_stats/")
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                self.client.get("/api/emails/public_stats/").data, response.data
+            )
+        self.assertEqual(response.data["total_emails"], 6)
+        self.assertEqual(response.data["high_risk_emails"], 3)
+        self.assertEqual(response.data["detection_rate"], 5 / 6)
+
+    def test_suspicious_summary_is_one_query(self):
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/emails/suspicious_summary/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["total_emails"], 5)
+        self.assertEqual(response.data["high_risk_emails"], 2)
+
+
+@skipUnless(connection.vendor == "postgresql", "Counters are maintained by triggers")
+class MailboxCountersTests(TestCase):
+    """Per-user counters track every kind of write to the email table"""
+
+    def setUp(self):
+        self.user = User.objects.create_user("analyst")
+        self.other = User.objects.create_user("other")
+
+    def make_email(self, **kwargs):
+        fields = {
+            "sender": "sender@example.com",
+            "subject": "Subject",
+            "content": "Content",
+            "status": "safe",
+            "confidence_score": 0.1,
+            "assigned_to": self.user,
+        }
+        fields.update(kwargs)
+        return Email(**fields)
+
+    def assertCountersMatchEmails(self, user):
+        counters = MailboxCounters.objects.get(user=user)
+        emails = Email.objects.filter(assigned_to=user)
+        self.assertEqual(counters.total, emails.count())
+        for field, condition in COUNTER_FILTERS.items():
+            self.assertEqual(getattr(counters, field), emails.filter(condition).count())
+
+    def test_counters_follow_creates_updates_and_deletes(self):
+        email = self.make_email()
+        email.save()
+        Email.objects.bulk_create(
+            [self.make_email(status="suspicious", confidence_score=0.5)] * 3
+        )
+        self.assertCountersMatchEmails(self.user)
+
+        # Reclassify, quarantine and reassign
+        email.status, email.confidence_score = "dangerous", 0.9
+        email.save()
+        Email.objects.filter(assigned_to=self.user).update(is_quarantined=True)
+        email.assigned_to = self.other
+        email.save()
+        self.assertCountersMatchEmails(self.user)
+        self.assertCountersMatchEmails(self.other)
+
+        email.delete()
+        Email.objects.filter(status="suspicious")[:1].get().delete()
+        self.assertCountersMatchEmails(self.user)
+        self.assertCountersMatchEmails(self.other)
+        self.assertEqual(MailboxCounters.objects.get(user=self.user).total, 2)
+
+    def test_recount_repairs_drift(self):
+        Email.objects.bulk_create([self.make_email()] * 2)
+        MailboxCounters.objects.filter(user=self.user).update(total=10, safe=0)
+
+        self.assertTrue(recount_mailbox(self.user.id))
+        self.assertCountersMatchEmails(self.user)
+        self.assertFalse(recount_mailbox(self.user.id))
+
+    def test_deleting_user_with_emails(self):
+        Email.objects.bulk_create([self.make_email()] * 2)
+        self.user.delete()
+        # Foreign keys are deferred; check them now rather than at commit
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        self.assertFalse(MailboxCounters.objects.filter(user_id=self.user.id).exists())
+
+
+class EmailKeysetPaginationTests(TestCase):
+    """Cursor pages are keyed on (received_date, id) rather than offsets"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("analyst")
+        Email.objects.bulk_create(
+            Email(
+                sender="sender@example.com",
+                subject=f"Subject {i}",
+                content="Content",
+                assigned_to=cls.user,
+            )
+            for i in range(25)
+        )
+        # Ties on received_date are broken by id
+        Email.objects.filter(id__in=Email.objects.order_by("id")[:5]).update(
+            received_date=Email.objects.order_by("id").first().received_date
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [email["id"] for email in response.data["results"]]
+            url = response.data["next"]
+        return ids
+
+    def test_pages_cover_mailbox_in_order(self):
+        expected = list(
+            Email.objects.order_by("-received_date", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(self.walk("/api/emails/?cursor="), expected)
+        self.assertEqual(
+            self.walk("/api/emails/?cursor=&ordering=received_date"), expected[::-1]
+        )
+
+    def test_new_mail_does_not_shift_pages(self):
+        first = self.client.get("/api/emails/?cursor=")
+        Email.objects.create(
+            sender="late@example.com",
+            subject="Late",
+            content="Content",
+            assigned_to=self.user,
+        )
+        second = self.client.get(first.data["next"])
+        first_ids = {email["id"] for email in first.data["results"]}
+        self.assertFalse(first_ids & {email["id"] for email in second.data["results"]})
+
+        previous = self.client.get(second.data["previous"])
+        self.assertEqual(previous.data["results"], first.data["results"])
+
+    def test_count_is_optional(self):
+        response = self.client.get("/api/emails/?cursor=")
+        self.assertNotIn("count", response.data)
+        response = self.client.get("/api/emails/?cursor=&with_count=true")
+        self.assertEqual(response.data["count"], 25)
+        self.assertFalse(response.data["count_is_approximate"])
+
+    def test_page_numbers_remain_the_default(self):
+        response = self.client.get("/api/emails/?page=2")
+        self.assertEqual(response.data["count"], 25)
+        self.assertEqual(len(response.data["results"]), 10)
+
+
+class CountStrategyTests(TestCase):
+    """Small lists are counted exactly, large ones are estimated"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("analyst")
+        Email.objects.bulk_create(
+            Email(
+                sender="sender@example.com",
+                subject=f"Subject {i}",
+                content="Content",
+                status="suspicious" if i % 3 == 0 else "safe",
+                assigned_to=cls.user,
+            )
+            for i in range(300)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Email._meta.db_table}")
+
+    def test_exact_below_threshold(self):
+        self.assertEqual(
+            count_queryset(Email.objects.all(), threshold=300), (300, False)
+        )
+
+    def test_estimated_above_threshold(self):
+        count, approximate = count_queryset(
+            Email.objects.filter(status="safe"), threshold=50
+        )
+        self.assertTrue(approximate)
+        self.assertGreater(count, 50)
+
+    @override_settings(EMAIL_EXACT_COUNT_THRESHOLD=50)
+    def test_list_flags_approximate_count(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get("/api/emails/")
+        self.assertTrue(response.data["count_is_approximate"])
+        response = client.get("/api/emails/?status=suspicious&search=Subject 1")
+        self.assertEqual(
+            response.data["count"],
+            Email.objects.filter(
+                status="suspicious", subject__startswith="Subject 1"
+            ).count(),
+        )
+        self.assertFalse(response.data["count_is_approximate"])
+
+
+@skipUnless(connection.vendor == "postgresql", "Full-text search uses PostgreSQL")
+class EmailSearchTests(TestCase):
+    """Searches use the full-text index and rank subject matches first"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("analyst")
+        rows = [
+            ("billing@example.com", "Invoice overdue", "Please pay the attached"),
+            ("gp@nhs.net", "Appointment reminder", "Your invoice is enclosed"),
+            ("gp@nhs.net", "Prescriptions ready", "Collect from the pharmacy"),
+        ]
+        Email.objects.bulk_create(
+            Email(sender=sender, subject=subject, content=content, assigned_to=cls.user)
+            for sender, subject, content in rows
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, term, **params):
+        response = self.client.get("/api/emails/", {"search": term, **params})
+        self.assertEqual(response.status_code, 200)
+        return [email["subject"] for email in response.data["results"]]
+
+    def test_ranked_by_relevance(self):
+        self.assertEqual(
+            self.search("invoices"), ["Invoice overdue", "Appointment reminder"]
+        )
+
+    def test_prefixes_and_senders_match(self):
+        self.assertEqual(self.search("prescr"), ["Prescriptions ready"])
+        self.assertEqual(len(self.search("gp@nhs.net")), 2)
+        self.assertEqual(self.search("pharmacy collect"), ["Prescriptions ready"])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search("invoice & !(overdue"), ["Invoice overdue"])
+        self.assertEqual(len(self.search("(")), 3)
+
+    def test_search_uses_gin_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        request = Request(APIRequestFactory().get("/", {"search": "invoice"}))
+        queryset = EmailSearchFilter().filter_queryset(
+            request, Email.objects.all(), None
+        )
+        self.assertIn("email_search_vector_idx", queryset.explain())
+
+
+class SenderLookupTests(TestCase):
+    """Sender domains are derived on write and senders match by fragment"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("analyst")
+        senders = [
+            ("refunds@NHS-Refund.co.uk", "NHS Refunds"),
+            ("gp@nhs.net", "Riverside Surgery"),
+            ("clinic@nhs.net", "Walk-in Clinic"),
+        ]
+        Email.objects.bulk_create(
+            Email(
+                sender=sender,
+                sender_name=name,
+                subject="Subject",
+                content="Content",
+                assigned_to=cls.user,
+            )
+            for sender, name in senders
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def senders(self, **params):
+        response = self.client.get("/api/emails/", params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(email["sender"] for email in response.data["results"])
+
+    def test_domain_is_normalized(self):
+        self.assertEqual(
+            sorted(Email.objects.values_list("sender_domain", flat=True)),
+            ["nhs-refund.co.uk", "nhs.net", "nhs.net"],
+        )
+        self.assertEqual(
+            self.senders(sender_domain="NHS.net"), ["clinic@nhs.net", "gp@nhs.net"]
+        )
+
+    def test_sender_like_matches_address_and_name(self):
+        self.assertEqual(
+            self.senders(sender_like="nhs-ref"), ["refunds@NHS-Refund.co.uk"]
+        )
+        self.assertEqual(self.senders(sender_like="surgery"), ["gp@nhs.net"])
+        # LIKE wildcards in the fragment match literally
+        self.assertEqual(self.senders(sender_like="%"), [])
+
+    def test_sender_domains_groups_mailbox(self):
+        response = self.client.get("/api/emails/sender_domains/")
+        self.assertEqual(
+            [(row["sender_domain"], row["total"]) for row in response.data],
+            [("nhs.net", 2), ("nhs-refund.co.uk", 1)],
+        )
+
+
+class EndpointQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Each email endpoint runs a fixed number of queries per request"""
+
+    def setUp(self):
+        self.user = User.objects.create_user("analyst")
+        UserProfile.objects.create(user=self.user, role="admin")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.email = self.add_email()
+
+    def add_email(self):
+        email = Email.objects.create(
+            sender="sender@example.com",
+            subject="Subject",
+            content="Content",
+            assigned_to=self.user,
+            reviewed_by=self.user,
+        )
+        self.add_attachment(email)
+        analysis = EmailAnalysis.objects.create(email=email)
+        analysis.matched_patterns.add(self.add_pattern())
+        return email
+
+    def add_attachment(self, email):
+        EmailAttachment.objects.create(
+            email=email,
+            file="email_attachments/letter.pdf",
+            filename="letter.pdf",
+            content_type="application/pdf",
+            size=1024,
+        )
+
+    def add_pattern(self):
+        return SuspiciousPattern.objects.create(
+            pattern=f"pattern {SuspiciousPattern.objects.count()}",
+            category="phishing",
+        )
+
+    def add_emails(self):
+        for _ in range(3):
+            self.add_email()
+
+    def test_email_list(self):
+        self.assertQueryBudget("/api/emails/", 4, self.add_emails)
+        self.assertQueryBudget("/api/emails/", 4, self.add_emails, cursor="")
+
+    def test_email_detail(self):
+        def add_nested_rows():
+            self.add_attachment(self.email)
+            self.email.analysis.matched_patterns.add(self.add_pattern())
+
+        self.assertQueryBudget(f"/api/emails/{self.email.id}/", 6, add_nested_rows)
+
+    def test_analysis_list(self):
+        self.assertQueryBudget("/api/analysis/", 5, self.add_emails)
+
+    def test_list_and_quarantine_skip_body(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/api/emails/")
+            self.client.post(f"/api/emails/{self.email.id}/quarantine/")
+        # The list page, the quarantined email and its update
+        email_queries = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith(
+                ('SELECT "emails_email"', 'UPDATE "emails_email"')
+            )
+        ]
+        self.assertEqual(len(email_queries), 3)
+        for sql in email_queries:
+            self.assertNotIn('"content"', sql)
+            self.assertNotIn('"search_vector"', sql)
+        self.email.refresh_from_db()
+        self.assertTrue(self.email.is_quarantined)
+
+    def test_attachment_and_pattern_lists(self):
+        self.assertQueryBudget("/api/attachments/", 2, self.add_emails)
+        self.assertQueryBudget("/api/patterns/", 3, self.add_emails)
+
+
+class EmailArchiveTests(TestCase):
+    """Emails past retention move to archive files and can be restored"""
+
+    def setUp(self):
+        self.user = User.objects.create_user("analyst")
+        UserProfile.objects.create(user=self.user, role="admin")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.pattern = SuspiciousPattern.objects.create(
+            pattern="verify your account", category="phishing"
+        )
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        self.archive_dir = archive_dir.name
+        settings = override_settings(EMAIL_ARCHIVE_DIR=self.archive_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        for i, received in enumerate(
+            [datetime(2020, 1, 5, tzinfo=dt_timezone.utc)] * 3
+            + [datetime(2020, 2, 1, tzinfo=dt_timezone.utc)]
+        ):
+            email = Email.objects.create(
+                sender=f"sender{i}@example.com",
+                subject=f"Subject {i}",
+                content=f"Content {i}",
+                status="suspicious",
+                confidence_score=0.5,
+                assigned_to=self.user,
+            )
+            Email.objects.filter(id=email.id).update(received_date=received)
+        self.january = list(
+            Email.objects.filter(received_date__month=1)
+            .order_by("id")
+            .values_list("id", "subject", "received_date", "created_at")
+        )
+        analysis = EmailAnalysis.objects.create(
+            email_id=self.january[0][0], risk_score=0.7
+        )
+        analysis.matched_patterns.add(self.pattern)
+        EmailAttachment.objects.create(
+            email_id=self.january[0][0],
+            file="email_attachments/letter.pdf",
+            filename="letter.pdf",
+            content_type="application/pdf",
+            size=1024,
+        )
+
+    def assertJanuaryRestored(self):
+        self.assertEqual(
+            list(
+                Email.objects.filter(received_date__month=1)
+                .order_by("id")
+                .values_list("id", "subject", "received_date", "created_at")
+            ),
+            self.january,
+        )
+        email = Email.objects.get(id=self.january[0][0])
+        self.assertEqual(email.analysis.risk_score, 0.7)
+        self.assertEqual(list(email.analysis.matched_patterns.all()), [self.pattern])
+        self.assertEqual(email.attachments.get().filename, "letter.pdf")
+        self.assertEqual(MailboxCounters.objects.get(user=self.user).total, 4)
+
+    def test_archive_and_rehydrate_month(self):
+        for archive_format in ["ndjson", "parquet"]:
+            with self.subTest(archive_format=archive_format):
+                path, written = archive_month(
+                    date(2020, 1, 1), archive_format=archive_format, chunk_size=2
+                )
+                self.assertEqual(written, 3)
+                self.assertFalse(Email.objects.filter(received_date__month=1))
+                self.assertFalse(EmailAnalysis.objects.exists())
+                # The other month and the counters are untouched by the move
+                self.assertEqual(Email.objects.count(), 1)
+                self.assertEqual(MailboxCounters.objects.get(user=self.user).total, 1)
+
+                restored, skipped, paths = rehydrate_month(date(2020, 1, 1))
+                self.assertEqual((restored, skipped, paths), (3, 0, [path]))
+                self.assertJanuaryRestored()
+
+                # Rehydrating again finds every row already present
+                self.assertEqual(rehydrate_month(date(2020, 1, 1))[:2], (0, 3))
+                self.assertJanuaryRestored()
+                for path in paths:
+                    os.remove(path)
+
+    def test_command_archives_months_before_cutoff(self):
+        call_command("archive_emails", before="2020-02", stdout=StringIO())
+        self.assertEqual(Email.objects.count(), 1)
+
+        response = self.client.get("/api/archive/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [entry["month"] for entry in response.data["results"]], ["2020-01"]
+        )
+
+        out = StringIO()
+        call_command("archive_emails", rehydrate="2020-01", stdout=out)
+        self.assertIn("restored 3 emails (0 already present)", out.getvalue())
+        self.assertJanuaryRestored()
+
+        with self.assertRaisesMessage(CommandError, "No archive found for 2019-12"):
+            call_command("archive_emails", rehydrate="2019-12")
+        with self.assertRaises(CommandError):
+            call_command("archive_emails", rehydrate="January")
+
+    def test_rehydrate_endpoint_queues_a_background_restore(self):
+        call_command("archive_emails", before="2020-02", stdout=StringIO())
+
+        with patch("backend.emails.views.start_rehydration") as start:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                response = self.client.post(
+                    "/api/archive/rehydrate/", {"month": "2020-01"}, format="json"
+                )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["month"], "2020-01")
+        self.assertEqual(response.data["status"], "pending")
+        self.assertEqual(len(callbacks), 1)
+        start.assert_called_once_with(response.data["id"])
+        # Nothing is restored within the request
+        self.assertFalse(Email.objects.filter(received_date__month=1))
+
+        run_rehydration(response.data["id"])
+        self.assertJanuaryRestored()
+        response = self.client.get(response["Location"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], "completed")
+        self.assertEqual((response.data["restored"], response.data["skipped"]), (3, 0))
+
+        response = self.client.post(
+            "/api/archive/rehydrate/", {"month": "2019-12"}, format="json"
+        )
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post(
+            "/api/archive/rehydrate/", {"month": "January"}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ArchiveRehydration.objects.count(), 1)
+
+    def test_failed_rehydration_is_recorded(self):
+        rehydration = ArchiveRehydration.objects.create(month=date(2020, 1, 1))
+        with patch(
+            "backend.emails.services.archive.rehydrate_month",
+            side_effect=OSError("archive unreadable"),
+        ):
+            run_rehydration(rehydration.id)
+        rehydration.refresh_from_db()
+        self.assertEqual(rehydration.status, "failed")
+        self.assertEqual(rehydration.error, "archive unreadable")
+        self.assertIsNotNone(rehydration.completed_at)
+
+
+class ResponseCacheTests(TestCase):
+    """Cached responses are reused until the data behind them is written to"""
+
+    def setUp(self):
+        cache.clear()
+        response_cache_stats.reset()
+        self.user = User.objects.create_user("analyst")
+        UserProfile.objects.create(user=self.user, role="admin")
+        self.other = User.objects.create_user("other")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.pattern = SuspiciousPattern.objects.create(
+            pattern="verify your account", category="phishing"
+        )
+        self.email = self.add_email(self.user)
+        analysis = EmailAnalysis.objects.create(email=self.email, notes="First look")
+        analysis.matched_patterns.add(self.pattern)
+
+    def add_email(self, user):
+        return Email.objects.create(
+            sender="sender@example.com",
+            subject="Subject",
+            content="Content",
+            assigned_to=user,
+        )
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response
+
+    def assertCached(self, url):
+        """Assert that ``url`` is served from the cache, and return its data"""
+        # Reading the versions, plus the email's update time for its detail
+        detail = url == f"/api/emails/{self.email.id}/"
+        with self.assertNumQueries(2 if detail else 1):
+            response = self.get(url)
+        self.assertEqual(response["X-Cache"], "HIT")
+        return response.data
+
+    def test_repeated_requests_are_served_from_cache(self):
+        for url in [
+            "/api/emails/",
+            f"/api/emails/{self.email.id}/",
+            "/api/patterns/",
+            "/api/emails/public_stats/",
+        ]:
+            with self.subTest(url=url):
+                response = self.get(url)
+                self.assertEqual(response["X-Cache"], "MISS")
+                self.assertEqual(self.assertCached(url), response.data)
+
+        # Different query strings are cached separately
+        self.assertEqual(self.get("/api/emails/?status=dangerous").data["count"], 0)
+
+        stats = self.get("/api/cache/stats/").data
+        self.assertEqual((stats["hits"], stats["misses"]), (4, 5))
+        self.assertEqual(stats["endpoints"]["email-list"]["hit_rate"], 1 / 3)
+
+    def test_writes_invalidate_cached_responses(self):
+        list_url, detail_url = "/api/emails/", f"/api/emails/{self.email.id}/"
+
+        def refresh():
+            for url in [list_url, detail_url, "/api/patterns/"]:
+                self.get(url)
+                self.assertCached(url)
+
+        refresh()
+        self.client.patch(detail_url, {"subject": "Edited"})
+        self.assertEqual(self.get(detail_url).data["subject"], "Edited")
+
+        refresh()
+        Email.objects.filter(id=self.email.id).update(is_quarantined=True)
+        self.assertTrue(self.get(list_url).data["results"][0]["is_quarantined"])
+
+        refresh()
+        Email.objects.bulk_create(
+            [Email(sender="a@example.com", assigned_to=self.user)]
+        )
+        self.assertEqual(self.get(list_url).data["count"], 2)
+
+        refresh()
+        EmailAnalysis.objects.filter(email=self.email).update(notes="Second look")
+        self.assertEqual(self.get(detail_url).data["analysis"]["notes"], "Second look")
+
+        refresh()
+        self.email.analysis.matched_patterns.clear()
+        self.assertEqual(self.get(detail_url).data["analysis"]["matched_patterns"], [])
+
+        refresh()
+        SuspiciousPattern.objects.update(category="malware")
+        self.assertEqual(
+            self.get("/api/patterns/").data["results"][0]["category"], "malware"
+        )
+
+        refresh()
+        Email.objects.filter(id=self.email.id).delete()
+        self.assertEqual(self.get(list_url).data["count"], 1)
+
+    def test_other_mailboxes_do_not_invalidate(self):
+        self.get("/api/emails/")
+        self.get("/api/emails/public_stats/")
+        self.add_email(self.other)
+        self.assertCached("/api/emails/")
+        # Public statistics cover every mailbox, including unassigned email
+        self.assertEqual(self.get("/api/emails/public_stats/").data["total_emails"], 2)
+        self.add_email(None)
+        self.assertEqual(self.get("/api/emails/public_stats/").data["total_emails"], 3)
+
+    def test_file_backend(self):
+        with tempfile.TemporaryDirectory() as location:
+            backend = "django.core.cache.backends.filebased.FileBasedCache"
+            with override_settings(
+                CACHES={"default": {"BACKEND": backend, "LOCATION": location}}
+            ):
+                response = self.get("/api/emails/")
+                self.assertEqual(self.assertCached("/api/emails/"), response.data)
+
+
+class ConditionalRequestTests(TestCase):
+    """ETags let clients skip unchanged responses and detect lost updates"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("analyst")
+        UserProfile.objects.create(user=self.user, role="analyst")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.email = Email.objects.create(
+            sender="sender@example.com",
+            subject="Subject",
+            content="Content",
+            assigned_to=self.user,
+        )
+        EmailAnalysis.objects.create(email=self.email)
+        SuspiciousPattern.objects.create(pattern="urgent", category="phishing")
+        self.detail_url = f"/api/emails/{self.email.id}/"
+
+    def test_unchanged_responses_are_not_modified(self):
+        for url in [
+            "/api/emails/",
+            self.detail_url,
+            "/api/patterns/",
+            "/api/analysis/",
+        ]:
+            with self.subTest(url=url):
+                etag = self.client.get(url)["ETag"]
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response["ETag"], etag)
+                self.assertEqual(response.content, b"")
+                # Only versions and update times are read, no rows
+                for query in queries.captured_queries:
+                    self.assertNotIn('"subject"', query["sql"])
+
+        etag = self.client.get(self.detail_url)["ETag"]
+        self.client.patch(self.detail_url, {"subject": "Edited"})
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.data["subject"], "Edited")
+
+    def test_if_match_guards_updates(self):
+        etag = self.client.get(self.detail_url)["ETag"]
+        # Other emails arriving in the mailbox don't conflict with the edit
+        Email.objects.create(sender="new@example.com", assigned_to=self.user)
+        response = self.client.patch(
+            self.detail_url, {"subject": "First"}, HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.client.get(self.detail_url)["ETag"], response["ETag"])
+
+        # A second edit made against the original tag would lose the first
+        response = self.client.patch(
+            self.detail_url, {"subject": "Second"}, HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 412)
+        self.email.refresh_from_db()
+        self.assertEqual(self.email.subject, "First")
+
+        response = self.client.patch(
+            self.detail_url, {"subject": "Second"}, HTTP_IF_MATCH="*"
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class SparseFieldsetTests(TestCase):
+    """?fields= and ?expand= narrow both responses and the queries behind them"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("analyst")
+        UserProfile.objects.create(user=self.user, role="analyst")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.email = Email.objects.create(
+            sender="sender@example.com",
+            subject="Subject",
+            content="Content",
+            status="suspicious",
+            confidence_score=0.5,
+            assigned_to=self.user,
+        )
+        analysis = EmailAnalysis.objects.create(email=self.email, risk_score=0.6)
+        analysis.matched_patterns.add(
+            SuspiciousPattern.objects.create(pattern="urgent", category="phishing")
+        )
+        EmailAttachment.objects.create(
+            email=self.email,
+            file="email_attachments/letter.pdf",
+            filename="letter.pdf",
+            content_type="application/pdf",
+            size=1024,
+        )
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        sql = "\n".join(
+            query["sql"]
+            for query in queries.captured_queries
+            if "emails_cacheversion" not in query["sql"]
+        )
+        return response.data, sql
+
+    def test_fields_prune_columns_and_relations(self):
+        data, sql = self.get("/api/emails/", fields="id,status,confidence_score")
+        self.assertEqual(
+            data["results"],
+            [{"id": self.email.id, "status": "suspicious", "confidence_score": 0.5}],
+        )
+        self.assertNotIn('"subject"', sql)
+
+        data, sql = self.get(
+            f"/api/emails/{self.email.id}/",
+            fields="id,analysis.risk_score,analysis.matched_patterns.pattern",
+        )
+        self.assertEqual(
+            data,
+            {
+                "id": self.email.id,
+                "analysis": {
+                    "risk_score": 0.6,
+                    "matched_patterns": [{"pattern": "urgent"}],
+                },
+            },
+        )
+        self.assertNotIn('"content"', sql)
+        self.assertNotIn('"notes"', sql)
+        self.assertNotIn('"category"', sql)
+        self.assertNotIn("emails_emailattachment", sql)
+
+    def test_expand_adds_to_default_fields(self):
+        data, sql = self.get("/api/emails/", expand="attachments.filename")
+        email = data["results"][0]
+        self.assertEqual(email["subject"], "Subject")
+        self.assertEqual(email["attachments"], [{"filename": "letter.pdf"}])
+        self.assertNotIn("analysis", email)
+        self.assertNotIn('"content"', sql)
+        self.assertNotIn("emails_emailanalysis", sql)
+
+    def test_analysis_and_attachment_fields(self):
+        data, sql = self.get("/api/analysis/", fields="id,risk_score")
+        self.assertEqual(list(data["results"][0]), ["id", "risk_score"])
+        self.assertNotIn("emails_suspiciouspattern", sql)
+        data, _ = self.get("/api/attachments/", fields="filename,size")
+        self.assertEqual(data["results"], [{"filename": "letter.pdf", "size": 1024}])
+
+    def test_unknown_fields_are_rejected(self):
+        for fields in ["id,nope", "status.value", "analysis.nope"]:
+            response = self.client.get("/api/emails/", {"fields": fields})
+            self.assertEqual(response.status_code, 400, fields)
+
+
+@override_settings(EMAIL_BULK_ACTION_CHUNK_SIZE=2, EMAIL_BULK_ACTION_MAX_IDS=50)
+class BulkEmailActionTests(TestCase):
+    """Bulk actions change a mailbox's emails in chunks and leave an audit record"""
+
+    def setUp(self):
+        self.user = User.objects.create_user("analyst")
+        self.profile = UserProfile.objects.create(user=self.user, role="admin")
+        self.other = User.objects.create_user("other")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for i in range(5):
+            Email.objects.create(
+                sender=f"billing{i}@invoice-scam.com",
+                subject="Overdue invoice",
+                content="Pay now",
+                status="suspicious",
+                confidence_score=0.5,
+                assigned_to=self.user,
+            )
+        self.safe = Email.objects.create(
+            sender="colleague@example.com",
+            subject="Overdue invoice",
+            content="Lunch?",
+            assigned_to=self.user,
+        )
+        # Another mailbox's copy of the campaign is out of reach
+        self.others = Email.objects.create(
+            sender="billing@invoice-scam.com",
+            subject="Overdue invoice",
+            content="Pay now",
+            assigned_to=self.other,
+        )
+
+    def bulk(self, **data):
+        return self.client.post("/api/emails/bulk/", data, format="json")
+
+    def test_quarantine_by_filter(self):
+        campaign = {"sender_domain": "Invoice-Scam.com", "subject": "Overdue invoice"}
+        Email.objects.filter(sender="billing0@invoice-scam.com").update(
+            is_quarantined=True
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.bulk(action="quarantine", filter=campaign)
+        self.assertEqual(response.status_code, 200, response.data)
+        # Already quarantined emails aren't rewritten or counted
+        self.assertEqual(response.data["affected"], 4)
+        self.assertEqual(response.data["criteria"], {"filter": campaign})
+        self.assertIsNotNone(response.data["completed_at"])
+        updates = [
+            q for q in queries.captured_queries if 'UPDATE "emails_email"' in q["sql"]
+        ]
+        self.assertEqual(len(updates), 2)
+
+        quarantined = Email.objects.filter(is_quarantined=True)
+        self.assertEqual(quarantined.count(), 5)
+        self.assertFalse(quarantined.filter(pk__in=[self.safe.pk, self.others.pk]))
+        self.assertEqual(MailboxCounters.objects.get(user=self.user).quarantined, 5)
+
+        audit = BulkEmailAction.objects.get()
+        self.assertEqual(audit.performed_by, self.user)
+        self.assertEqual(audit.affected, 4)
+
+    def test_release_reassign_and_delete_by_id(self):
+        campaign = Email.objects.filter(
+            assigned_to=self.user, sender_domain="invoice-scam.com"
+        )
+        ids = list(campaign.order_by("id").values_list("id", flat=True))
+        Email.objects.update(is_quarantined=True)
+        response = self.bulk(action="release", ids=ids + [self.others.pk])
+        self.assertEqual(response.data["affected"], 5)
+        self.assertTrue(Email.objects.get(pk=self.others.pk).is_quarantined)
+
+        response = self.bulk(action="reassign", ids=ids[:2], assigned_to=self.other.pk)
+        self.assertEqual(response.data["affected"], 2)
+        self.assertEqual(response.data["assigned_to"], self.other.pk)
+        self.assertEqual(Email.objects.filter(assigned_to=self.other).count(), 3)
+
+        EmailAnalysis.objects.create(email_id=ids[2], risk_score=0.6)
+        # Ids of other mailboxes' emails are ignored
+        response = self.bulk(action="delete", ids=ids + [self.others.pk])
+        # The reassigned emails left the mailbox
+        self.assertEqual(response.data["affected"], 3)
+        self.assertEqual(Email.objects.count(), 4)
+        self.assertFalse(EmailAnalysis.objects.exists())
+
+    def test_permissions_and_validation(self):
+        self.profile.role = "analyst"
+        self.profile.save()
+        response = self.bulk(action="release", filter={"status": "suspicious"})
+        self.assertEqual(response.status_code, 403)
+        response = self.bulk(action="reassign", ids=[1], assigned_to=self.other.pk)
+        self.assertEqual(response.status_code, 403)
+
+        for data in [
+            {"action": "quarantine"},
+            {"action": "quarantine", "ids": [1], "filter": {"status": "safe"}},
+            {"action": "quarantine", "filter": {}},
+            {"action": "archive", "ids": [1]},
+            {"action": "reassign", "ids": [1]},
+            {
+                "action": "quarantine",
+                "ids": list(range(1, settings.EMAIL_BULK_ACTION_MAX_IDS + 2)),
+            },
+        ]:
+            self.assertEqual(self.bulk(**data).status_code, 400, data)
+        self.assertFalse(BulkEmailAction.objects.exists())
+
+        ids = list(range(1, settings.EMAIL_BULK_ACTION_MAX_IDS + 1))
+        self.assertEqual(self.bulk(action="quarantine", ids=ids).status_code, 200)
+
+
+class AnalyzeEmailTests(TestCase):
+    """Emails are analyzed with the classifier saved by train_classifier"""
+
+    def setUp(self):
+        self.user = User.objects.create_user("analyst")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.addCleanup(setattr, ml_service, "_analyzer", None)
+
+    def save_analyzer(self, path):
+        # A trained network's shapes, without the cost of training one
+        analyzer = ml_service.EmailAnalyzer()
+        analyzer.extract_features(
+            ["Your lab results are ready", "Lunch on Friday?"], fit=True
+        )
+        analyzer.label_encoder.fit(["safe", "suspicious"])
+        rng = np.random.default_rng(0)
+        features = len(analyzer.tfidf_vectorizer.vocabulary_)
+        analyzer.weights = [
+            rng.normal(size=(features, 64)),
+            np.zeros(64),
+            rng.normal(size=(64, 32)),
+            np.zeros(32),
+            rng.normal(size=(32, 1)),
+            np.zeros(1),
+        ]
+        analyzer.save(path)
+
+    def test_analyze_email(self):
+        content = "URGENT: critical findings in your lab results, click here"
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "classifier.pkl")
+            with override_settings(EMAIL_CLASSIFIER_PATH=path):
+                response = self.client.post("/api/emails/analyze_email/", {})
+                self.assertEqual(response.status_code, 400)
+                response = self.client.post(
+                    "/api/emails/analyze_email/", {"content": content}
+                )
+                self.assertEqual(response.status_code, 500)
+
+                self.save_analyzer(path)
+                response = self.client.post(
+                    "/api/emails/analyze_email/", {"content": content}
+                )
+        self.assertEqual(response.status_code, 200, response.data)
+        email = Email.objects.get(pk=response.data["email_id"])
+        self.assertEqual(email.assigned_to, self.user)
+        self.assertEqual(email.analysis.risk_score, response.data["risk_score"])
+        self.assertGreater(response.data["risk_score"], 0)
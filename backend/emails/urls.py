@@ -5,8 +5,17 @@ from .views import (
     EmailAttachmentViewSet,
     SuspiciousPatternViewSet,
     EmailAnalysisViewSet,
+    analyze_email,
+    suspicious_summary,
+    sender_domains,
     export_emails,
+    export_email_changes,
     import_emails,
+    archived_months,
+    rehydrate_archived_month,
+    archive_rehydration_status,
+    response_cache_stats_view,
+    connection_pool_stats_view,
 )
 
 router = DefaultRouter()
@@ -16,8 +25,31 @@ router.register(r"patterns", SuspiciousPatternViewSet)
 router.register(r"analysis", EmailAnalysisViewSet)
 
 urlpatterns = [
+    # Asynchronous email endpoints, ahead of the router's detail routes
+    path("emails/analyze_email/", analyze_email, name="email-analyze-email"),
+    path(
+        "emails/suspicious_summary/",
+        suspicious_summary,
+        name="email-suspicious-summary",
+    ),
+    path("emails/sender_domains/", sender_domains, name="email-sender-domains"),
     path("", include(router.urls)),
     # Export/Import endpoints
     path("export/", export_emails, name="export-emails"),
+    path("export/changes/", export_email_changes, name="export-email-changes"),
     path("import/", import_emails, name="import-emails"),
+    # Cold archive of emails past retention
+    path("archive/", archived_months, name="email-archive"),
+    path(
+        "archive/rehydrate/",
+        rehydrate_archived_month,
+        name="email-archive-rehydrate",
+    ),
+    path(
+        "archive/rehydrate/<int:pk>/",
+        archive_rehydration_status,
+        name="email-archive-rehydration",
+    ),
+    path("cache/stats/", response_cache_stats_view, name="response-cache-stats"),
+    path("db/pool/stats/", connection_pool_stats_view, name="db-pool-stats"),
 ]
@@ -1,50 +1,162 @@
-from django.shortcuts import render
-from django.http import HttpResponse
+import tempfile
+from django.conf import settings
+from django.shortcuts import get_object_or_404, render
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from rest_framework import viewsets, permissions, status, filters
+from adrf.decorators import api_view as async_api_view
+from asgiref.sync import sync_to_async
 from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Email, EmailAttachment, SuspiciousPattern, EmailAnalysis
+from .models import (
+    ArchiveRehydration,
+    Email,
+    EmailAttachment,
+    SuspiciousPattern,
+    EmailAnalysis,
+)
 from .serializers import (
+    ArchiveRehydrationSerializer,
+    BulkEmailActionRequestSerializer,
+    BulkEmailActionSerializer,
     EmailSerializer,
     EmailListSerializer,
     EmailAttachmentSerializer,
     SuspiciousPatternSerializer,
     EmailAnalysisSerializer,
 )
+from backend.core.pools import connection_pool_stats
 from .permissions import IsAdminOrReadOnly
-from .ml_service import EmailAnalyzer, train_email_classifier
-from django.db import models
-from rest_framework.pagination import PageNumberPagination
+from .ml_service import get_analyzer
+from django.db import models, transaction
+from django.utils.http import parse_etags
+from .filters import EmailFilterSet, EmailSearchFilter
+from .fieldsets import SparseFieldsetViewMixin
+from .pagination import EmailPagination
+from .caching import (
+    ALL_MAILBOXES_SCOPE,
+    PATTERNS_SCOPE,
+    CachedResponseMixin,
+    cached_response,
+    response_cache_stats,
+)
 from .services.import_export import (
+    EXPORT_FORMATS,
+    aget_email_changes,
     validate_file_extension,
     export_emails_to_json,
     export_emails_to_csv,
+    astream_emails_to_ndjson_gz,
+    write_emails_to_parquet,
     import_emails_from_json,
     import_emails_from_csv,
+    save_imported_emails,
+)
+from .services.bulk_actions import ADMIN_ACTIONS, run_bulk_action, select_emails
+from .services.archive import (
+    archive_paths,
+    list_archived_months,
+    parse_month,
+    start_rehydration,
 )
+from .services.counters import aget_mailbox_summary
+from .services.stats import email_stats
 from rest_framework.exceptions import ValidationError
+from django.core.exceptions import ValidationError as DjangoValidationError
 
 
-class EmailViewSet(viewsets.ModelViewSet):
+class EmailViewSet(SparseFieldsetViewMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Email.objects.all()
     serializer_class = EmailSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [
         DjangoFilterBackend,
-        filters.SearchFilter,
         filters.OrderingFilter,
+        # After ordering, so relevance can replace the default order
+        EmailSearchFilter,
     ]
-    filterset_fields = ["status", "is_quarantined", "has_attachments"]
+    filterset_class = EmailFilterSet
     search_fields = ["sender", "subject", "content"]
     ordering_fields = ["received_date", "status", "confidence_score"]
     ordering = ["-received_date"]
-    pagination_class = PageNumberPagination
+    pagination_class = EmailPagination
+    fieldset_serializer_class = EmailSerializer
+    # Read by keyset pagination to build cursors
+    fieldset_always_load = ("received_date",)
 
     def get_serializer_class(self):
-        if self.action == "list":
+        if self.action == "list" and self.get_fieldset() is None:
             return EmailListSerializer
-        return EmailSerializer
+        return super().get_serializer_class()
+
+    def get_default_fields(self):
+        if self.action == "list":
+            return EmailListSerializer.Meta.fields
+        return super().get_default_fields()
+
+    def get_cache_scopes(self):
+        if self.action == "public_stats":
+            return [ALL_MAILBOXES_SCOPE]
+        return super().get_cache_scopes()
+
+    def get_updated_at(self, lock=False):
+        """Return when the requested email last changed, if it is the user's"""
+        emails = Email.objects.filter(assigned_to=self.request.user)
+        if lock:
+            emails = emails.select_for_update()
+        try:
+            emails = emails.filter(pk=self.kwargs["pk"])
+        except (ValueError, DjangoValidationError):
+            return None
+        return emails.values_list("updated_at", flat=True).first()
+
+    def get_etag(self, request, digest):
+        etag = super().get_etag(request, digest)
+        if self.action in ("retrieve", "update", "partial_update"):
+            updated_at = self.get_updated_at()
+            if updated_at is not None:
+                # Lead with the email's own state, which If-Match checks
+                etag = f'"{updated_at:%Y%m%d%H%M%S%f}-{etag[1:]}'
+        return etag
+
+    def update(self, request, *args, **kwargs):
+        """
+        Update an email. With ``If-Match``, the update only goes ahead if the
+        email is unchanged since the response that carried the tag. Only the
+        part of the tag derived from the email's own ``updated_at`` is
+        compared, so writes elsewhere in the mailbox don't conflict with it.
+        """
+        if_match = request.headers.get("If-Match")
+        if if_match is None:
+            response = super().update(request, *args, **kwargs)
+        else:
+            with transaction.atomic():
+                # Locked until the update commits, so concurrent updates
+                # made against the same tag can't both go ahead
+                updated_at = self.get_updated_at(lock=True)
+                tags = parse_etags(if_match)
+                current = f"{updated_at:%Y%m%d%H%M%S%f}" if updated_at else None
+                if (
+                    current
+                    and "*" not in tags
+                    # Compressed responses carry the same tags, weakened
+                    and not any(
+                        tag.removeprefix("W/").startswith(f'"{current}-')
+                        for tag in tags
+                    )
+                ):
+                    return Response(
+                        {"error": "Email has changed since it was fetched"},
+                        status=status.HTTP_412_PRECONDITION_FAILED,
+                    )
+                response = super().update(request, *args, **kwargs)
+
+        if response.status_code == 200:
+            # The tag a fresh GET would return, to chain further updates on
+            digest = self.get_response_digest(request, action="retrieve")
+            response["ETag"] = self.get_etag(request, digest)
+        return response
 
     def get_queryset(self):
         user = self.request.user
@@ -56,16 +168,24 @@ class EmailViewSet(viewsets.ModelViewSet):
                 queryset = queryset.filter(
                     models.Q(status="dangerous") | models.Q(confidence_score__gte=0.7)
                 )
-                # Update status for high confidence emails
-                high_risk_emails = queryset.filter(
-                    confidence_score__gte=0.7, status="suspicious"
-                )
-                high_risk_emails.update(status="dangerous")
             else:
                 queryset = queryset.filter(status=status)
 
-        # Add debugging
-        total_count = queryset.count()
+        if self.get_fieldset() is not None:
+            # Only the columns and relations of the requested fields
+            queryset = self.prune_queryset(queryset)
+        elif self.action == "list":
+            # List rows never show the body or its search document, which are
+            # the bulk of each row
+            queryset = queryset.only(*EmailListSerializer.Meta.fields)
+        elif self.action in ("retrieve", "update", "partial_update"):
+            # Everything EmailSerializer nests, loaded in a fixed number of queries
+            queryset = queryset.select_related(
+                "reviewed_by", "analysis"
+            ).prefetch_related("attachments", "analysis__matched_patterns")
+        elif self.action in ("quarantine", "release"):
+            # Leaving the body unloaded also keeps it out of the UPDATE
+            queryset = queryset.defer("content", "search_vector")
 
         return queryset.order_by("-received_date")
 
@@ -89,248 +209,314 @@ class EmailViewSet(viewsets.ModelViewSet):
         return Response({"status": "email released"})
 
     @action(detail=False, methods=["post"])
-    def analyze_email(self, request):
+    def bulk(self, request):
         """
-        Analyze an incoming email for potential security risks
+        Quarantine, release, reassign or delete the user's emails given by
+        ``ids`` or a ``filter``, and return the action's audit record with
+        the number of emails it changed
         """
-        # Get email content from request
-        email_content = request.data.get("content", "")
-
-        if not email_content:
+        serializer = BulkEmailActionRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        if params["action"] in ADMIN_ACTIONS and request.user.profile.role != "admin":
             return Response(
-                {"error": "No email content provided"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        # Initialize email analyzer (in production, this would be a pre-trained model)
-        try:
-            analyzer = train_email_classifier()
-
-            if not analyzer:
-                return Response(
-                    {"error": "ML model not trained. Generate sample emails first."},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                )
-
-            # Perform ML analysis
-            analysis_result = analyzer.predict(email_content)
-
-            # Create Email and EmailAnalysis records
-            email = Email.objects.create(
-                content=email_content,
-                status=Email.EmailStatus.SUSPICIOUS
-                if analysis_result["risk_score"] > 0.5
-                else Email.EmailStatus.SAFE,
-                confidence_score=analysis_result["ml_confidence"],
-                assigned_to=self.request.user,
-            )
-
-            # Create suspicious patterns if keywords found
-            suspicious_keywords = analysis_result["suspicious_keywords"]
-            matched_patterns = []
-
-            for keyword in suspicious_keywords:
-                pattern, _ = SuspiciousPattern.objects.get_or_create(
-                    pattern=keyword,
-                    defaults={
-                        "category": "dynamic",
-                        "severity": 6,
-                        "description": f"Dynamically detected suspicious keyword: {keyword}",
-                    },
-                )
-                matched_patterns.append(pattern)
-
-            # Create email analysis
-            email_analysis = EmailAnalysis.objects.create(
-                email=email,
-                risk_score=analysis_result["risk_score"],
-                ml_prediction={
-                    "confidence": analysis_result["ml_confidence"],
-                    "suspicious_keywords": suspicious_keywords,
-                },
-            )
-
-            # Add matched patterns
-            if matched_patterns:
-                email_analysis.matched_patterns.set(matched_patterns)
-
-            return Response(
-                {
-                    "email_id": email.id,
-                    "risk_score": analysis_result["risk_score"],
-                    "ml_confidence": analysis_result["ml_confidence"],
-                    "suspicious_keywords": suspicious_keywords,
-                    "status": email.status,
-                }
-            )
-
-        except Exception as e:
-            return Response(
-                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {"error": f"Only admins can {params['action']} emails"},
+                status=status.HTTP_403_FORBIDDEN,
             )
 
-    @action(detail=False, methods=["get"])
-    def suspicious_summary(self, request):
-        """
-        Provide a summary of suspicious emails
-        """
-        # Get base queryset for current user
-        user_emails = Email.objects.filter(assigned_to=request.user)
-
-        # Total emails
-        total_emails = user_emails.count()
-
-        # Suspicious emails (excluding dangerous ones)
-        suspicious_emails = user_emails.filter(
-            status=Email.EmailStatus.SUSPICIOUS
-        ).count()
-
-        # Dangerous emails (high-risk)
-        dangerous_emails = user_emails.filter(
-            models.Q(status=Email.EmailStatus.DANGEROUS)
-            | models.Q(confidence_score__gte=0.7)
-        ).count()
-
-        # Update status for high confidence emails
-        high_risk_emails = user_emails.filter(
-            confidence_score__gte=0.7, status="suspicious"
+        emails = select_emails(
+            Email.objects.filter(assigned_to=request.user),
+            ids=params.get("ids"),
+            filters=params.get("filter"),
         )
-        high_risk_emails.update(status="dangerous")
-
-        # Calculate detection rate based on confidence scores
-        # A score closer to 0 for safe emails and closer to 1 for dangerous emails indicates better detection
-        emails_with_scores = user_emails.filter(confidence_score__isnull=False)
-        if emails_with_scores.exists():
-            correct_predictions = (
-                # Count safe emails with low confidence scores (< 0.3)
-                emails_with_scores.filter(
-                    status="safe", confidence_score__lt=0.3
-                ).count()
-                +
-                # Count suspicious emails with medium confidence scores (0.3 - 0.7)
-                emails_with_scores.filter(
-                    status="suspicious",
-                    confidence_score__gte=0.3,
-                    confidence_score__lt=0.7,
-                ).count()
-                +
-                # Count dangerous emails with high confidence scores (>= 0.7)
-                emails_with_scores.filter(
-                    status="dangerous", confidence_score__gte=0.7
-                ).count()
-            )
-            detection_rate = correct_predictions / emails_with_scores.count()
-        else:
-            detection_rate = 0
-
-        return Response(
-            {
-                "total_emails": total_emails,
-                "suspicious_emails": suspicious_emails,
-                "high_risk_emails": dangerous_emails,
-                "detection_rate": detection_rate,
-            }
+        criteria = {
+            key: value
+            for key, value in serializer.data.items()
+            if key in ("ids", "filter")
+        }
+        audit = run_bulk_action(
+            params["action"],
+            emails,
+            performed_by=request.user,
+            criteria=criteria,
+            assigned_to=params.get("assigned_to"),
         )
+        return Response(BulkEmailActionSerializer(audit).data)
 
     @action(detail=False, methods=["get"], permission_classes=[permissions.AllowAny])
+    @cached_response
     def public_stats(self, request):
         """
         Provide public statistics about the system
         """
-        # Total emails
-        total_emails = Email.objects.count()
-
-        # Suspicious emails (excluding dangerous ones)
-        suspicious_emails = Email.objects.filter(
-            status=Email.EmailStatus.SUSPICIOUS
-        ).count()
-
-        # Dangerous emails
-        dangerous_emails = Email.objects.filter(
-            status=Email.EmailStatus.DANGEROUS
-        ).count()
-
-        # Calculate detection rate based on confidence scores across all emails
-        emails_with_scores = Email.objects.filter(confidence_score__isnull=False)
-        if emails_with_scores.exists():
-            correct_predictions = (
-                # Safe emails with low confidence scores (<0.3)
-                emails_with_scores.filter(
-                    status="safe", confidence_score__lt=0.3
-                ).count()
-                +
-                # Suspicious emails with medium scores (0.3-0.7)
-                emails_with_scores.filter(
-                    status="suspicious",
-                    confidence_score__gte=0.3,
-                    confidence_score__lt=0.7,
-                ).count()
-                +
-                # Dangerous emails with high scores (>=0.7)
-                emails_with_scores.filter(
-                    status="dangerous", confidence_score__gte=0.7
-                ).count()
-            )
-            detection_rate = correct_predictions / emails_with_scores.count()
-        else:
-            detection_rate = 0
-
+        # Dangerous emails only, across all mailboxes
         return Response(
-            {
-                "total_emails": total_emails,
-                "suspicious_emails": suspicious_emails,
-                "high_risk_emails": dangerous_emails,
-                "detection_rate": detection_rate,
-            }
+            email_stats(
+                Email.objects.all(),
+                high_risk=models.Q(status=Email.EmailStatus.DANGEROUS),
+            )
         )
 
 
-class EmailAttachmentViewSet(viewsets.ModelViewSet):
+class EmailAttachmentViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = EmailAttachment.objects.all()
     serializer_class = EmailAttachmentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    fieldset_serializer_class = EmailAttachmentSerializer
 
     def get_queryset(self):
-        return EmailAttachment.objects.filter(email__assigned_to=self.request.user)
+        queryset = EmailAttachment.objects.filter(email__assigned_to=self.request.user)
+        if self.get_fieldset() is not None:
+            queryset = self.prune_queryset(queryset)
+        return queryset
 
 
-class SuspiciousPatternViewSet(viewsets.ModelViewSet):
+class SuspiciousPatternViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = SuspiciousPattern.objects.all()
     serializer_class = SuspiciousPatternSerializer
     permission_classes = [IsAdminOrReadOnly]
     filter_backends = [filters.SearchFilter]
     search_fields = ["pattern", "category", "description"]
 
+    def get_cache_scopes(self):
+        # The same for every user
+        return [PATTERNS_SCOPE]
+
 
-class EmailAnalysisViewSet(viewsets.ReadOnlyModelViewSet):
+class EmailAnalysisViewSet(
+    SparseFieldsetViewMixin, CachedResponseMixin, viewsets.ReadOnlyModelViewSet
+):
     queryset = EmailAnalysis.objects.all()
     serializer_class = EmailAnalysisSerializer
     permission_classes = [permissions.IsAuthenticated]
+    fieldset_serializer_class = EmailAnalysisSerializer
+
+    def get_cache_scopes(self):
+        if self.request.user.profile.role == "admin":
+            # Admins see every mailbox's analyses
+            return [ALL_MAILBOXES_SCOPE, PATTERNS_SCOPE]
+        return super().get_cache_scopes()
 
     def get_queryset(self):
         user = self.request.user
+        if self.get_fieldset() is not None:
+            queryset = self.prune_queryset(EmailAnalysis.objects.all())
+        else:
+            queryset = EmailAnalysis.objects.prefetch_related("matched_patterns")
         if user.profile.role == "admin":
-            return EmailAnalysis.objects.all()
-        return EmailAnalysis.objects.filter(email__assigned_to=user)
+            return queryset
+        return queryset.filter(email__assigned_to=user)
 
 
-@api_view(["GET"])
-def export_emails(request, format="json"):
-    """Export emails in JSON format"""
+@async_api_view(["POST"])
+async def analyze_email(request):
+    """
+    Analyze an incoming email for potential security risks
+    """
+    # Get email content from request
+    email_content = request.data.get("content", "")
+
+    if not email_content:
+        return Response(
+            {"error": "No email content provided"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    # Trained by the train_classifier command, and loaded once per process
+    analyzer = get_analyzer()
+    if not analyzer:
+        return Response(
+            {"error": "ML model not trained. Run the train_classifier command first."},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+    try:
+        # Perform ML analysis, off the event loop since it's CPU-bound
+        analysis_result = await sync_to_async(analyzer.predict, thread_sensitive=False)(
+            email_content
+        )
+
+        # Create Email and EmailAnalysis records
+        email = await Email.objects.acreate(
+            content=email_content,
+            status=Email.EmailStatus.SUSPICIOUS
+            if analysis_result["risk_score"] > 0.5
+            else Email.EmailStatus.SAFE,
+            confidence_score=analysis_result["ml_confidence"],
+            assigned_to=request.user,
+        )
+
+        # Create suspicious patterns if keywords found
+        suspicious_keywords = analysis_result.get("suspicious_keywords", [])
+        matched_patterns = []
+
+        for keyword in suspicious_keywords:
+            pattern, _ = await SuspiciousPattern.objects.aget_or_create(
+                pattern=keyword,
+                defaults={
+                    "category": "dynamic",
+                    "severity": 6,
+                    "description": f"Dynamically detected suspicious keyword: {keyword}",
+                },
+            )
+            matched_patterns.append(pattern)
+
+        # Create email analysis
+        email_analysis = await EmailAnalysis.objects.acreate(
+            email=email,
+            risk_score=analysis_result["risk_score"],
+            ml_prediction={
+                "confidence": analysis_result["ml_confidence"],
+                "suspicious_keywords": suspicious_keywords,
+            },
+        )
+
+        # Add matched patterns
+        if matched_patterns:
+            await email_analysis.matched_patterns.aset(matched_patterns)
+
+        return Response(
+            {
+                "email_id": email.id,
+                "risk_score": analysis_result["risk_score"],
+                "ml_confidence": analysis_result["ml_confidence"],
+                "suspicious_keywords": suspicious_keywords,
+                "status": email.status,
+            }
+        )
+
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@async_api_view(["GET"])
+async def suspicious_summary(request):
+    """
+    Provide a summary of suspicious emails
+    """
+    # Maintained incrementally, so this is a primary-key read
+    return Response(await aget_mailbox_summary(request.user))
+
+
+@async_api_view(["GET"])
+async def sender_domains(request):
+    """
+    Count the user's emails per sender domain, largest first
+    """
+    try:
+        limit = min(int(request.query_params.get("limit", 50)), 500)
+    except ValueError:
+        return Response(
+            {"error": "limit must be an integer"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    domains = (
+        Email.objects.filter(assigned_to=request.user)
+        .values("sender_domain")
+        .annotate(
+            total=models.Count("id"),
+            suspicious=models.Count(
+                "id", filter=models.Q(status=Email.EmailStatus.SUSPICIOUS)
+            ),
+            dangerous=models.Count(
+                "id", filter=models.Q(status=Email.EmailStatus.DANGEROUS)
+            ),
+        )
+        .order_by("-total", "sender_domain")[: max(limit, 1)]
+    )
+    return Response([domain async for domain in domains])
+
+
+@async_api_view(["GET"])
+async def export_emails(request, format="json"):
+    """
+    Export emails as JSON (default), CSV, gzip-compressed NDJSON or Parquet,
+    selected with the ``export_format`` query parameter
+    """
+    export_format = request.query_params.get("export_format", "json")
+    if export_format not in EXPORT_FORMATS:
+        return Response(
+            {"error": f"Unsupported export format: {export_format}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
     emails = Email.objects.filter(assigned_to=request.user)
 
-    if not emails.exists():
+    if not await emails.aexists():
         return Response(
             {"error": "No emails found to export"}, status=status.HTTP_404_NOT_FOUND
         )
 
-    content = export_emails_to_json(emails)
+    if export_format == "ndjson":
+        # An async iterator, so ASGI sends each chunk as it is compressed;
+        # a sync one would be collected into a list first
+        response = StreamingHttpResponse(
+            astream_emails_to_ndjson_gz(emails.order_by("id")),
+            content_type="application/gzip",
+        )
+        response["Content-Disposition"] = 'attachment; filename="emails.ndjson.gz"'
+        return response
+
+    if export_format == "parquet":
+        output = tempfile.TemporaryFile()
+        await sync_to_async(write_emails_to_parquet)(emails.order_by("id"), output)
+        output.seek(0)
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename="emails.parquet",
+            content_type="application/vnd.apache.parquet",
+        )
+
+    # Formatting whole files is CPU-bound, so it runs off the event loop
+    emails = [email async for email in emails]
+    if export_format == "csv":
+        content = await sync_to_async(export_emails_to_csv, thread_sensitive=False)(
+            emails
+        )
+        response = HttpResponse(content, content_type="text/csv")
+        response["Content-Disposition"] = 'attachment; filename="emails.csv"'
+        return response
+
+    content = await sync_to_async(export_emails_to_json, thread_sensitive=False)(emails)
     response = HttpResponse(content, content_type="application/json")
     response["Content-Disposition"] = 'attachment; filename="emails.json"'
 
     return response
 
 
+@async_api_view(["GET"])
+async def export_email_changes(request):
+    """
+    Incrementally export emails changed since the ``cursor`` query parameter.
+
+    Returns the changed records plus ``next_cursor`` to pass on the next sync.
+    """
+    try:
+        limit = min(int(request.query_params.get("limit", 1000)), 10000)
+    except ValueError:
+        return Response(
+            {"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    if limit < 1:
+        return Response(
+            {"error": "limit must be positive"}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        results, next_cursor, has_more = await aget_email_changes(
+            Email.objects.filter(assigned_to=request.user),
+            cursor=request.query_params.get("cursor"),
+            limit=limit,
+        )
+    except DjangoValidationError as e:
+        return Response({"error": e.message}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(
+        {"results": results, "next_cursor": next_cursor, "has_more": has_more}
+    )
+
+
 @api_view(["POST"])
 def import_emails(request):
     """Import emails from JSON or CSV file"""
@@ -351,30 +537,18 @@ def import_emails(request):
                 content = file.read().decode("utf-8")
                 emails_data = import_emails_from_csv(content)
 
-            # Create emails in bulk
-            emails = []
-            for email_data in emails_data:
-                try:
-                    email = Email(
-                        sender=email_data["sender"],
-                        sender_name=email_data.get("sender_name", ""),  # Optional field
-                        subject=email_data["subject"],
-                        content=email_data["content"],
-                        status=email_data["status"],
-                        confidence_score=email_data["confidence_score"],
-                        is_quarantined=email_data["is_quarantined"],
-                        received_date=email_data["received_date"],
-                        assigned_to=request.user,
-                    )
-                    emails.append(email)
-                except KeyError as e:
-                    raise ValidationError(f"Missing required field: {str(e)}")
-
-            Email.objects.bulk_create(emails)
+            # Create emails in bulk, skipping ones already imported
+            try:
+                created, skipped = save_imported_emails(emails_data, request.user)
+            except KeyError as e:
+                raise ValidationError(f"Missing required field: {str(e)}")
 
             return Response(
                 {
-                    "message": f"Successfully imported {len(emails)} emails",
+                    "message": f"Successfully imported {created} emails"
+                    + (f" ({skipped} duplicates skipped)" if skipped else ""),
+                    "imported": created,
+                    "skipped": skipped,
                     "classified": any(
                         email_data.get("status")
                         not in ["safe", "suspicious", "dangerous"]
@@ -385,6 +559,8 @@ def import_emails(request):
 
         except ValidationError as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except DjangoValidationError as e:
+            return Response({"error": e.message}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"error": f"Error processing file: {str(e)}"},
@@ -396,3 +572,97 @@ def import_emails(request):
             {"error": f"Server error: {str(e)}"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
+
+
+@api_view(["GET"])
+def archived_months(request):
+    """List the months of email moved to the cold archive"""
+    if request.user.profile.role != "admin":
+        return Response(
+            {"error": "Only admins can view the email archive"},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+    return Response({"results": list_archived_months()})
+
+
+@api_view(["POST"])
+def rehydrate_archived_month(request):
+    """
+    Queue the restore of an archived month of email, given as ``month``
+    (YYYY-MM). The restore runs in the background; poll the returned
+    rehydration for its status and counts.
+    """
+    if request.user.profile.role != "admin":
+        return Response(
+            {"error": "Only admins can restore archived emails"},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+    try:
+        month = parse_month(str(request.data.get("month", "")))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if not archive_paths(month):
+        return Response(
+            {"error": f"No archive found for {month:%Y-%m}"},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+
+    with transaction.atomic():
+        rehydration = ArchiveRehydration.objects.create(
+            month=month, requested_by=request.user
+        )
+        transaction.on_commit(lambda: start_rehydration(rehydration.id))
+    return Response(
+        ArchiveRehydrationSerializer(rehydration).data,
+        status=status.HTTP_202_ACCEPTED,
+        headers={
+            "Location": reverse(
+                "email-archive-rehydration", args=[rehydration.id], request=request
+            )
+        },
+    )
+
+
+@api_view(["GET"])
+def archive_rehydration_status(request, pk):
+    """Report the status of a queued archive restore"""
+    if request.user.profile.role != "admin":
+        return Response(
+            {"error": "Only admins can view archive restores"},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+    rehydration = get_object_or_404(ArchiveRehydration, pk=pk)
+    return Response(ArchiveRehydrationSerializer(rehydration).data)
+
+
+@api_view(["GET"])
+def response_cache_stats_view(request):
+    """Report the response cache's hit rate per endpoint in this process"""
+    if request.user.profile.role != "admin":
+        return Response(
+            {"error": "Only admins can view cache statistics"},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+    endpoints = response_cache_stats.snapshot()
+    hits = sum(counts["hits"] for counts in endpoints.values())
+    requests = hits + sum(counts["misses"] for counts in endpoints.values())
+    return Response(
+        {
+            "backend": settings.CACHES["default"]["BACKEND"],
+            "hits": hits,
+            "misses": requests - hits,
+            "hit_rate": hits / requests if requests else 0,
+            "endpoints": endpoints,
+        }
+    )
+
+
+@api_view(["GET"])
+def connection_pool_stats_view(request):
+    """Report the usage of this process's database connection pools"""
+    if request.user.profile.role != "admin":
+        return Response(
+            {"error": "Only admins can view connection pool statistics"},
+            status=status.HTTP_403_FORBIDDEN,
+        )
+    return Response({"pooled": settings.DB_POOL, "pools": connection_pool_stats()})
@@ -0,0 +1,41 @@
+"""
+Gunicorn settings for serving the ASGI application with uvicorn workers:
+
+    gunicorn -c backend/gunicorn.conf.py backend.asgi:application
+"""
+
+import multiprocessing
+import os
+import sys
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+# Each worker serves many requests concurrently; sync views run in threads
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Load the application, and with it the classifier, in the master before
+# forking, so workers share it copy-on-write instead of each loading a copy.
+# Nothing connects to the database while loading.
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then, bounding the damage of any slow leak
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = max_requests // 10
+accesslog = "-"
+
+
+def on_starting(server):
+    # The response cache and replica pins live in the cache, so with a
+    # per-process one each worker would keep its own: a user's write would
+    # not pin their reads served by the other workers
+    from django.conf import settings
+
+    backend = settings.CACHES["default"]["BACKEND"]
+    if server.cfg.workers > 1 and backend.endswith(".LocMemCache"):
+        server.log.error(
+            "CACHE_BACKEND=locmem is per process; set CACHE_BACKEND=redis (or "
+            "file, on a single host) to run %s workers",
+            server.cfg.workers,
+        )
+        sys.exit(1)
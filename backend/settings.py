@@ -71,6 +71,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # Third party apps
     "rest_framework",
     "rest_framework_simplejwt",
@@ -84,12 +85,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the time spent in other middleware counts too
+    "backend.core.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    # Before anything else that reads or changes response bodies
+    "backend.core.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",  # CORS middleware
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "backend.core.middleware.ReplicaRoutingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -126,9 +132,72 @@ DATABASES = {
         "PASSWORD": os.getenv("DB_PASSWORD", "postgres"),
         "HOST": os.getenv("DB_HOST", "localhost"),
         "PORT": os.getenv("DB_PORT", "5432"),
+        # Check connections before handing them out, so one dropped by a
+        # database restart or a proxy's idle timeout fails no request
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Each process keeps a pool of open connections (psycopg 3), so requests
+# don't pay for connecting and a burst of them waits up to DB_POOL_TIMEOUT
+# seconds for a free connection rather than overrunning max_connections.
+# Size it so processes (WEB_CONCURRENCY) x DB_POOL_MAX_SIZE x databases
+# stays under the server's max_connections. With DB_POOL=False, connections
+# are instead kept open for DB_CONN_MAX_AGE seconds per thread.
+DB_POOL = os.getenv("DB_POOL", "True") == "True"
+if DB_POOL:
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+            "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+            # Close connections idle or open for this many seconds, so the
+            # pool shrinks after a burst and server-side memory is recycled
+            "max_idle": float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+            "max_lifetime": float(os.getenv("DB_POOL_MAX_LIFETIME", "1800")),
+        }
+    }
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = int(os.getenv("DB_CONN_MAX_AGE", "60"))
+
+# Read replicas, as comma-separated "host" or "host:port" entries sharing the
+# primary's credentials. GET requests read from a healthy replica; see
+# backend/core/routers.py. Two local databases work too, e.g.
+# DB_REPLICA_HOSTS=localhost DB_REPLICA_NAME=email_scanner_replica
+REPLICA_HOSTS = [
+    host.strip()
+    for host in os.getenv("DB_REPLICA_HOSTS", "").split(",")
+    if host.strip()
+]
+REPLICA_DATABASES = [f"replica{number}" for number in range(1, len(REPLICA_HOSTS) + 1)]
+# Fail fast, so an unreachable replica is skipped rather than waited on
+REPLICA_OPTIONS = {"connect_timeout": int(os.getenv("DB_REPLICA_CONNECT_TIMEOUT", "2"))}
+if DB_POOL:
+    REPLICA_OPTIONS["pool"] = {
+        **DATABASES["default"]["OPTIONS"]["pool"],
+        "timeout": REPLICA_OPTIONS["connect_timeout"],
+    }
+for alias, replica in zip(REPLICA_DATABASES, REPLICA_HOSTS):
+    host, _, port = replica.partition(":")
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "NAME": os.getenv("DB_REPLICA_NAME", DATABASES["default"]["NAME"]),
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "OPTIONS": REPLICA_OPTIONS,
+        # Tests only create the primary's test database
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["backend.core.routers.ReplicaRouter"]
+# Seconds a user's reads stay on the primary after they write, to cover
+# replication lag. Pins are kept in the cache, so with several processes they
+# need a shared CACHE_BACKEND
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", "5"))
+# Seconds between health checks of a replica, and how far behind the primary
+# a replica may fall before reads skip it
+REPLICA_HEALTH_CHECK_INTERVAL = int(os.getenv("REPLICA_HEALTH_CHECK_INTERVAL", "10"))
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "30"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -156,7 +225,67 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
+    # orjson-backed, falling back to the standard library without orjson
+    "DEFAULT_RENDERER_CLASSES": (
+        "backend.core.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "backend.core.renderers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
+}
+
+# Responses at least this many bytes long are compressed with brotli (if
+# installed) or gzip, when the client accepts either
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", "1024"))
+
+# Email list counts: exact up to this many rows, estimated beyond it
+EMAIL_EXACT_COUNT_THRESHOLD = int(os.getenv("EMAIL_EXACT_COUNT_THRESHOLD", "10000"))
+# Seconds a fallback exact count of a large list is cached for
+EMAIL_COUNT_CACHE_TTL = int(os.getenv("EMAIL_COUNT_CACHE_TTL", "60"))
+# Searches expected to match more emails than this are not ranked by relevance
+EMAIL_SEARCH_RANK_LIMIT = int(os.getenv("EMAIL_SEARCH_RANK_LIMIT", "10000"))
+# Emails changed per statement (and transaction) by bulk actions
+EMAIL_BULK_ACTION_CHUNK_SIZE = int(os.getenv("EMAIL_BULK_ACTION_CHUNK_SIZE", "1000"))
+# Most emails a bulk action may list by id; larger selections use a filter
+EMAIL_BULK_ACTION_MAX_IDS = int(os.getenv("EMAIL_BULK_ACTION_MAX_IDS", "10000"))
+# Emails changed within this many seconds are left out of the delta export
+# until a later sync, so a transaction committing late is not skipped over
+EMAIL_CHANGES_SAFETY_LAG_SECONDS = int(
+    os.getenv("EMAIL_CHANGES_SAFETY_LAG_SECONDS", "30")
+)
+
+# Cache for responses, counts and replica pins: "locmem" (per process), "file"
+# (shared by the processes of one host) or "redis" (shared by every host).
+# gunicorn refuses to start several workers with locmem, and the Docker image
+# defaults to redis.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem")
+CACHE_BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "email-scanner"),
+    "file": (
+        "django.core.cache.backends.filebased.FileBasedCache",
+        os.path.join(BASE_DIR, "cache"),
+    ),
+    "redis": (
+        "django.core.cache.backends.redis.RedisCache",
+        "redis://localhost:6379/0",
+    ),
+}
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKENDS[CACHE_BACKEND][0],
+        "LOCATION": os.getenv("CACHE_LOCATION", CACHE_BACKENDS[CACHE_BACKEND][1]),
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", "10000"))},
+    }
 }
+if CACHE_BACKEND == "redis":
+    # MAX_ENTRIES is for the locmem and file backends; Redis evicts by policy
+    CACHES["default"]["OPTIONS"] = {}
+# Cached responses are invalidated by writes; this only bounds how long
+# entries for superseded versions take up space
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))
 
 # JWT settings
 SIMPLE_JWT = {
@@ -189,6 +318,35 @@ STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Cold storage for emails past retention (see the archive_emails command)
+EMAIL_ARCHIVE_DIR = os.getenv("EMAIL_ARCHIVE_DIR", os.path.join(BASE_DIR, "archive"))
+EMAIL_RETENTION_MONTHS = int(os.getenv("EMAIL_RETENTION_MONTHS", "24"))
+
+# Classifier saved by the train_classifier command and loaded by the servers
+EMAIL_CLASSIFIER_PATH = os.getenv(
+    "EMAIL_CLASSIFIER_PATH",
+    os.path.join(BASE_DIR, "classifier", "email_classifier.pkl"),
+)
+
+# Request metrics (latency, queries and serializer time per view), served
+# at /metrics for Prometheus to requests bearing METRICS_TOKEN as a bearer
+# token; without a token they are only served with DEBUG on. Requests
+# slower than SLOW_REQUEST_LOG_MS are logged with their
+# SLOW_REQUEST_LOG_STATEMENTS slowest statements; 0 turns the log off.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True") == "True"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+SLOW_REQUEST_LOG_MS = int(os.getenv("SLOW_REQUEST_LOG_MS", "0"))
+SLOW_REQUEST_LOG_STATEMENTS = int(os.getenv("SLOW_REQUEST_LOG_STATEMENTS", "5"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "backend.slow_requests": {"handlers": ["console"], "level": "WARNING"},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
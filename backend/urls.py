@@ -19,8 +19,11 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from backend.core.views import metrics
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/auth/", include("backend.authentication.urls")),
     path("api/", include("backend.emails.urls")),
+    path("metrics", metrics, name="metrics"),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)